@@ -6,7 +6,14 @@ from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 from pydantic import BaseModel
-import ollama
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.llm_backend import OllamaBackend
+from summary.ndjson_writer import PublishedReader
+from summary.call_graph import callers_and_callees
+from summary.graph_store import GraphStore
 
 app = FastAPI()
 # Add CORS middleware
@@ -19,6 +26,8 @@ app.add_middleware(
 )
 
 PROJECT_KEYWORDS = ["project", "task", "assignment"]
+# one client for every request; the model stays loaded between questions
+LLM = OllamaBackend("llama3.1:latest", keep_alive=os.environ.get("OLLAMA_KEEP_ALIVE", "30m"))
 
 class QueryRequest(BaseModel):
     query: str
@@ -28,12 +37,19 @@ from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import Chroma
 import chromadb
 from langchain.prompts import PromptTemplate
+from langchain.schema import Document
 
 EMBEDDINGS = HuggingFaceEmbeddings(
     model_name="sentence-transformers/all-MiniLM-L6-v2"
 )
 PERSIST_DIR = "./vdb/chroma_db:v2"
 COLLECTION_NAME = "test"
+# documents appended by a summary run in progress (tree_generate_summary.py --publish), added as they appear
+PUBLISHED_DOCS = os.environ.get("SUMMARY_PUBLISHED_DOCS")
+published_reader = PublishedReader(PUBLISHED_DOCS) if PUBLISHED_DOCS else None
+# call graph saved by a summary run (tree_generate_summary.py --call-graph); the callers and callees of a function
+# that is retrieved are looked up here instead of searching for them
+CALL_GRAPH = GraphStore.open(os.environ["SUMMARY_CALL_GRAPH"]) if os.environ.get("SUMMARY_CALL_GRAPH") else None
 
 TEMPLATE = """### Task
 You are to answer questions about the Cornell Data Science project team.
@@ -81,15 +97,36 @@ def get_vdb():
         # vectordb.add_texts(texts=data['summary'], metadatas=data['metadata'], ids=data['ids'])
     return vectordb
 
+def add_published_documents(vectordb):
+    if published_reader is None:
+        return
+    records = published_reader.read()
+    if records:
+        documents = [
+            Document(page_content=record["page_content"], metadata=dict(record["metadata"], context=record["metadata"]["path"]))
+            for record in records
+        ]
+        # ids are stable, so a document published again replaces its earlier copy
+        vectordb.add_documents(documents, ids=[record["id"] for record in records])
+        print(f"Added {len(documents)} newly summarized documents")
+
 def query(q):
     vectordb = get_vdb()
+    add_published_documents(vectordb)
     results = vectordb.similarity_search(q)
     return results
 
+def call_context(doc):
+    function = doc.metadata.get("function")
+    if CALL_GRAPH is None or function is None:
+        return ""
+    related = callers_and_callees(CALL_GRAPH, function)
+    return f"\n<Calls>{', '.join(related['callees'])}</Calls>\n<Called By>{', '.join(related['callers'])}</Called By>"
+
 def get_llm_prompt(q):
     docs = query(q)
 
-    context = "\n\n".join([f"===== Snippet {i} =====\n<Summary>{doc.page_content}</Summary>\n<Raw Code>{doc.metadata['code']}</Raw Code\n<Source>{doc.metadata['context']}</Source>"
+    context = "\n\n".join([f"===== Snippet {i} =====\n<Summary>{doc.page_content}</Summary>\n<Raw Code>{doc.metadata['code']}</Raw Code\n<Source>{doc.metadata['context']}</Source>{call_context(doc)}"
     for i, doc in enumerate(docs)])
 
     template = PromptTemplate(
@@ -115,11 +152,8 @@ async def sample_rag_api(request: QueryRequest):
     sources = res["sources"]
 
     #use ollama
-    response = ollama.generate(
-        model='llama3.1:latest',
-        prompt=prompt
-    )
-    return {"sources" : sources, "response": response['response'], "prompt": prompt}
+    response = LLM.generate(prompt, kind="answer")
+    return {"sources" : sources, "response": response, "prompt": prompt}
 
 def is_relevant(query: str) -> bool:
     return any(word in query.lower() for word in PROJECT_KEYWORDS)
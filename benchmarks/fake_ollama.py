@@ -0,0 +1,151 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+
+class FakeOllamaServer:
+    '''
+    An Ollama compatible HTTP server (/api/generate and /api/tags) that answers deterministically without a model,
+    so the whole pipeline can be benchmarked and tested. Every response takes latency seconds plus the time its
+    completion tokens take at tokens_per_second (0 for no generation time), and reports prompt and completion token
+    counts and durations the way Ollama does. failure_rate of the requests, chosen by a seeded random generator,
+    fail with a 500 error, as do the first fail_first prompts and, while failing is set, every request including
+    the health check. Batch prompts get a JSON object with one summary per function, so batch mode works as well;
+    respond replaces the answer to every prompt. The body of every prompt is kept in bodies.
+    '''
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, tokens_per_second: float = 0.0,
+                 failure_rate: float = 0.0, seed: int = 0, failing: bool = False, fail_first: int = 0,
+                 respond: Optional[Callable[[str], str]] = None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.failing = failing
+        self.fail_first = fail_first
+        self.respond = respond
+        self.requests = 0
+        self.failures = 0
+        self.generated = 0
+        self.active = 0
+        self.max_active = 0
+        self.bodies: List[dict] = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keeps the clients' connections open between requests
+            disable_nagle_algorithm = True  # headers and body are separate writes on a kept open connection
+
+            def do_GET(self):
+                if server.failing:
+                    return self.reply(500, {"error": "down"})
+                self.reply(200, {"models": [{"name": "fake"}]})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, payload = server.generate(body)
+                self.reply(status, payload)
+
+            def reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_port}"
+        self._thread: Optional[threading.Thread] = None
+
+    def generate(self, body: dict):
+        with self.lock:
+            self.requests += 1
+            self.bodies.append(body)
+            failed = self.failing or self.fail_first > 0 or self.random.random() < self.failure_rate
+            self.fail_first -= 1
+            if failed:
+                self.failures += 1
+        if failed:
+            return 500, {"error": "injected failure"}
+        prompt = body.get("prompt", "")
+        response = self.respond(prompt) if self.respond is not None else self.answer(prompt)
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(response) // 4)
+        eval_seconds = completion_tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.latency + eval_seconds)
+        with self.lock:
+            self.active -= 1
+            self.generated += 1
+        return 200, {
+            "model": body.get("model", "fake"),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "response": response,
+            "done": True,
+            "done_reason": "stop",
+            "context": [prompt_tokens, completion_tokens],
+            "total_duration": int((self.latency + eval_seconds) * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(self.latency * 1e9),
+            "eval_count": completion_tokens,
+            "eval_duration": int(eval_seconds * 1e9),
+        }
+
+    @staticmethod
+    def answer(prompt: str) -> str:
+        digest = hashlib.md5(prompt.encode("utf-8")).hexdigest()[:8]
+        if "JSON object" in prompt:
+            labels = re.findall(r"^### (.+)$", prompt, flags=re.MULTILINE)
+            return json.dumps({label: f"summary of {label} {digest}" for label in labels})
+        return f"summary {digest}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Ollama server for benchmarks")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="completion token rate, 0 for instant")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests that fail with a 500")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    server = FakeOllamaServer(port=args.port, latency=args.latency, tokens_per_second=args.tokens_per_second,
+                              failure_rate=args.failure_rate, seed=args.seed)
+    print(f"Fake ollama listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+from typing import Dict, List, Optional
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from benchmarks.fake_ollama import FakeOllamaServer
+from benchmarks.synthetic_repo import SIZES, generate_repo
+
+TARGETS = ["tree", "generate", "relations"]
+DEFAULT_RESULTS = os.path.join(os.path.dirname(__file__), "results.jsonl")
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def count_functions(node) -> int:
+    return len(node.summaries) * (node.type.name == "PYTHON_FILE") + sum(count_functions(c) for c in node.children)
+
+
+def run_target(target: str, root: str, host: str, workers: int) -> Dict[str, float]:
+    '''
+    runs one pipeline over root against the model server at host and measures it, in the calling process
+    '''
+    from summary.llm_backend import OllamaBackend
+    backend = OllamaBackend("fake", host=host)
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        if target == "tree":
+            from summary.tree_generate_summary import ContextAwareFunctionSummaryGenerator
+            generator = ContextAwareFunctionSummaryGenerator(root, "", backend=backend, max_workers=workers)
+            summarized = count_functions(generator.run())
+        elif target == "generate":
+            from summary.generate_summary import ContextAwareFunctionSummaryGenerator
+            generator = ContextAwareFunctionSummaryGenerator(root, root, backend=backend)
+            generator.run()
+            summarized = len(generator.summaries)
+        elif target == "relations":
+            from summary.relationalcontext import RelationalContext
+            context = RelationalContext(root, backend=backend)
+            context.process_directory(root)
+            summarized = len(context.relationships)
+        else:
+            raise ValueError(f"unknown benchmark target {target}")
+    return {
+        "wall_seconds": time.perf_counter() - start,
+        "summarized": summarized,
+        "model_calls": backend.stats.get("model calls"),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _run_in_child(queue, target: str, root: str, host: str, workers: int) -> None:
+    try:
+        queue.put(run_target(target, root, host, workers))
+    except BaseException as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_isolated(target: str, root: str, host: str, workers: int) -> Dict[str, float]:
+    '''
+    runs a target in a fresh process, so its peak memory is its own
+    '''
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_in_child, args=(queue, target, root, host, workers))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "-C", os.path.dirname(__file__), "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_results(results_file: str) -> List[dict]:
+    if not os.path.exists(results_file):
+        return []
+    with open(results_file) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous_result(results: List[dict], result: dict) -> Optional[dict]:
+    '''
+    the latest earlier result of the same target and size under the same server settings
+    '''
+    keys = ("target", "functions", "server", "workers")
+    matches = [r for r in results if all(r.get(key) == result.get(key) for key in keys) and "error" not in r]
+    return matches[-1] if matches else None
+
+
+def format_result(result: dict, previous: Optional[dict]) -> str:
+    if "error" in result:
+        return f"{result['target']:>9}: failed with {result['error']}"
+    line = (f"{result['target']:>9}: {result['functions']} functions in {result['wall_seconds']:.2f}s, "
+            f"{result['functions_per_second']:.1f} functions/s, peak rss {result['peak_rss_mb']:.0f} MB, "
+            f"{result['model_calls']:.0f} model calls")
+    if previous is not None:
+        change = result["functions_per_second"] / previous["functions_per_second"] - 1
+        line += f" ({change:+.1%} vs {previous.get('revision') or previous['timestamp']})"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the indexing pipelines against a fake model server")
+    parser.add_argument("--size", choices=sorted(SIZES), default="small", help="synthetic repository size")
+    parser.add_argument("--functions", type=int, help="number of functions, instead of --size")
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"comma separated subset of {TARGETS}")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent summaries of tree_generate_summary")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds the fake server takes per request")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="completion token rate, 0 for instant")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repo", help="benchmark this directory instead of generating a repository")
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="results are appended to this JSONL file")
+    parser.add_argument("--label", default="", help="free text stored with the results, e.g. the change measured")
+    args = parser.parse_args()
+
+    targets = [target for target in args.targets.split(",") if target]
+    functions = args.functions or SIZES[args.size]
+    work_dir = None
+    root = args.repo
+    if root is None:
+        work_dir = tempfile.mkdtemp(prefix="smart-search-bench-")
+        root = os.path.join(work_dir, "repo")
+        written = generate_repo(root, functions, seed=args.seed)
+        print(f"Generated {written['functions']} functions in {written['files']} files under {root}")
+
+    server = FakeOllamaServer(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                              failure_rate=args.failure_rate, seed=args.seed).start()
+    results = load_results(args.results)
+    try:
+        for target in targets:
+            measured = run_isolated(target, root, server.url, args.workers)
+            result = {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "revision": git_revision(),
+                "label": args.label,
+                "target": target,
+                "functions": functions,
+                "workers": args.workers,
+                "server": {"latency": args.latency, "tokens_per_second": args.tokens_per_second,
+                           "failure_rate": args.failure_rate},
+                "python": platform.python_version(),
+                **measured,
+            }
+            if "error" not in result:
+                result["functions_per_second"] = functions / result["wall_seconds"]
+            print(format_result(result, previous_result(results, result)))
+            results.append(result)
+            with open(args.results, "a") as f:
+                f.write(json.dumps(result) + "\n")
+    finally:
+        server.close()
+        if work_dir is not None:
+            shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+from typing import Dict
+import os
+import random
+
+# benchmark sizes in number of functions
+SIZES = {"small": 100, "medium": 10_000, "large": 100_000}
+
+_VERBS = ["load", "parse", "build", "merge", "render", "score", "filter", "update", "encode", "resolve"]
+_NOUNS = ["config", "index", "record", "summary", "graph", "token", "batch", "tree", "query", "cache"]
+
+
+def _function(rng: random.Random, name: str, imported: str) -> str:
+    '''
+    one function of a realistic mix: mostly ordinary bodies, some trivial ones and some with docstrings
+    '''
+    kind = rng.random()
+    if kind < 0.1:
+        return f"    def {name}(self):\n        return self._{name}\n"
+    if kind < 0.2:
+        return (f"    def {name}(self, items):\n"
+                f'        """{name.replace("_", " ").capitalize()} every item and return the ones that are kept."""\n'
+                f"        return [item for item in items if item]\n")
+    steps = "\n".join(
+        f"        value = {imported}(value) + {rng.randint(1, 9)} if value else {rng.randint(0, 9)}"
+        for _ in range(rng.randint(2, 12))
+    )
+    return (f"    def {name}(self, value, limit={rng.randint(1, 100)}):\n"
+            f"        if value is None:\n            value = limit\n{steps}\n"
+            f"        return min(value, limit)\n")
+
+
+def generate_repo(root: str, functions: int, functions_per_file: int = 20, files_per_dir: int = 10,
+                  seed: int = 0) -> Dict[str, int]:
+    '''
+    Writes a python repository with the given number of functions under root: packages nested three levels deep,
+    files of methods that import helpers from other modules, so the relation pass has edges to find. The same
+    seed always writes the same repository. Returns the number of files, directories and functions written.
+    '''
+    rng = random.Random(seed)
+    files = max(1, (functions + functions_per_file - 1) // functions_per_file)
+    written = {"files": 0, "directories": 0, "functions": 0}
+    modules = []
+    for index in range(files):
+        directory = os.path.join(root, f"pkg{index // (files_per_dir ** 2)}", f"sub{index // files_per_dir}")
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+            written["directories"] += 1
+            open(os.path.join(directory, "__init__.py"), "w").close()
+        module = f"module{index}"
+        dotted = os.path.relpath(os.path.join(directory, module), root).replace(os.sep, ".")
+        count = min(functions_per_file, functions - written["functions"])
+        lines = ['"""Generated module for benchmarks."""']
+        imported = "abs"
+        if modules:
+            target = rng.choice(modules)
+            lines.append(f"from {target} import helper as upstream_helper")
+            imported = "upstream_helper"
+        lines.append("\n\ndef helper(value):\n    return value * 2\n\n\nclass Service:")
+        for i in range(max(0, count - 1)):
+            name = f"{rng.choice(_VERBS)}_{rng.choice(_NOUNS)}_{i}"
+            lines.append(_function(rng, name, imported))
+        if count <= 1:
+            lines.append("    pass")
+        with open(os.path.join(directory, f"{module}.py"), "w") as f:
+            f.write("\n".join(lines) + "\n")
+        modules.append(dotted)
+        written["files"] += 1
+        written["functions"] += max(1, count)
+    return written
@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from benchmarks.fake_ollama import FakeOllamaServer
+from benchmarks.run import format_result, previous_result, run_target
+from benchmarks.synthetic_repo import generate_repo
+from summary.llm_backend import OllamaBackend
+
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.temp_dir, "repo")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_generated_repo_is_deterministic(self):
+        written = generate_repo(self.root, 45, functions_per_file=10, files_per_dir=2)
+        self.assertEqual(written["functions"], 45)
+        self.assertEqual(written["files"], 5)
+        first = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                with open(os.path.join(dirpath, filename)) as f:
+                    first[os.path.relpath(os.path.join(dirpath, filename), self.root)] = f.read()
+        for source in first.values():
+            compile(source, "<generated>", "exec")
+        again = os.path.join(self.temp_dir, "again")
+        generate_repo(again, 45, functions_per_file=10, files_per_dir=2)
+        for path, source in first.items():
+            with open(os.path.join(again, path)) as f:
+                self.assertEqual(f.read(), source)
+
+    def test_server_answers_deterministically_and_injects_failures(self):
+        with FakeOllamaServer(failure_rate=0.5, seed=1) as server:
+            backend = OllamaBackend("fake", host=server.url, retries=20, backoff_seconds=0.001)
+            answers = [backend.generate(f"prompt {i}", kind="function") for i in range(10)]
+            self.assertEqual(answers, [FakeOllamaServer.answer(f"prompt {i}") for i in range(10)])
+            self.assertGreater(server.failures, 0)
+            self.assertEqual(server.requests, 10 + server.failures)
+
+    def test_batch_prompts_get_json(self):
+        answer = json.loads(FakeOllamaServer.answer("Reply with a JSON object.\n### Service.load\n### Service.save\n"))
+        self.assertEqual(sorted(answer), ["Service.load", "Service.save"])
+
+    def test_tree_benchmark_on_small_repo(self):
+        generate_repo(self.root, 20, functions_per_file=5)
+        with FakeOllamaServer() as server:
+            result = run_target("tree", self.root, server.url, workers=2)
+        self.assertEqual(result["summarized"], 20)
+        self.assertGreater(result["model_calls"], 0)
+        self.assertGreater(result["peak_rss_mb"], 0)
+
+    def test_result_compared_with_previous_run(self):
+        base = {"target": "tree", "functions": 100, "workers": 4, "server": {"latency": 0.0}}
+        older = dict(base, functions_per_second=50.0, revision="abc")
+        newer = dict(base, functions_per_second=75.0, wall_seconds=1.0, peak_rss_mb=10, model_calls=90)
+        other = dict(base, functions=1000, functions_per_second=10.0)
+        self.assertIs(previous_result([older, other], newer), older)
+        self.assertIn("+50.0% vs abc", format_result(newer, older))
+
+
+if __name__ == '__main__':
+    unittest.main()
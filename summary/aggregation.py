@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, TypeVar
+import threading
+
+from summary.run_stats import RunStats
+from summary.token_budget import CHARS_PER_TOKEN, estimate_tokens, pack
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def split_text(text: str, budget: int) -> List[str]:
+    '''
+    Splits text at line boundaries into consecutive segments of at most budget tokens that join back into text.
+    A single line that is longer than the budget on its own is cut into pieces.
+    '''
+    max_chars = max(1, (budget - 1) * CHARS_PER_TOKEN)
+    pieces = []
+    for line in text.splitlines(keepends=True):
+        pieces += [line[i:i + max_chars] for i in range(0, len(line), max_chars)]
+    return ["".join(group) for group in pack(pieces, budget, estimate_tokens)]
+
+
+class MapReduceAggregator:
+    '''
+    Keeps prompts that combine many parts (the function summaries of a file, the child summaries of a directory,
+    the segments of a long function) inside a token budget. Parts that do not fit in one prompt are packed into
+    chunks that do, the chunks are summarized concurrently and the partial summaries take their place, level by
+    level, until everything fits. The number of sequential generations per node therefore grows with the log of
+    its width instead of its prompt growing without bound.
+    Chunks are summarized on an executor of their own: the callers are scheduler jobs that wait for the result,
+    so running the chunks on the scheduler's workers could leave every worker waiting.
+    '''
+    def __init__(self, budget: int, max_workers: int = 4, max_levels: int = 8, stats: Optional[RunStats] = None):
+        self.budget = budget
+        self.max_workers = max_workers
+        self.max_levels = max_levels  # guards against summaries that do not get shorter
+        self.stats = stats if stats is not None else RunStats()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def fits(self, text: str) -> bool:
+        return estimate_tokens(text) <= self.budget
+
+    def map(self, fn: Callable[[T], R], items: List[T]) -> List[R]:
+        '''
+        applies fn to items concurrently, keeping their order
+        '''
+        if len(items) == 1:
+            return [fn(items[0])]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return list(self._executor.map(fn, items))
+
+    def reduce(self, parts: List[str], summarize_chunk: Callable[[str], str]) -> List[str]:
+        '''
+        Returns parts, or partial summaries standing in for them, that fit in one prompt together.
+        summarize_chunk turns the concatenation of a chunk of parts into one part.
+        '''
+        level = 0
+        while not self.fits("".join(parts)) and level < self.max_levels:
+            level += 1
+            # a part over the budget on its own is split first, so every chunk fits in a prompt
+            parts = [segment for part in parts for segment in
+                     (split_text(part, self.budget) if not self.fits(part) else [part])]
+            chunks = pack(parts, self.budget, estimate_tokens)
+            self.stats.incr("map-reduce chunks", len(chunks))
+            parts = self.map(lambda chunk: summarize_chunk("".join(chunk)), chunks)
+        if level:
+            self.stats.incr("map-reduce levels", level)
+        return parts
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -0,0 +1,274 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from pydantic import BaseModel
+import ast
+import hashlib
+import os
+import threading
+
+from summary.repo_scanner import decode_text
+from summary.fingerprint import fingerprint
+from summary.tiers import FunctionFeatures, function_features
+
+
+class FunctionInfo(BaseModel):
+    name: str
+    qualname: str  # dotted path through enclosing classes and functions, e.g. Node.__init__
+    class_name: Optional[str] = None  # set for methods
+    is_async: bool = False
+    lineno: int
+    end_lineno: int
+    code: str
+    calls: List[str] = []  # dotted names the function calls, once each; super().name is recorded as super.name
+    features: Optional[FunctionFeatures] = None  # what TierSelector chooses the way to summarize it by
+    fingerprint: Optional[str] = None  # shared by copies that only differ in formatting, comments and docstrings
+    renamed_fingerprint: Optional[str] = None  # also shared by copies with other local names
+
+
+class ClassInfo(BaseModel):
+    name: str
+    qualname: str
+    bases: List[str] = []  # dotted names of the base classes
+
+
+class ImportInfo(BaseModel):
+    module: Optional[str]  # None for "from . import x"
+    names: List[Tuple[str, Optional[str]]]  # (name, asname); for "import a.b" the name is the module itself
+    level: int = 0  # number of leading dots of a relative import
+    is_from: bool = False
+    lineno: int
+
+
+class ParsedFile(BaseModel):
+    path: str = ""
+    sha256: str  # of the text that was parsed
+    file_sha256: str = ""  # of the bytes of the file, as RepoScanner hashes them; set when parsed from a file
+    functions: List[FunctionInfo] = []
+    classes: List[ClassInfo] = []
+    imports: List[ImportInfo] = []
+    docstring: Optional[str] = None  # the module docstring
+    calls: List[str] = []  # dotted names called anywhere in the file, e.g. helpers.load, once each
+    bases: List[str] = []  # dotted names of the base classes of the classes defined in the file, once each
+    error: Optional[str] = None
+
+
+def dotted_name(node: ast.AST) -> Optional[str]:
+    '''
+    the dotted name an expression spells out (a.b.c for attribute access on a name), None for anything else
+    '''
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+class _Visitor(ast.NodeVisitor):
+    '''
+    collects functions (with their enclosing class and the names they call), classes, imports, called names and base
+    classes in source order in a single traversal
+    '''
+    def __init__(self, lines: List[str]):
+        self.lines = lines
+        self.scope: List[Tuple[str, str]] = []  # ("class" | "function", name)
+        self.functions: List[FunctionInfo] = []
+        self.imports: List[ImportInfo] = []
+        self.classes: List[ClassInfo] = []
+        self.calls: Dict[str, None] = {}  # ordered sets
+        self.bases: Dict[str, None] = {}
+        self.function_calls: List[Dict[str, None]] = []  # calls of the functions being visited, innermost last
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        bases = [name for name in map(dotted_name, node.bases) if name is not None]
+        for name in bases:
+            self.bases[name] = None
+        self.classes.append(ClassInfo(
+            name=node.name,
+            qualname=".".join([name for _, name in self.scope] + [node.name]),
+            bases=bases,
+        ))
+        self.scope.append(("class", node.name))
+        self.generic_visit(node)
+        self.scope.pop()
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self._visit_function(node, is_async=False)
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
+        self._visit_function(node, is_async=True)
+
+    def _visit_function(self, node, is_async: bool):
+        class_name = self.scope[-1][1] if self.scope and self.scope[-1][0] == "class" else None
+        info = FunctionInfo(
+            name=node.name,
+            qualname=".".join([name for _, name in self.scope] + [node.name]),
+            class_name=class_name,
+            is_async=is_async,
+            lineno=node.lineno,
+            end_lineno=node.end_lineno,
+            code="\n".join(self.lines[node.lineno - 1: node.end_lineno]),
+            features=function_features(node),
+            fingerprint=fingerprint(node),
+            renamed_fingerprint=fingerprint(node, rename_identifiers=True),
+        )
+        self.functions.append(info)
+        self.scope.append(("function", node.name))
+        self.function_calls.append({})
+        self.generic_visit(node)
+        info.calls = list(self.function_calls.pop())
+        self.scope.pop()
+
+    def visit_Call(self, node: ast.Call):
+        name = dotted_name(node.func)
+        if name is not None:
+            self.calls[name] = None
+        elif isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Call) and \
+                dotted_name(node.func.value.func) == "super":
+            name = f"super.{node.func.attr}"
+        if name is not None and self.function_calls:
+            self.function_calls[-1][name] = None
+        self.generic_visit(node)
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            self.imports.append(ImportInfo(module=alias.name, names=[(alias.name, alias.asname)], lineno=node.lineno))
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        self.imports.append(ImportInfo(
+            module=node.module,
+            names=[(alias.name, alias.asname) for alias in node.names],
+            level=node.level,
+            is_from=True,
+            lineno=node.lineno,
+        ))
+
+
+# ast.parse is not thread safe on some CPython 3.11 releases (the AST recursion depth check is shared between
+# threads and fails with "AST constructor recursion depth mismatch"), so parses from worker threads take turns
+_PARSE_LOCK = threading.Lock()
+
+
+def parse(source: str) -> ast.Module:
+    with _PARSE_LOCK:
+        return ast.parse(source)
+
+
+def extract_source(content: str, path: str = "", file_sha256: str = "") -> ParsedFile:
+    '''
+    Parses python source once and returns its functions (including async functions and methods) and imports
+    '''
+    sha256 = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    try:
+        tree = parse(content)
+    except Exception as e:
+        return ParsedFile(path=path, sha256=sha256, file_sha256=file_sha256, error=str(e))
+    visitor = _Visitor(content.splitlines())
+    visitor.visit(tree)
+    return ParsedFile(path=path, sha256=sha256, file_sha256=file_sha256, functions=visitor.functions,
+                      classes=visitor.classes,
+                      imports=visitor.imports, docstring=ast.get_docstring(tree), calls=list(visitor.calls),
+                      bases=list(visitor.bases))
+
+
+def extract_path(path: str) -> ParsedFile:
+    '''
+    reads and parses one file, runs in the worker processes of ASTExtractor
+    '''
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+        content = decode_text(raw)
+    except Exception as e:
+        return ParsedFile(path=path, sha256="", error=str(e))
+    return extract_source(content, path, hashlib.sha256(raw).hexdigest())
+
+
+class ASTExtractor:
+    '''
+    The one place python files are parsed. extract_paths and extract_manifest parse many files at once on a
+    process pool, and every result is cached by the hash of the text it parsed, so later lookups from any pass
+    (function summaries, imports for relations) reuse the same parse instead of calling ast.parse again. Parses of
+    files are also indexed by the hash of the file's bytes, the one a RepoManifest records, which differs from the
+    text hash when reading translates newlines (e.g. CRLF files).
+    Small batches are parsed in process, where starting a pool would cost more than it saves.
+    '''
+    def __init__(self, max_workers: Optional[int] = None, min_pool_files: int = 64, chunksize: int = 16):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_pool_files = min_pool_files
+        self.chunksize = chunksize
+        self._by_hash: Dict[str, ParsedFile] = {}  # text sha256 -> parse
+        self._by_file: Dict[str, ParsedFile] = {}  # file sha256 -> parse
+        self._lock = threading.Lock()
+        self.parsed = 0  # number of ast.parse calls made, for statistics
+
+    def extract_paths(self, paths: Iterable[str]) -> Dict[str, ParsedFile]:
+        return self._register(self._map(extract_path, list(paths)))
+
+    def extract_manifest(self, manifest) -> Dict[str, ParsedFile]:
+        '''
+        parses every python file of a RepoManifest that has not been parsed yet, from the text the manifest read
+        while hashing it when it still has it
+        '''
+        with self._lock:
+            entries = [entry for entry in manifest.python_files() if entry.sha256 not in self._by_file]
+        contents, paths, hashes = [], [], []
+        for entry in entries:
+            content = manifest.read_text(entry.path)
+            if content is not None:
+                contents.append(content)
+                paths.append(entry.path)
+                hashes.append(entry.sha256 or "")
+        return self._register(self._map(extract_source, contents, paths, hashes))
+
+    def _map(self, function, *args: list) -> List[ParsedFile]:
+        if len(args[0]) >= self.min_pool_files and self.max_workers > 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                return list(pool.map(function, *args, chunksize=self.chunksize))
+        return [function(*arg) for arg in zip(*args)]
+
+    def _register(self, results: List[ParsedFile]) -> Dict[str, ParsedFile]:
+        with self._lock:
+            self.parsed += len(results)
+            for parsed in results:
+                if parsed.sha256:
+                    self._by_hash[parsed.sha256] = parsed
+                if parsed.file_sha256:
+                    self._by_file[parsed.file_sha256] = parsed
+        return {parsed.path: parsed for parsed in results}
+
+    def parsed_manifest(self, manifest) -> Dict[str, ParsedFile]:
+        '''
+        maps the path of every python file of a RepoManifest to its parse, parsing the files not parsed yet
+        '''
+        self.extract_manifest(manifest)
+        with self._lock:
+            return {entry.path: self._by_file[entry.sha256] for entry in manifest.python_files()
+                    if entry.sha256 in self._by_file}
+
+    def forget(self, content: str) -> None:
+        '''
+        drops the cached parse of content once no pass needs it any more, so a run does not keep the parse of
+        every file it has summarized
+        '''
+        sha256 = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        with self._lock:
+            parsed = self._by_hash.pop(sha256, None)
+            if parsed is not None and parsed.file_sha256:
+                self._by_file.pop(parsed.file_sha256, None)
+
+    def extract(self, content: str, path: str = "") -> ParsedFile:
+        '''
+        returns the cached parse of content, parsing it now if no pass has parsed it before
+        '''
+        sha256 = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        with self._lock:
+            parsed = self._by_hash.get(sha256)
+        if parsed is None:
+            parsed = extract_source(content, path)
+            with self._lock:
+                self.parsed += 1
+                self._by_hash[sha256] = parsed
+        return parsed
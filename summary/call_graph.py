@@ -0,0 +1,176 @@
+from typing import Dict, List, Optional, Set, Tuple
+import os
+
+from summary.ast_extract import ParsedFile
+from summary.graph_store import GraphStore
+from summary.import_graph import ModuleIndex
+
+FUNCTION = "function"
+CLASS = "class"
+MODULE = "module"
+IMPORT = "import"
+
+# what a name resolves to: (FUNCTION | CLASS | MODULE, path of the module, qualname, empty for a module)
+Resolved = Tuple[str, str, str]
+
+
+def function_id(path: str, qualname: str) -> str:
+    '''
+    the id of a function in the call graph, e.g. pkg/models.py::Model.save
+    '''
+    return f"{os.path.normpath(path)}::{qualname}"
+
+
+class CallGraphBuilder:
+    '''
+    Resolves the calls of every function of the parsed files to the local functions and methods they call, without
+    running anything. A called name is looked up in the enclosing functions and the top level definitions and
+    imports of its module; imported names are followed to the module they come from (and through re-exports of
+    packages). Calls of a class resolve to its __init__, self.name and cls.name to the method of the enclosing
+    class or the nearest base class that defines it, and super().name to the nearest base class that defines it.
+    Calls that can not be resolved statically, e.g. methods of parameters, are left out.
+    '''
+    def __init__(self, index: ModuleIndex, parsed_files: Dict[str, ParsedFile], max_depth: int = 8):
+        self.index = index
+        self.parsed = {os.path.normpath(path): parsed for path, parsed in parsed_files.items()
+                       if parsed.error is None}
+        self.max_depth = max_depth  # of import and inheritance chains followed
+        self._symbols: Dict[str, Dict[str, Tuple[str, str, Optional[str]]]] = {}
+        self._functions: Dict[str, Set[str]] = {}  # path -> qualnames of its functions
+        self._bases: Dict[str, Dict[str, List[str]]] = {}  # path -> class qualname -> dotted base names
+        self.resolved = 0
+        self.unresolved = 0
+
+    def symbols(self, path: str) -> Dict[str, Tuple[str, str, Optional[str]]]:
+        '''
+        The top level names of a module: name -> (FUNCTION | CLASS, path, qualname) for its definitions and
+        (IMPORT, path of the module imported, name imported from it or None) for its imports of local modules
+        '''
+        table = self._symbols.get(path)
+        if table is None:
+            table = {}
+            parsed = self.parsed.get(path)
+            if parsed is not None:
+                for info in parsed.imports:
+                    for local, target, symbol in self.index.bindings(path, info):
+                        if local is not None:
+                            table[local] = (IMPORT, os.path.normpath(target), symbol)
+                # definitions usually come after the imports and shadow them
+                for cls in parsed.classes:
+                    if cls.qualname == cls.name:
+                        table[cls.name] = (CLASS, path, cls.qualname)
+                for func in parsed.functions:
+                    if func.qualname == func.name:
+                        table[func.name] = (FUNCTION, path, func.qualname)
+            self._symbols[path] = table
+        return table
+
+    def functions(self, path: str) -> Set[str]:
+        if path not in self._functions:
+            parsed = self.parsed.get(path)
+            self._functions[path] = {func.qualname for func in parsed.functions} if parsed is not None else set()
+        return self._functions[path]
+
+    def bases(self, path: str, class_qualname: str) -> List[str]:
+        if path not in self._bases:
+            parsed = self.parsed.get(path)
+            self._bases[path] = {cls.qualname: cls.bases for cls in parsed.classes} if parsed is not None else {}
+        return self._bases[path].get(class_qualname, [])
+
+    def resolve_name(self, path: str, name: str, depth: int = 0) -> Optional[Resolved]:
+        '''
+        what a dotted name used at the top level of the module at path refers to, None if it is not local
+        '''
+        if depth > self.max_depth:
+            return None
+        table = self.symbols(path)
+        parts = name.split(".")
+        for i in range(len(parts), 0, -1):
+            entry = table.get(".".join(parts[:i]))
+            if entry is not None:
+                break
+        else:
+            return None
+        kind, target, symbol = entry
+        rest = parts[i:]
+        if kind == FUNCTION:
+            return (FUNCTION, target, symbol) if not rest else None
+        if kind == CLASS:
+            if not rest:
+                return CLASS, target, symbol
+            return self.find_method(target, symbol, rest[0], depth + 1) if len(rest) == 1 else None
+        # an import: of the module itself, or of a name defined or re-exported by it
+        rest = ([symbol] if symbol is not None else []) + rest
+        if not rest:
+            return MODULE, target, ""
+        return self.resolve_name(target, ".".join(rest), depth + 1)
+
+    def find_method(self, path: str, class_qualname: str, method: str, depth: int = 0,
+                    skip_own: bool = False) -> Optional[Resolved]:
+        '''
+        the method called method of a class or, following its bases, the nearest base class that defines it
+        '''
+        if depth > self.max_depth:
+            return None
+        qualname = f"{class_qualname}.{method}"
+        if not skip_own and qualname in self.functions(path):
+            return FUNCTION, path, qualname
+        for base in self.bases(path, class_qualname):
+            resolved = self.resolve_name(path, base, depth + 1)
+            if resolved is not None and resolved[0] == CLASS:
+                found = self.find_method(resolved[1], resolved[2], method, depth + 1)
+                if found is not None:
+                    return found
+        return None
+
+    def resolve_call(self, path: str, caller: str, class_name: Optional[str], name: str) -> Optional[Resolved]:
+        '''
+        the local function a call of name made in the function caller (a qualname) of the module at path runs
+        '''
+        parts = name.split(".")
+        if class_name is not None and len(parts) == 2 and parts[0] in ("self", "cls", "super"):
+            class_qualname = caller.rsplit(".", 1)[0]
+            return self.find_method(path, class_qualname, parts[1], skip_own=parts[0] == "super")
+        # functions defined inside the caller or the functions enclosing it; class bodies are not enclosing scopes
+        scope = caller.split(".")
+        functions = self.functions(path)
+        for i in range(len(scope), 0, -1):
+            qualname = ".".join(scope[:i] + [name])
+            if len(parts) == 1 and ".".join(scope[:i]) in functions and qualname in functions:
+                return FUNCTION, path, qualname
+        resolved = self.resolve_name(path, name)
+        if resolved is not None and resolved[0] == CLASS:
+            resolved = self.find_method(resolved[1], resolved[2], "__init__")
+        return resolved if resolved is not None and resolved[0] == FUNCTION else None
+
+    def build(self, graph: Optional[GraphStore] = None) -> GraphStore:
+        '''
+        Adds a node for every function and an edge caller -> callee for every resolved call to graph (a new one by
+        default); the description of an edge is the name that was called
+        '''
+        graph = graph if graph is not None else GraphStore()
+        for path, parsed in self.parsed.items():
+            for func in parsed.functions:
+                caller = function_id(path, func.qualname)
+                graph.add_node(caller)
+                for name in func.calls:
+                    resolved = self.resolve_call(path, func.qualname, func.class_name, name)
+                    if resolved is None:
+                        self.unresolved += 1
+                        continue
+                    self.resolved += 1
+                    callee = function_id(resolved[1], resolved[2])
+                    if callee != caller:
+                        graph.add_edge(caller, callee, name)
+        return graph
+
+
+def build_call_graph(index: ModuleIndex, parsed_files: Dict[str, ParsedFile]) -> GraphStore:
+    return CallGraphBuilder(index, parsed_files).build()
+
+
+def callers_and_callees(graph: GraphStore, function: str, limit: int = 10) -> Dict[str, List[str]]:
+    '''
+    the ids of the functions that call function and that function calls, at most limit of each, for retrieval
+    '''
+    return {"callers": graph.used_by(function)[:limit], "callees": graph.uses(function)[:limit]}
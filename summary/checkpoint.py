@@ -0,0 +1,142 @@
+from collections import defaultdict
+from typing import Callable, Dict, List, Tuple
+import os
+import threading
+import time
+
+from summary.ndjson_writer import NDJSONTreeWriter, iter_records, nest_records, node_record
+
+FUNCTION_RECORD = "function"
+
+
+class Checkpoint:
+    '''
+    Records finished function summaries and finished nodes of a run in an NDJSON file so a crashed run can be resumed.
+    Every record is flushed when it is written, and the file is synced to disk every sync_every records or
+    sync_seconds seconds, whichever comes first. Safe to call from the scheduler's worker threads.
+    '''
+    def __init__(self, path: str, resume: bool = False, sync_every: int = 50, sync_seconds: float = 30.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_seconds = sync_seconds
+        if resume and os.path.exists(path):
+            trim_partial_line(path)
+        self._writer = NDJSONTreeWriter(path, mode="a" if resume else "w")
+        self._last_sync = time.monotonic()
+        self._unsynced = 0
+        self._failed = set()  # nodes whose summary or a summary below them failed, regenerated on resume
+        self._lock = threading.Lock()  # guards the sync counters and _failed
+
+    def record_function(self, file_path: str, summary) -> None:
+        if "error" in summary.metadata:
+            return
+        self._write({"kind": FUNCTION_RECORD, "path": file_path, "summary": summary.model_dump()})
+
+    def record_node(self, node) -> None:
+        summaries = list(node.summaries) + ([node.final_summary] if node.final_summary else [])
+        with self._lock:
+            if any("error" in summary.metadata for summary in summaries):
+                # children finish before their parents, so marking the ancestors here keeps them out as well
+                ancestor = failed_key(node.path)
+                while ancestor not in self._failed:
+                    self._failed.add(ancestor)
+                    ancestor = os.path.dirname(ancestor)
+            if failed_key(node.path) in self._failed:
+                return
+        self._write(node_record(node))
+
+    def _write(self, record: dict) -> None:
+        self._writer.write_record(record)
+        with self._lock:
+            self._unsynced += 1
+            due = self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_seconds
+            if due:
+                self._reset_sync()
+        if due:
+            # outside the lock, the other threads keep writing while the file is synced
+            self._writer.fsync()
+
+    def sync(self) -> None:
+        with self._lock:
+            self._reset_sync()
+        self._writer.fsync()
+
+    def _reset_sync(self) -> None:
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self, remove: bool = False) -> None:
+        self._writer.close()
+        if remove:
+            os.remove(self.path)
+
+
+def failed_key(path: str) -> str:
+    '''
+    the normalized path a node is marked failed under; a root of "" or "." is "", which is also what dirname
+    returns above a top level relative path
+    '''
+    path = os.path.normpath(path) if path else ""
+    return "" if path == "." else path
+
+
+def trim_partial_line(path: str) -> None:
+    '''
+    cuts a file back to its last complete line, dropping what a crash left half written, so appending to it starts
+    on a new line
+    '''
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 4096)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            f.truncate(position)
+
+
+class CheckpointIndex:
+    '''
+    Tells the summary generator which work a crashed run already finished, with the same interface as
+    IncrementalIndex. A file or directory is reused when it was checkpointed as finished; for the remaining files,
+    functions that were summarized before the crash are reused when their code is unchanged.
+    node_factory turns the nested dict of a finished subtree back into a node (tree_generate_summary.node_from_dict)
+    and summary_factory turns a summary dict back into a SummaryResult.
+    '''
+    def __init__(self, path: str, node_factory: Callable[[dict], object], summary_factory: Callable[..., object]):
+        self.node_factory = node_factory
+        self.summary_factory = summary_factory
+        self.records: Dict[str, dict] = {}
+        self.children: Dict[str, List[dict]] = defaultdict(list)
+        self.functions: Dict[Tuple[str, str, str], dict] = {}
+        if not os.path.exists(path):
+            print(f"No checkpoint found at {path}, starting from scratch")
+            return
+        for record in iter_records(path):
+            if record.get("kind") == FUNCTION_RECORD:
+                summary = record["summary"]
+                self.functions[(record["path"], summary["name"], summary["code"])] = summary
+            else:
+                self.records[record["path"]] = record
+        for record in self.records.values():
+            if record["parent_path"] is not None:
+                self.children[record["parent_path"]].append(record)
+        print(f"Checkpoint has {len(self.records)} finished nodes and {len(self.functions)} finished functions")
+
+    def reusable_node(self, path: str):
+        record = self.records.get(path)
+        if record is None:
+            return None
+        return self.node_factory(nest_records(record, self.children))
+
+    def reusable_function(self, file_path: str, name: str, code: str):
+        summary = self.functions.get((file_path, name, code))
+        if summary is None:
+            return None
+        return self.summary_factory(**summary)
@@ -0,0 +1,134 @@
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import sys
+import threading
+
+
+class StaleSourceError(Exception):
+    '''
+    Raised when a code reference is resolved after its file changed on disk since it was summarized
+    '''
+
+
+class SourceFile:
+    '''
+    A file of the local checkout that code references point into. Every reference of a file shares one instance,
+    which remembers the hash of the content that was summarized, so code read back after the file changed on disk
+    raises StaleSourceError instead of being stored next to a summary of other code.
+    '''
+    __slots__ = ("path", "sha256")
+
+    def __init__(self, path: str, content: str):
+        self.path = sys.intern(path)
+        self.sha256 = hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def ref(self, lineno: Optional[int] = None, end_lineno: Optional[int] = None) -> "CodeRef":
+        return CodeRef(self, lineno, end_lineno)
+
+
+class SourceCache:
+    '''
+    The lines of the files code references were most recently resolved from, least recently used files evicted
+    first. Resolving the references of a tree file by file, as dumps() does, reads every file once.
+    '''
+    def __init__(self, max_files: int = 32):
+        self.max_files = max_files
+        self._files: "OrderedDict[str, tuple]" = OrderedDict()  # path -> (sha256, content, lines)
+        self._lock = threading.Lock()
+        self.reads = 0
+
+    def remember(self, source: SourceFile, content: str) -> None:
+        '''
+        caches content that was just read, so the references of a file that are serialized right after it is
+        summarized (e.g. by the NDJSON writer) do not read it again
+        '''
+        with self._lock:
+            self._files[source.path] = (source.sha256, content, content.splitlines())
+            self._files.move_to_end(source.path)
+            while len(self._files) > self.max_files:
+                self._files.popitem(last=False)
+
+    def content(self, source: SourceFile) -> tuple:
+        '''
+        (content, lines) of the file source was summarized from, StaleSourceError if it has changed since
+        '''
+        with self._lock:
+            entry = self._files.get(source.path)
+            if entry is not None:
+                self._files.move_to_end(source.path)
+        if entry is None:
+            with open(source.path, "r") as f:
+                content = f.read()
+            entry = (hashlib.sha256(content.encode("utf-8")).hexdigest(), content, content.splitlines())
+            with self._lock:
+                self.reads += 1
+                self._files[source.path] = entry
+                while len(self._files) > self.max_files:
+                    self._files.popitem(last=False)
+        sha256, content, lines = entry
+        if sha256 != source.sha256:
+            raise StaleSourceError(f"{source.path} changed since it was summarized")
+        return content, lines
+
+
+SOURCES = SourceCache()
+
+
+class CodeRef:
+    '''
+    Code stored as a reference to lines lineno..end_lineno (1 based, inclusive) of a SourceFile instead of a copy
+    of the text, resolved when it is read. Without a line span it is the whole file. Resolves to exactly the text
+    ast_extract cut out of the file, and compares equal to it.
+    '''
+    __slots__ = ("source", "lineno", "end_lineno")
+
+    def __init__(self, source: SourceFile, lineno: Optional[int] = None, end_lineno: Optional[int] = None):
+        self.source = source
+        self.lineno = lineno
+        self.end_lineno = end_lineno
+
+    def resolve(self, cache: SourceCache = SOURCES) -> str:
+        content, lines = cache.content(self.source)
+        if self.lineno is None:
+            return content
+        return "\n".join(lines[self.lineno - 1: self.end_lineno])
+
+    def __str__(self) -> str:
+        return self.resolve()
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, CodeRef):
+            return (self.source.path, self.lineno, self.end_lineno) == \
+                   (other.source.path, other.lineno, other.end_lineno)
+        if isinstance(other, str):
+            try:
+                return self.resolve() == other
+            except StaleSourceError:
+                return False
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self.source.path, self.lineno, self.end_lineno))
+
+    def __repr__(self) -> str:
+        span = "" if self.lineno is None else f":{self.lineno}-{self.end_lineno}"
+        return f"CodeRef({self.source.path}{span})"
+
+
+def code_text(code) -> str:
+    '''
+    the text of code that is either a string or a CodeRef, StaleSourceError if the file of a CodeRef changed
+    '''
+    return code if isinstance(code, str) else code.resolve()
+
+
+def is_stale(code) -> bool:
+    '''
+    whether code is a CodeRef into a file that changed since it was summarized
+    '''
+    try:
+        code_text(code)
+    except StaleSourceError:
+        return True
+    return False
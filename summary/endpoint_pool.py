@@ -0,0 +1,157 @@
+from typing import Dict, List, Optional, Sequence, Union
+import threading
+import time
+
+from summary.llm_backend import Generation, LLMBackend, LLMError
+
+
+class Endpoint:
+    '''
+    One inference server of an EndpointPool and what the pool knows about it
+    '''
+    def __init__(self, backend: LLMBackend, max_concurrency: int, name: Optional[str] = None):
+        self.backend = backend
+        self.name = name or getattr(backend, "host", None) or backend.model
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.healthy = True
+        self.retry_at = 0.0  # when an unhealthy endpoint is health checked again
+        self.calls = 0
+        self.failures = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def load(self) -> float:
+        return self.active / self.max_concurrency
+
+    @property
+    def average_seconds(self) -> float:
+        return self.busy_seconds / self.calls if self.calls else 0.0
+
+
+class EndpointPool(LLMBackend):
+    '''
+    Spreads prompts over several inference servers that serve the same model. Every prompt goes to the healthy
+    endpoint with the lowest load (active prompts over its concurrency limit, the faster one on ties); when every
+    endpoint is at its limit the caller waits for the first one to free up, so fast endpoints pull more of the
+    queued work than slow ones. An endpoint that fails a prompt is marked unhealthy and the prompt is requeued on
+    the others. Unhealthy endpoints are health checked again after health_check_seconds and rejoin the pool, with
+    the circuit breaker of their backend closed, when the check passes; while every endpoint is down, callers wait
+    for the next health check, giving up with an LLMError after max_wait_seconds (twice health_check_seconds by
+    default). Throughput per endpoint is recorded in self.stats and summarized by report().
+    The endpoint backends should retry little themselves, so a failing endpoint hands its prompts back quickly.
+    '''
+    def __init__(self, endpoints: Sequence[LLMBackend], max_concurrency: Union[int, Sequence[int]] = 2,
+                 health_check_seconds: float = 10.0, max_requeues: Optional[int] = None,
+                 max_wait_seconds: Optional[float] = None, **kwargs):
+        if not endpoints:
+            raise ValueError("an endpoint pool needs at least one endpoint")
+        limits = [max_concurrency] * len(endpoints) if isinstance(max_concurrency, int) else list(max_concurrency)
+        if len(limits) != len(endpoints):
+            raise ValueError(f"got {len(limits)} concurrency limits for {len(endpoints)} endpoints")
+        kwargs.setdefault("retries", 0)  # failed prompts are requeued on another endpoint instead
+        super().__init__(endpoints[0].model, **kwargs)
+        self.endpoints = [Endpoint(backend, limit) for backend, limit in zip(endpoints, limits)]
+        self.health_check_seconds = health_check_seconds
+        self.max_wait_seconds = max_wait_seconds if max_wait_seconds is not None else 2 * health_check_seconds
+        self.max_requeues = max_requeues if max_requeues is not None else 2 * len(self.endpoints)
+        self._available = threading.Condition()
+
+    def _generate_full(self, prompt: str, options: dict, context: Optional[List[int]]) -> Generation:
+        requeues = 0
+        while True:
+            endpoint = self._acquire()
+            start = time.perf_counter()
+            try:
+                generation = endpoint.backend.generate_full(prompt, options=options)
+            except Exception as e:
+                if not endpoint.backend.is_retryable(e.__cause__ or e):
+                    # the prompt itself was rejected, so another endpoint would reject it as well
+                    self._release(endpoint, time.perf_counter() - start)
+                    raise
+                self._release(endpoint, time.perf_counter() - start, error=e)
+                if requeues >= self.max_requeues:
+                    raise
+                requeues += 1
+                self.stats.incr("requeued prompts")
+                continue
+            self._release(endpoint, time.perf_counter() - start)
+            return generation
+
+    def _acquire(self) -> Endpoint:
+        deadline = time.monotonic() + self.max_wait_seconds
+        while True:
+            self._check_health()
+            with self._available:
+                ready = [e for e in self.endpoints if e.healthy and e.active < e.max_concurrency]
+                if ready:
+                    endpoint = min(ready, key=lambda e: (e.load, e.average_seconds))
+                    endpoint.active += 1
+                    return endpoint
+                if any(e.healthy for e in self.endpoints):
+                    self._available.wait()
+                    continue
+                # every endpoint is down: wait for the next health check unless it comes after the deadline
+                now = time.monotonic()
+                if min(e.retry_at for e in self.endpoints) > deadline:
+                    raise LLMError("no healthy inference endpoint")
+                self._available.wait(max(0.0, min(e.retry_at for e in self.endpoints) - now))
+
+    def _release(self, endpoint: Endpoint, seconds: float, error: Optional[Exception] = None) -> None:
+        with self._available:
+            endpoint.active -= 1
+            endpoint.calls += 1
+            endpoint.busy_seconds += seconds
+            self.stats.incr(f"{endpoint.name} calls")
+            self.stats.incr(f"{endpoint.name} seconds", seconds)
+            if error is not None:
+                endpoint.failures += 1
+                self.stats.incr(f"{endpoint.name} failures")
+                if endpoint.healthy:
+                    print(f"Endpoint {endpoint.name} failed, requeueing its prompts: {error}")
+                endpoint.healthy = False
+                endpoint.retry_at = time.monotonic() + self.health_check_seconds
+            self._available.notify_all()
+
+    def _check_health(self) -> None:
+        now = time.monotonic()
+        with self._available:
+            due = [e for e in self.endpoints if not e.healthy and now >= e.retry_at]
+            for endpoint in due:
+                endpoint.retry_at = now + self.health_check_seconds  # checked by this caller only
+        for endpoint in due:
+            self.stats.incr("health checks")
+            if endpoint.backend.health_check():
+                print(f"Endpoint {endpoint.name} is healthy again")
+                # the backend's own breaker may still be open for longer than the health check interval
+                endpoint.backend.reset_circuit()
+                with self._available:
+                    endpoint.healthy = True
+                    self._available.notify_all()
+
+    def health_check(self) -> bool:
+        return any(endpoint.backend.health_check() for endpoint in self.endpoints)
+
+    def throughput(self) -> Dict[str, Dict[str, float]]:
+        '''
+        calls, failures, average seconds per call and share of all calls of every endpoint
+        '''
+        with self._available:
+            total = sum(endpoint.calls for endpoint in self.endpoints) or 1
+            return {
+                endpoint.name: {
+                    "calls": endpoint.calls,
+                    "failures": endpoint.failures,
+                    "average_seconds": round(endpoint.average_seconds, 3),
+                    "share": round(endpoint.calls / total, 3),
+                    "healthy": endpoint.healthy,
+                }
+                for endpoint in self.endpoints
+            }
+
+    def report(self) -> str:
+        return "\n".join(
+            f"{name}: {row['calls']} calls ({row['share']:.0%}), {row['failures']} failures, "
+            f"{row['average_seconds']}s per call{'' if row['healthy'] else ', unhealthy'}"
+            for name, row in self.throughput().items()
+        )
@@ -0,0 +1,63 @@
+from typing import Dict, List, Set
+import ast
+import hashlib
+
+_FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+
+def _local_names(func) -> Set[str]:
+    '''
+    the names of the function, the functions nested in it, their arguments and every variable assigned in them
+    '''
+    names = set()
+    for node in ast.walk(func):
+        if isinstance(node, _FUNCTIONS):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+    return names
+
+
+class _Dump:
+    '''
+    Writes out a function's AST without docstrings, positions or field names and, with rename_identifiers, with the
+    function, its arguments and its local variables renamed to placeholders in order of first appearance. Globals,
+    builtins and attributes keep their names, since renaming them would make functions that do different things
+    look the same. The tree is only read, it belongs to the ParsedFile it came from.
+    '''
+    def __init__(self, func, rename_identifiers: bool):
+        self.locals = _local_names(func) if rename_identifiers else set()
+        self.names: Dict[str, str] = {}
+
+    def placeholder(self, name: str) -> str:
+        if name not in self.locals:
+            return name
+        return self.names.setdefault(name, f"_v{len(self.names)}")
+
+    def dump(self, value) -> str:
+        if isinstance(value, list):
+            return "[" + ", ".join(self.dump(item) for item in value) + "]"
+        if not isinstance(value, ast.AST):
+            return repr(value)
+        fields: List[str] = []
+        for field in value._fields:
+            child = getattr(value, field, None)
+            if isinstance(value, _FUNCTIONS) and field == "name" or isinstance(value, ast.arg) and field == "arg" \
+                    or isinstance(value, ast.Name) and field == "id":
+                child = self.placeholder(child)
+            elif isinstance(value, _FUNCTIONS) and field == "body" and ast.get_docstring(value, clean=False) is not None:
+                child = child[1:] or [ast.Pass()]
+            fields.append(self.dump(child))
+        return f"{type(value).__name__}({', '.join(fields)})"
+
+
+def fingerprint(func, rename_identifiers: bool = False) -> str:
+    '''
+    Hash of the normalized AST of a function (FunctionDef or AsyncFunctionDef), so copies that only differ in
+    whitespace, comments and docstrings (and, with rename_identifiers, the names of the function and its local
+    variables) get the same fingerprint. ast_extract calls it while it parses the file.
+    '''
+    dump = _Dump(func, rename_identifiers).dump(func)
+    return hashlib.sha256(dump.encode("utf-8")).hexdigest()
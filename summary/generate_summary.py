@@ -1,12 +1,16 @@
-from typing import List
-import ollama
+from typing import List, Optional, Tuple
 from pydantic import BaseModel
 import os 
-import requests
 import json 
-import base64
 from enum import Flag, auto
 
+from summary.summary_cache import SummaryCache
+from summary.repo_scanner import RepoManifest, RepoScanner
+from summary.ignore_rules import IgnoreRules, summarize_skipped
+from summary.ast_extract import ASTExtractor
+from summary.llm_backend import LLMBackend, OllamaBackend
+from summary.github_fetch import GitHubFetcher
+
 base_url = r"https://github.com/CornellDataScience/MathSearch"
 content_base_url = r"https://api.github.com/repos/CornellDataScience/MathSearch/contents"
 
@@ -33,8 +37,18 @@ class ContextAwareFunctionSummaryGenerator:
     To make the summary generation of each function context aware, we do a depth first search on the file system tree and appending the context for each 
     step of the traversal. The run function runs the whole module and stores the results in self.summaries. 
     '''
-    def __init__(self, base_url, content_base_url):
+    def __init__(self, base_url, content_base_url, cache: Optional[SummaryCache] = None,
+                 manifest: Optional[RepoManifest] = None, ignore: Optional[IgnoreRules] = None,
+                 extractor: Optional[ASTExtractor] = None, backend: Optional[LLMBackend] = None,
+                 fetcher: Optional[GitHubFetcher] = None):
         self.using_api = False
+        self.fetcher = fetcher  # pooled and cached github requests in api mode, created on first use
+        self.backend = backend if backend is not None else OllamaBackend("llama3.1:latest")
+        self.cache = cache  # summaries of unchanged code are reused from here instead of calling the model
+        self.manifest = manifest  # scan of the local checkout, made by run() when not given
+        self.ignore = ignore if ignore is not None else IgnoreRules()  # vendored and generated code to leave out
+        self.skipped: List[Tuple[str, str]] = []  # (path, reason) of everything that was not summarized
+        self.extractor = extractor if extractor is not None else ASTExtractor()  # parses each python file once
         self.base_url = base_url
         self.base_prompt = "create a short natural language summary of the function"
         self.content_base_url = content_base_url
@@ -45,24 +59,24 @@ class ContextAwareFunctionSummaryGenerator:
         requests file content from the github api path self.content_base_url + file_path and returns the file content as a string
         '''
         try:
-            full_path = self.content_base_url + file_path
-            resp = requests.get(full_path)
-            if resp.status_code == requests.codes.ok:
-                resp = resp.json()
-                byte_content = base64.b64decode(resp["content"])
-                return byte_content.decode("utf-8")
-            else:
-                print("Content was not found.")
-                return "Content Not Found"
+            return self.get_fetcher().get_file(self.content_base_url + file_path)
         except Exception as e:
             print(f"Error requesting file {file_path}: {e}")
             return "Content Not Found"
 
+    def get_fetcher(self) -> GitHubFetcher:
+        if self.fetcher is None:
+            self.fetcher = GitHubFetcher()
+        return self.fetcher
+
     def read_file_content(self, file_path):
         '''
         reads file content from the local file system and returns the file content as a string
         '''
         full_path = self.content_base_url + file_path
+        if self.manifest is not None:
+            content = self.manifest.read_text(full_path)
+            return content if content is not None else "Content Not Found"
         try:
             with open(full_path, "r") as f:
                 return f.read()
@@ -86,6 +100,10 @@ class ContextAwareFunctionSummaryGenerator:
         print("Parsing functions...")
         functions = self.parse(content)
         print("Functions parsed:", len(functions))
+        if self.ignore.too_many_functions(len(functions)):
+            print(f"Skipping {context.location}: too many functions")
+            self.skipped.append((context.location, "too many functions"))
+            return []
         # Add file-specific information to context
         results = []
         for func in functions:
@@ -107,13 +125,20 @@ class ContextAwareFunctionSummaryGenerator:
     def get_directory_content(self, path):
         full_path = self.content_base_url + path
         if self.using_api:
-            resp = requests.get(full_path)
-            if resp.status_code == requests.codes.ok:
-                return resp.json()
-            else:
-                print("Content was not found.")
+            try:
+                contents = self.get_fetcher().get_json(full_path)
+            except Exception as e:
+                print(f"Error listing directory {path}: {e}")
                 return {}
+            # fetch the python files of the directory concurrently while the first ones are summarized
+            self.get_fetcher().prefetch(
+                f"{full_path}/{item['name']}" for item in contents
+                if item["type"] == "file" and item["name"].endswith(".py")
+            )
+            return contents
         else: 
+            if self.manifest is not None:
+                return [entry.path for entry in self.manifest.children(full_path)]
             item_paths = []
             for item in os.listdir(full_path):
                 item_paths.append(os.path.join(full_path, item))
@@ -135,9 +160,14 @@ class ContextAwareFunctionSummaryGenerator:
             
         else:
             # item here is full path of the item
-            if os.path.isdir(item): 
+            entry = self.manifest.get(item) if self.manifest is not None else None
+            if entry is not None:
+                is_dir, is_file = entry.is_dir, not entry.is_dir
+            else:
+                is_dir, is_file = os.path.isdir(item), os.path.isfile(item)
+            if is_dir: 
                 return ItemTypes.DIRECTORY
-            elif os.path.isfile(item):
+            elif is_file:
                 if item.endswith(".py"):
                     return ItemTypes.PYTHON_FILE
                 elif item.lower().startswith("readme"):
@@ -185,18 +215,10 @@ class ContextAwareFunctionSummaryGenerator:
         '''
         file_content should be a string of valid python code
         '''
-        import ast
-
-        funcs = []
-
-        tree = ast.parse(file_content)
-        lines = file_content.splitlines()
-
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                funcs.append("\n".join(lines[node.lineno - 1 : node.end_lineno]))
-
-        return funcs
+        parsed = self.extractor.extract(file_content)
+        if parsed.error is not None:
+            raise SyntaxError(parsed.error)
+        return [func.code for func in parsed.functions]
 
 
     def summarize(self, context: Context, target: str) -> SummaryResult:
@@ -204,14 +226,13 @@ class ContextAwareFunctionSummaryGenerator:
             #print(f"prompt: {self.base_prompt + context + target}")
             print("Generating summary...")
             
-            response = ollama.generate(
-                model="llama3.1:latest",
-                prompt= self.base_prompt + context.prompt_context + "The code is located in: " + context.location + "Code: " + target,
-                stream = False,
-                options={'num_predict': -1, 'keep_alive': 0},
-            )
-            
-            summary = response['response'].strip()
+            prompt = self.base_prompt + context.prompt_context + "The code is located in: " + context.location + "Code: " + target
+            key = SummaryCache.make_key(self.backend.model, prompt)
+            summary = self.cache.get(key) if self.cache is not None else None
+            if summary is None:
+                summary = self.backend.generate(prompt, kind="function").strip()
+                if self.cache is not None:
+                    self.cache.put(key, summary)
             
             return SummaryResult(
                 summary=summary,
@@ -231,6 +252,13 @@ class ContextAwareFunctionSummaryGenerator:
         runs the whole workflow
         '''
         print(f"Starting code summary generation for repository: {self.content_base_url}")
+        if not self.using_api and self.manifest is None:
+            # one walk of the checkout answers every directory listing and type check of the traversal
+            self.manifest = RepoScanner(self.content_base_url, ignore=self.ignore).scan()
+        if self.manifest is not None:
+            self.skipped.extend(self.manifest.skipped)
+            # parse every python file up front on a process pool; the traversal then reuses these parses
+            self.extractor.extract_manifest(self.manifest)
         
         initial_context = Context(
             location="",
@@ -241,6 +269,9 @@ class ContextAwareFunctionSummaryGenerator:
         self.process_dir(initial_context, "")
         
         print(f"Generated {len(self.summaries)} function summaries")
+        print(summarize_skipped(self.skipped))
+        if self.cache is not None:
+            print(f"Summary cache: {self.cache.stats()}")
 
     def dumps(self) -> str:
         '''
@@ -249,11 +280,13 @@ class ContextAwareFunctionSummaryGenerator:
         return json.dumps([summary.dict() for summary in self.summaries])
 
 def main():
-    summarizer = ContextAwareFunctionSummaryGenerator("./data/MathSearch", "./data/MathSearch")
+    cache = SummaryCache("summary_cache.sqlite")
+    summarizer = ContextAwareFunctionSummaryGenerator("./data/MathSearch", "./data/MathSearch", cache=cache)
     summarizer.run()
     #save as json file
     with open("summaries3.json", "w") as f:
         f.write(summarizer.dumps())
+    cache.close()
 
     # for item in os.listdir("./summary"):
     #     if os.path.isfile("./summary/" + item):
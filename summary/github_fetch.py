@@ -0,0 +1,207 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from summary.run_stats import RunStats
+from summary.repo_scanner import RepoScanner
+
+GITHUB_API = "https://api.github.com"
+
+
+class HTTPCache:
+    '''
+    Keeps the body, ETag and Last-Modified of every fetched url in cache_dir so the next request for it can be
+    conditional; an unchanged resource then costs one 304 response (which GitHub does not count against the
+    rate limit) instead of a download.
+    '''
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def meta_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, self.key(url) + ".json")
+
+    def body_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, self.key(url) + ".body")
+
+    def validators(self, url: str) -> Dict[str, str]:
+        '''
+        returns the conditional request headers for url, or no headers if nothing usable is cached
+        '''
+        if not os.path.exists(self.body_path(url)):
+            return {}
+        try:
+            with open(self.meta_path(url), "r") as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def store(self, url: str, headers, body_file: str) -> None:
+        '''
+        moves the downloaded body_file into the cache together with the validators of its response
+        '''
+        os.replace(body_file, self.body_path(url))
+        meta = {"url": url, "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+        tmp = self.meta_path(url) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.meta_path(url))
+
+
+def archive_name(url: str) -> str:
+    '''
+    the name of the repository of an archive url (.../repos/<owner>/<name>/tarball[/<ref>]), "repo" if it has none
+    '''
+    parts = url.split("/")
+    if "tarball" in parts:
+        position = parts.index("tarball")
+        if position >= 3 and parts[position - 3] == "repos":
+            return parts[position - 1]
+    return "repo"
+
+
+def strip_top_level(member: tarfile.TarInfo, path: str) -> Optional[tarfile.TarInfo]:
+    '''
+    Extraction filter that drops the single top level directory of github archives (<owner>-<repo>-<sha>, which
+    changes with every commit) from every member, then applies the "data" filter
+    '''
+    name = member.name.split("/", 1)
+    if len(name) < 2 or not name[1]:
+        return None  # the top level directory itself
+    changes = {"name": name[1]}
+    if member.islnk():
+        changes["linkname"] = member.linkname.split("/", 1)[-1]  # hard links name their target from the top
+    return tarfile.data_filter(member.replace(**changes), path)
+
+
+class GitHubFetcher:
+    '''
+    Fetches repositories from GitHub (or anything serving the same api). Every request goes through one pooled
+    requests.Session and the conditional HTTPCache. download_archive gets the whole repository as one tarball,
+    which replaces one contents api request per file and per directory; the per-file path can prefetch the files
+    of a directory concurrently. Set GITHUB_TOKEN (or pass token) for the authenticated rate limit.
+    '''
+    def __init__(self, cache_dir: str = ".github_cache", token: Optional[str] = None, max_workers: int = 8,
+                 timeout: float = 30.0, session: Optional[requests.Session] = None):
+        self.cache = HTTPCache(cache_dir)
+        self.timeout = timeout
+        self.stats = RunStats()
+        self.session = session if session is not None else requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        token = token or os.environ.get("GITHUB_TOKEN")
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        # requests sets Accept: */* on every session, so setdefault would never apply
+        self.session.headers["Accept"] = "application/vnd.github+json"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._prefetched: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def archive_url(repo: str, ref: Optional[str] = None, api: str = GITHUB_API) -> str:
+        '''
+        url of the tarball of repo ("owner/name") at ref, the default branch when ref is None
+        '''
+        return f"{api}/repos/{repo}/tarball" + (f"/{ref}" if ref else "")
+
+    def fetch(self, url: str) -> str:
+        '''
+        Makes a conditional GET for url and returns the path of its cached body. The body is streamed to disk,
+        so archives never have to fit in memory.
+        '''
+        response = self.session.get(url, headers=self.cache.validators(url), stream=True, timeout=self.timeout)
+        self.stats.incr("requests")
+        with response:
+            if response.status_code == 304:
+                self.stats.incr("not modified")
+                return self.cache.body_path(url)
+            if response.status_code in (403, 429) and response.headers.get("X-RateLimit-Remaining") == "0":
+                raise RuntimeError(f"GitHub rate limit exceeded, resets at {response.headers.get('X-RateLimit-Reset')}; "
+                                   f"set GITHUB_TOKEN for a higher limit")
+            response.raise_for_status()
+            tmp = f"{self.cache.body_path(url)}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                for block in response.iter_content(1 << 20):
+                    f.write(block)
+                    self.stats.incr("bytes downloaded", len(block))
+            self.cache.store(url, response.headers, tmp)
+        return self.cache.body_path(url)
+
+    def get_bytes(self, url: str) -> bytes:
+        with open(self.fetch(url), "rb") as f:
+            return f.read()
+
+    def get_json(self, url: str):
+        return json.loads(self.get_bytes(url))
+
+    def get_contents_file(self, url: str) -> str:
+        '''
+        returns the decoded text of a file from the contents api
+        '''
+        return base64.b64decode(self.get_json(url)["content"]).decode("utf-8")
+
+    def prefetch(self, urls: Iterable[str]) -> None:
+        '''
+        starts fetching the contents api files at urls in the background; get_file picks up the results
+        '''
+        with self._lock:
+            for url in urls:
+                if url not in self._prefetched:
+                    self._prefetched[url] = self._executor.submit(self.get_contents_file, url)
+
+    def get_file(self, url: str) -> str:
+        with self._lock:
+            future = self._prefetched.pop(url, None)
+        if future is not None:
+            return future.result()
+        return self.get_contents_file(url)
+
+    def download_archive(self, url: str) -> str:
+        '''
+        Downloads and extracts the tarball at url and returns the directory of the repository inside it. When the
+        archive did not change since the last call, nothing is downloaded or extracted again. The directory is the
+        same for every commit of the repository, so node paths and manifests of runs on different commits match
+        and incremental runs (--previous) can reuse what did not change.
+        '''
+        body = self.fetch(url)
+        target = body[:-len(".body")] + ".d"
+        root = os.path.join(target, archive_name(url))
+        marker = target + ".extracted"  # digest of the archive currently extracted in target
+        digest = RepoScanner.hash_file(body)
+        extracted = None
+        if os.path.exists(marker):
+            with open(marker, "r") as f:
+                extracted = f.read()
+        if extracted != digest:
+            self.stats.incr("archives extracted")
+            shutil.rmtree(target, ignore_errors=True)
+            os.makedirs(root)
+            with tarfile.open(body, "r:*") as tar:
+                tar.extractall(root, filter=strip_top_level)
+            with open(marker, "w") as f:
+                f.write(digest)
+        return root
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
@@ -0,0 +1,311 @@
+from array import array
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import json
+import os
+import sqlite3
+import threading
+
+
+class GraphStore:
+    '''
+    Directed dependency graph between files, e.g. the "uses" relations of RelationalContext. Nodes get integer ids
+    in the order they are added, and the edges are kept as compressed adjacency arrays in both directions (offsets
+    into one array of neighbour ids per direction), so uses and used_by are array slices and the traversals never
+    touch a dict per edge. Edges may carry a description and the symbols they use.
+
+    A graph is built in memory with add_node and add_edge, and the arrays are rebuilt on the first query after a
+    change. save writes it to SQLite: nodes and edges as tables, and the adjacency arrays as blobs, so open only
+    reads the blobs when the first query needs them, and edge attributes are read one edge at a time.
+    Safe to query from several threads.
+    '''
+    def __init__(self):
+        self.names: List[str] = []  # id -> name
+        self.ids: Dict[str, int] = {}  # name -> id
+        self._edges: Dict[Tuple[int, int], Tuple[str, dict]] = {}  # (source, target) -> (description, symbols)
+        self._arrays: Optional[Tuple[array, array, array, array]] = None  # out offsets, out ids, in offsets, in ids
+        self._conn: Optional[sqlite3.Connection] = None  # set when opened from a file
+        self._loaded = True
+        self._lock = threading.RLock()
+
+    # building
+
+    def add_node(self, name: str) -> int:
+        with self._lock:
+            self._load()
+            node = self.ids.get(name)
+            if node is None:
+                node = len(self.names)
+                self.names.append(name)
+                self.ids[name] = node
+                self._arrays = None
+            return node
+
+    def add_edge(self, source: str, target: str, description: str = "", symbols: Optional[dict] = None) -> None:
+        '''
+        adds the edge source -> target (source uses target), replacing the attributes of an existing one
+        '''
+        with self._lock:
+            self._load_edges()
+            key = (self.add_node(source), self.add_node(target))
+            if key not in self._edges:
+                self._arrays = None
+            self._edges[key] = (description, symbols or {})
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[Tuple[str, str]]) -> "GraphStore":
+        graph = cls()
+        for source, target in edges:
+            graph.add_edge(source, target)
+        return graph
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load()
+            return len(self.names)
+
+    def edge_count(self) -> int:
+        return len(self._adjacency()[1])
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            self._load()
+            return name in self.ids
+
+    # adjacency
+
+    @staticmethod
+    def _compress(count: int, pairs: List[Tuple[int, int]]) -> Tuple[array, array]:
+        '''
+        offsets and neighbour ids of every node from (node, neighbour) pairs, neighbours in the order of the pairs
+        '''
+        offsets = array("q", [0]) * (count + 1)
+        for node, _ in pairs:
+            offsets[node + 1] += 1
+        for node in range(count):
+            offsets[node + 1] += offsets[node]
+        neighbours = array("i", [0]) * len(pairs)
+        fill = array("q", offsets)
+        for node, neighbour in pairs:
+            neighbours[fill[node]] = neighbour
+            fill[node] += 1
+        return offsets, neighbours
+
+    def _adjacency(self) -> Tuple[array, array, array, array]:
+        with self._lock:
+            if self._arrays is None:
+                self._load()
+                if self._conn is not None and not self._edges_loaded():
+                    self._arrays = self._read_arrays()
+                else:
+                    pairs = list(self._edges)
+                    out_offsets, out_ids = self._compress(len(self.names), pairs)
+                    in_offsets, in_ids = self._compress(len(self.names), [(t, s) for s, t in pairs])
+                    self._arrays = (out_offsets, out_ids, in_offsets, in_ids)
+            return self._arrays
+
+    def _neighbours(self, node: int, outgoing: bool) -> array:
+        out_offsets, out_ids, in_offsets, in_ids = self._adjacency()
+        offsets, ids = (out_offsets, out_ids) if outgoing else (in_offsets, in_ids)
+        return ids[offsets[node]:offsets[node + 1]]
+
+    def _id(self, name: str) -> Optional[int]:
+        with self._lock:
+            self._load()
+            return self.ids.get(name)
+
+    # queries
+
+    def uses(self, name: str) -> List[str]:
+        '''
+        the nodes name has an edge to
+        '''
+        node = self._id(name)
+        return [] if node is None else [self.names[i] for i in self._neighbours(node, True)]
+
+    def used_by(self, name: str) -> List[str]:
+        '''
+        the nodes that have an edge to name
+        '''
+        node = self._id(name)
+        return [] if node is None else [self.names[i] for i in self._neighbours(node, False)]
+
+    def _reachable(self, name: str, outgoing: bool, max_hops: Optional[int]) -> Dict[str, int]:
+        start = self._id(name)
+        if start is None:
+            return {}
+        hops = {start: 0}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            if max_hops is not None and hops[node] >= max_hops:
+                continue
+            for neighbour in self._neighbours(node, outgoing):
+                if neighbour not in hops:
+                    hops[neighbour] = hops[node] + 1
+                    queue.append(neighbour)
+        del hops[start]
+        return {self.names[node]: distance for node, distance in hops.items()}
+
+    def dependencies(self, name: str, max_hops: Optional[int] = None) -> Dict[str, int]:
+        '''
+        every node name depends on directly or transitively, within max_hops edges when given, with its distance
+        '''
+        return self._reachable(name, True, max_hops)
+
+    def dependents(self, name: str, max_hops: Optional[int] = None) -> Dict[str, int]:
+        '''
+        every node that depends on name directly or transitively, within max_hops edges when given, with its
+        distance: the files a change to name can affect
+        '''
+        return self._reachable(name, False, max_hops)
+
+    def strongly_connected_components(self, min_size: int = 2) -> List[List[str]]:
+        '''
+        The strongly connected components of the graph with at least min_size nodes, i.e. the import cycles with
+        the default of 2, largest first. Iterative Tarjan, so deep graphs do not hit the recursion limit.
+        '''
+        out_offsets, out_ids, _, _ = self._adjacency()
+        count = len(self.names)
+        index = array("i", [-1]) * count
+        low = array("i", [0]) * count
+        on_stack = bytearray(count)
+        stack: List[int] = []
+        components: List[List[str]] = []
+        counter = 0
+        for root in range(count):
+            if index[root] != -1:
+                continue
+            work = [(root, out_offsets[root])]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            while work:
+                node, position = work[-1]
+                if position < out_offsets[node + 1]:
+                    work[-1] = (node, position + 1)
+                    neighbour = out_ids[position]
+                    if index[neighbour] == -1:
+                        index[neighbour] = low[neighbour] = counter
+                        counter += 1
+                        stack.append(neighbour)
+                        on_stack[neighbour] = 1
+                        work.append((neighbour, out_offsets[neighbour]))
+                    elif on_stack[neighbour]:
+                        low[node] = min(low[node], index[neighbour])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) >= min_size:
+                        components.append(sorted(self.names[member] for member in component))
+        return sorted(components, key=len, reverse=True)
+
+    def edge(self, source: str, target: str) -> Optional[Tuple[str, dict]]:
+        '''
+        the (description, symbols) of the edge source -> target, None if there is no such edge
+        '''
+        source_id, target_id = self._id(source), self._id(target)
+        if source_id is None or target_id is None:
+            return None
+        with self._lock:
+            if self._edges_loaded():
+                return self._edges.get((source_id, target_id))
+            row = self._conn.execute("SELECT description, symbols FROM edges WHERE source = ? AND target = ?",
+                                     (source_id, target_id)).fetchone()
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    # persistence
+
+    def save(self, path: str) -> None:
+        '''
+        writes the graph to a SQLite file, replacing what it held
+        '''
+        with self._lock:
+            self._load_edges()
+            arrays = self._adjacency()
+            if os.path.exists(path):
+                os.remove(path)
+            conn = sqlite3.connect(path)
+            conn.execute("CREATE TABLE nodes (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+            conn.execute("CREATE TABLE edges (source INTEGER NOT NULL, target INTEGER NOT NULL, "
+                         "description TEXT NOT NULL, symbols TEXT NOT NULL, PRIMARY KEY (source, target)) "
+                         "WITHOUT ROWID")
+            conn.execute("CREATE TABLE adjacency (name TEXT PRIMARY KEY, data BLOB NOT NULL)")
+            conn.executemany("INSERT INTO nodes (id, name) VALUES (?, ?)", enumerate(self.names))
+            conn.executemany("INSERT INTO edges (source, target, description, symbols) VALUES (?, ?, ?, ?)",
+                             self._edge_rows(arrays[0], arrays[1]))
+            conn.executemany("INSERT INTO adjacency (name, data) VALUES (?, ?)",
+                             [(name, values.tobytes()) for name, values in zip(_ARRAYS, arrays)])
+            conn.commit()
+            conn.close()
+
+    def _edge_rows(self, out_offsets: array, out_ids: array) -> Iterator[Tuple[int, int, str, str]]:
+        # grouped by source, the first column of the primary key, so the inserts mostly append to the table
+        for source in range(len(self.names)):
+            for target in out_ids[out_offsets[source]:out_offsets[source + 1]]:
+                description, symbols = self._edges[(source, target)]
+                yield source, target, description, json.dumps(symbols) if symbols else "{}"
+
+    @classmethod
+    def open(cls, path: str) -> "GraphStore":
+        '''
+        a graph saved with save; nothing is read until the first query
+        '''
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        graph = cls()
+        graph._conn = sqlite3.connect(path, check_same_thread=False)
+        graph._loaded = False
+        graph._edges = None
+        return graph
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self.names = [name for _, name in self._conn.execute("SELECT id, name FROM nodes ORDER BY id")]
+        self.ids = {name: node for node, name in enumerate(self.names)}
+        self._loaded = True
+
+    def _edges_loaded(self) -> bool:
+        return self._edges is not None
+
+    def _load_edges(self) -> None:
+        '''
+        reads every edge with its attributes, needed before a graph that was opened from a file is changed
+        '''
+        self._load()
+        if self._edges is None:
+            self._edges = {(s, t): (description, json.loads(symbols)) for s, t, description, symbols in
+                           self._conn.execute("SELECT source, target, description, symbols FROM edges")}
+            self._arrays = None
+
+    def _read_arrays(self) -> Tuple[array, array, array, array]:
+        blobs = dict(self._conn.execute("SELECT name, data FROM adjacency"))
+        arrays = []
+        for name in _ARRAYS:
+            values = array("q" if name.endswith("offsets") else "i")
+            values.frombytes(blobs[name])
+            arrays.append(values)
+        return tuple(arrays)
+
+    def close(self) -> None:
+        '''
+        closes the file a graph was opened from; parts of it that were not loaded yet can not be queried after
+        '''
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+
+
+_ARRAYS = ("out_offsets", "out_ids", "in_offsets", "in_ids")
@@ -0,0 +1,169 @@
+from typing import List, Optional, Tuple
+import os
+import re
+
+# vendored, generated and tool directories that are never worth summarizing; names that are also common package
+# names (env, build, dist) are only ignored at the root of the repository
+DEFAULT_IGNORE_PATTERNS = [
+    ".git/",
+    ".hg/",
+    ".svn/",
+    "venv/",
+    ".venv/",
+    "/env/",
+    "site-packages/",
+    "node_modules/",
+    "__pycache__/",
+    ".ipynb_checkpoints/",
+    ".pytest_cache/",
+    ".mypy_cache/",
+    ".ruff_cache/",
+    ".tox/",
+    ".nox/",
+    "/build/",
+    "/dist/",
+    "*.egg-info/",
+]
+
+
+def translate_pattern(pattern: str) -> str:
+    '''
+    translates the glob part of a gitignore pattern (without leading or trailing slash) into a regular expression
+    '''
+    result = ""
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            result += "(?:.*/)?"
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            result += ".*"
+            i += 2
+            continue
+        if c == "*":
+            result += "[^/]*"
+        elif c == "?":
+            result += "[^/]"
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                result += re.escape(c)
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                result += "[" + body.replace("\\", "\\\\") + "]"
+                i = end
+        elif c == "\\" and i + 1 < len(pattern):
+            i += 1
+            result += re.escape(pattern[i])
+        else:
+            result += re.escape(c)
+        i += 1
+    return result
+
+
+class IgnoreRule:
+    __slots__ = ("pattern", "regex", "negate", "dir_only", "anchored", "base")
+
+    def __init__(self, pattern: str, base: str = ""):
+        self.pattern = pattern
+        self.base = base  # directory of the .gitignore the rule came from, relative to the repository root
+        self.negate = pattern.startswith("!")
+        if self.negate:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # a pattern with a slash anywhere but the end is relative to its .gitignore, otherwise it matches at any level
+        self.anchored = "/" in pattern
+        self.regex = re.compile("^" + translate_pattern(pattern.lstrip("/")) + "$")
+
+    def matches(self, rel_path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not rel_path.startswith(self.base + "/"):
+                return False
+            rel_path = rel_path[len(self.base) + 1:]
+        if self.anchored:
+            return bool(self.regex.match(rel_path))
+        return bool(self.regex.match(rel_path.rsplit("/", 1)[-1]))
+
+
+class IgnoreRules:
+    '''
+    Decides which entries of a repository the summary and relation passes skip: gitignore style patterns
+    (the defaults, extra patterns and the repository's .gitignore files), a maximum file size and a maximum number
+    of functions per file. As in git, the last matching pattern wins and "!" patterns re-include an entry.
+    Paths are relative to the repository root and use "/" separators.
+    '''
+    def __init__(self, patterns: Optional[List[str]] = None, use_gitignore: bool = True,
+                 max_file_size: Optional[int] = 1024 * 1024, max_functions: Optional[int] = 500):
+        self.rules: List[IgnoreRule] = []
+        self.use_gitignore = use_gitignore
+        self.max_file_size = max_file_size
+        self.max_functions = max_functions
+        self.add_patterns(DEFAULT_IGNORE_PATTERNS if patterns is None else patterns)
+
+    def add_patterns(self, patterns: List[str], base: str = "") -> None:
+        for line in patterns:
+            line = line.rstrip("\n")
+            if line.endswith(" ") and not line.endswith("\\ "):
+                line = line.rstrip(" ")
+            if not line or line.startswith("#"):
+                continue
+            self.rules.append(IgnoreRule(line, base))
+
+    def add_gitignore(self, gitignore_path: str, base: str = "") -> None:
+        '''
+        adds the patterns of a .gitignore file found in the directory base (relative to the repository root)
+        '''
+        try:
+            with open(gitignore_path, "r") as f:
+                self.add_patterns(f.readlines(), base)
+        except OSError as e:
+            print(f"Error reading {gitignore_path}: {e}")
+
+    def copy(self) -> "IgnoreRules":
+        rules = IgnoreRules([], self.use_gitignore, self.max_file_size, self.max_functions)
+        rules.rules = list(self.rules)
+        return rules
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        rel_path = rel_path.replace(os.sep, "/").strip("/")
+        ignored = False
+        for rule in self.rules:
+            if rule.matches(rel_path, is_dir):
+                ignored = not rule.negate
+        return ignored
+
+    def skip_reason(self, rel_path: str, is_dir: bool, size: int = 0) -> Optional[str]:
+        '''
+        returns why an entry should be skipped, or None if it should be processed
+        '''
+        if self.is_ignored(rel_path, is_dir):
+            return "ignored"
+        if not is_dir and self.max_file_size is not None and size > self.max_file_size:
+            return "too large"
+        return None
+
+    def too_many_functions(self, count: int) -> bool:
+        return self.max_functions is not None and count > self.max_functions
+
+
+def summarize_skipped(skipped: List[Tuple[str, str]], limit: int = 10) -> str:
+    '''
+    formats a report of skipped (path, reason) entries
+    '''
+    if not skipped:
+        return "Skipped nothing"
+    reasons = {}
+    for _, reason in skipped:
+        reasons[reason] = reasons.get(reason, 0) + 1
+    lines = [f"Skipped {len(skipped)} entries (" + ", ".join(f"{n} {r}" for r, n in sorted(reasons.items())) + "):"]
+    lines += [f"  {path}: {reason}" for path, reason in skipped[:limit]]
+    if len(skipped) > limit:
+        lines.append(f"  ... and {len(skipped) - limit} more")
+    return "\n".join(lines)
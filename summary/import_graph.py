@@ -0,0 +1,192 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from pydantic import BaseModel
+import os
+import sys
+
+from summary.ast_extract import ImportInfo, ParsedFile
+
+CALLED = "called"
+SUBCLASSED = "subclassed"
+
+
+class Dependency(BaseModel):
+    path: str  # the local module imported
+    module: str  # its dotted name
+    # imported name (dotted for attributes, e.g. Model.load) -> how the file uses it, called and/or subclassed.
+    # Names imported with "from" that are only referenced otherwise (annotations, constants) have no usages.
+    symbols: Dict[str, List[str]] = {}
+
+
+def module_name(rel_path: str) -> str:
+    '''
+    dotted module name of a python file given its path relative to the root, e.g. pkg/sub/__init__.py -> pkg.sub
+    '''
+    parts = os.path.normpath(rel_path)[:-3].split(os.sep)
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(part for part in parts if part and part != ".")
+
+
+class ModuleIndex:
+    '''
+    Maps the dotted module names of the python files under root to their paths, so imports can be resolved to files
+    without importing anything. Absolute imports that do not match a full module name are matched against the
+    trailing components of module names instead (code run with sys.path pointing into a package imports its
+    modules by their short name) as long as exactly one module matches and the name is not a standard library one.
+    '''
+    def __init__(self, root: str, paths: Iterable[str]):
+        self.root = root
+        self.modules: Dict[str, str] = {}  # dotted name -> path
+        self.packages: Set[str] = set()  # dotted names of the modules that are packages (__init__.py)
+        self.names: Dict[str, str] = {}  # normalized path -> dotted name
+        self._suffixes: Dict[str, Set[str]] = defaultdict(set)
+        for path in paths:
+            name = module_name(os.path.relpath(path, root))
+            if not name:
+                continue
+            self.modules[name] = path
+            self.names[os.path.normpath(path)] = name
+            if os.path.basename(path) == "__init__.py":
+                self.packages.add(name)
+            parts = name.split(".")
+            for i in range(1, len(parts)):
+                self._suffixes[".".join(parts[i:])].add(name)
+
+    @classmethod
+    def from_manifest(cls, manifest) -> "ModuleIndex":
+        return cls(manifest.root, [entry.path for entry in manifest.python_files()])
+
+    def lookup(self, name: str, absolute: bool = True) -> Optional[str]:
+        '''
+        returns the path of the module called name, or None if it is not part of the codebase
+        '''
+        if name in self.modules:
+            return self.modules[name]
+        if not absolute or name.split(".")[0] in sys.stdlib_module_names:
+            return None
+        matches = self._suffixes.get(name, ())
+        if len(matches) == 1:
+            return self.modules[next(iter(matches))]
+        return None
+
+    def package_of(self, path: str) -> List[str]:
+        '''
+        the components of the package a file belongs to, the base that relative imports in it start from
+        '''
+        name = self.names.get(os.path.normpath(path))
+        if name is None:
+            return []
+        parts = name.split(".")
+        return parts if name in self.packages else parts[:-1]
+
+    def bindings(self, path: str, info: ImportInfo) -> List[Tuple[Optional[str], str, Optional[str]]]:
+        '''
+        Resolves the names one import statement of the file at path binds to local modules, as (name bound in the
+        file, path of the module, name imported from it). The imported name is None when the binding is the
+        module itself: "import a.b" binds a.b, and "from pkg import name" binds the module pkg.name when there is
+        one and the name in pkg otherwise. Star imports bind no name.
+        '''
+        if not info.is_from:
+            resolved = []
+            for name, asname in info.names:
+                # "import a.b.c" where only a.b is local still depends on a.b
+                parts = name.split(".")
+                for i in range(len(parts), 0, -1):
+                    target = self.lookup(".".join(parts[:i]))
+                    if target is not None:
+                        resolved.append((asname or name, target, None if i == len(parts) else parts[i]))
+                        break
+            return resolved
+        absolute = info.level == 0
+        if absolute:
+            base = info.module or ""
+        else:
+            package = self.package_of(path)
+            if info.level - 1 > len(package):
+                return []
+            package = package[:len(package) - (info.level - 1)]
+            base = ".".join(package + ([info.module] if info.module else []))
+        resolved = []
+        for name, asname in info.names:
+            target = self.lookup(f"{base}.{name}" if base else name, absolute) if name != "*" else None
+            if target is not None:
+                resolved.append((asname or name, target, None))
+            elif base:
+                target = self.lookup(base, absolute)
+                if target is not None:
+                    resolved.append((None, target, None) if name == "*" else (asname or name, target, name))
+        return resolved
+
+    def resolve(self, path: str, info: ImportInfo) -> List[str]:
+        '''
+        Returns the paths of the local modules one import statement of the file at path refers to. For
+        "from pkg import name" that is the module pkg.name when there is one and pkg itself otherwise.
+        '''
+        resolved = []
+        for _, target, _ in self.bindings(path, info):
+            if target not in resolved:
+                resolved.append(target)
+        return resolved
+
+    def symbol_dependencies(self, path: str, parsed: ParsedFile) -> List[Dependency]:
+        '''
+        The local modules a file imports, in the order they are first imported, each with the names the file
+        imports from it and whether it calls or subclasses them, found from the calls and base classes of the
+        parse. A module imported as a whole records the attributes used through it, e.g. helpers.load.
+        '''
+        usages: Dict[str, List[Tuple[str, str]]] = defaultdict(list)  # first component -> (dotted name, kind)
+        for kind, names in ((CALLED, parsed.calls), (SUBCLASSED, parsed.bases)):
+            for name in names:
+                usages[name.split(".", 1)[0]].append((name, kind))
+        dependencies: Dict[str, Dependency] = {}
+        for info in parsed.imports:
+            for local, target, symbol in self.bindings(path, info):
+                if os.path.normpath(target) == os.path.normpath(path):
+                    continue
+                dependency = dependencies.get(target)
+                if dependency is None:
+                    dependency = Dependency(path=target, module=self.names.get(os.path.normpath(target), ""))
+                    dependencies[target] = dependency
+                if local is None:
+                    continue
+                if symbol is not None:
+                    dependency.symbols.setdefault(symbol, [])
+                for used, kind in usages.get(local.split(".", 1)[0], ()):
+                    if used == local and symbol is not None:
+                        name = symbol
+                    elif used.startswith(local + "."):
+                        rest = used[len(local) + 1:]
+                        name = f"{symbol}.{rest}" if symbol is not None else rest
+                    else:
+                        continue
+                    kinds = dependency.symbols.setdefault(name, [])
+                    if kind not in kinds:
+                        kinds.append(kind)
+        return list(dependencies.values())
+
+    def dependencies(self, path: str, parsed: ParsedFile) -> Set[str]:
+        '''
+        paths of the local modules a file imports, without the file itself
+        '''
+        targets = {target for info in parsed.imports for target in self.resolve(path, info)}
+        targets.discard(path)
+        return targets
+
+
+def import_edges(index: ModuleIndex, parsed_files: Dict[str, ParsedFile]) -> Dict[str, Set[str]]:
+    '''
+    maps the path of every parsed file to the paths of the local modules it imports
+    '''
+    return {path: index.dependencies(path, parsed) for path, parsed in parsed_files.items() if parsed.error is None}
+
+
+def in_degrees(edges: Dict[str, Set[str]]) -> Dict[str, int]:
+    '''
+    number of files importing each module
+    '''
+    degrees: Dict[str, int] = defaultdict(int)
+    for targets in edges.values():
+        for target in targets:
+            degrees[target] += 1
+    return dict(degrees)
@@ -0,0 +1,103 @@
+from typing import Dict, Iterable, Set
+import json
+import os
+import subprocess
+
+from summary.repo_scanner import RepoScanner
+
+
+def build_manifest(root: str) -> Dict[str, str]:
+    '''
+    Walks root and returns a mapping from each file path to the sha256 of its content.
+    Paths are joined onto root the same way the summary generator names its nodes.
+    '''
+    return RepoScanner(root).scan().hashes()
+
+
+def save_manifest(manifest: Dict[str, str], output_file: str) -> None:
+    with open(output_file, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def load_manifest(input_file: str) -> Dict[str, str]:
+    with open(input_file, "r") as f:
+        return json.load(f)
+
+
+def diff_manifests(old: Dict[str, str], new: Dict[str, str]) -> Set[str]:
+    '''
+    returns the paths that were added, removed or modified between two manifests
+    '''
+    changed = {path for path, digest in new.items() if old.get(path) != digest}
+    changed.update(path for path in old if path not in new)
+    return changed
+
+
+def git_changed_paths(root: str, since: str) -> Set[str]:
+    '''
+    Returns the paths under root that differ from the git revision since, including uncommitted and untracked files
+    '''
+    diff = subprocess.run(
+        ["git", "-C", root, "diff", "--name-only", "--relative", since],
+        capture_output=True, text=True, check=True,
+    )
+    untracked = subprocess.run(
+        ["git", "-C", root, "ls-files", "--others", "--exclude-standard"],
+        capture_output=True, text=True, check=True,
+    )
+    lines = diff.stdout.splitlines() + untracked.stdout.splitlines()
+    return {os.path.join(root, line) for line in lines if line.strip()}
+
+
+class IncrementalIndex:
+    '''
+    Tells the summary generator which parts of a previous summary tree can be reused as is.
+    A file or directory node is reusable when neither it nor anything below it is in changed_paths. Inside a changed
+    file, function summaries are still reused when a function with the same name and the same code existed before,
+    so only changed functions, their file and the directory chain up to the root are summarized again.
+    '''
+    def __init__(self, previous_root, changed_paths: Iterable[str]):
+        self.nodes = {}
+        self.failed = set()  # nodes whose summary failed last time are always regenerated
+        self._index(previous_root)
+        self.changed = {os.path.normpath(path) for path in changed_paths} | self.failed
+        self.dirty_dirs = set()
+        for path in self.changed:
+            parent = os.path.dirname(path)
+            while parent and parent not in self.dirty_dirs:
+                self.dirty_dirs.add(parent)
+                parent = os.path.dirname(parent)
+
+    def _index(self, node) -> None:
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            self.nodes[current.path] = current
+            summaries = list(current.summaries) + ([current.final_summary] if current.final_summary else [])
+            if any("error" in summary.metadata for summary in summaries):
+                self.failed.add(os.path.normpath(current.path))
+            stack.extend(current.children)
+
+    def is_dirty(self, path: str) -> bool:
+        path = os.path.normpath(path)
+        return path in self.changed or path in self.dirty_dirs
+
+    def reusable_node(self, path: str):
+        '''
+        returns the previous node for path if nothing in it changed, otherwise None
+        '''
+        if self.is_dirty(path):
+            return None
+        return self.nodes.get(path)
+
+    def reusable_function(self, file_path: str, name: str, code: str):
+        '''
+        returns the previous summary of a function in file_path if its code is unchanged, otherwise None
+        '''
+        previous = self.nodes.get(file_path)
+        if previous is None:
+            return None
+        for summary in previous.summaries:
+            if summary.name == name and summary.code == code and "error" not in summary.metadata:
+                return summary
+        return None
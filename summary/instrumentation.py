@@ -0,0 +1,128 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+import json
+import re
+import threading
+import time
+
+from summary.run_stats import RunStats
+
+
+class StageTimer:
+    '''
+    Records the wall time spent in each stage of a run (scan, parse, llm, aggregate, write, ...) and the time spent
+    on each node of the tree. Stages that run on several workers at once add up the time of every worker, and a
+    stage may contain others (aggregating child summaries includes the model calls it makes).
+    Safe to call from the scheduler's worker threads.
+    '''
+    def __init__(self):
+        self._stages: Dict[str, List[float]] = {}  # name -> [seconds, calls]
+        self._nodes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            totals = self._stages.setdefault(name, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def record_node(self, path: str, seconds: float) -> None:
+        with self._lock:
+            self._nodes[path] = self._nodes.get(path, 0.0) + seconds
+
+    def stages(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {name: {"seconds": round(seconds, 4), "calls": calls}
+                    for name, (seconds, calls) in self._stages.items()}
+
+    def slowest_nodes(self, count: int = 10) -> List[Dict[str, float]]:
+        with self._lock:
+            nodes = sorted(self._nodes.items(), key=lambda item: item[1], reverse=True)[:count]
+        return [{"path": path, "seconds": round(seconds, 4)} for path, seconds in nodes]
+
+
+def backend_metrics(stats: RunStats) -> Dict[str, float]:
+    '''
+    the counters of an LLMBackend plus the token throughput derived from them
+    '''
+    counters = stats.snapshot()
+    metrics = dict(counters)
+    if counters.get("prompt eval seconds"):
+        metrics["prompt tokens per second"] = counters.get("prompt tokens", 0) / counters["prompt eval seconds"]
+    if counters.get("eval seconds"):
+        metrics["completion tokens per second"] = counters.get("completion tokens", 0) / counters["eval seconds"]
+    if counters.get("model calls"):
+        metrics["average seconds per call"] = counters.get("model seconds", 0) / counters["model calls"]
+    return metrics
+
+
+def run_report(name: str, wall_seconds: float, timer: StageTimer, stats: RunStats, backends: Dict[str, RunStats],
+               cache_stats: Optional[Dict[str, float]] = None, slowest: int = 10) -> dict:
+    '''
+    Collects everything recorded over a run into one JSON serializable report: wall time, time per stage, the
+    run's counters, the counters and token throughput of every backend, cache hit rates and the slowest nodes
+    '''
+    return {
+        "run": name,
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "wall_seconds": round(wall_seconds, 4),
+        "stages": timer.stages(),
+        "counters": stats.snapshot(),
+        "backends": {backend: backend_metrics(backend_stats) for backend, backend_stats in backends.items()},
+        "cache": cache_stats or {},
+        "slowest_nodes": timer.slowest_nodes(slowest),
+    }
+
+
+def write_report(report: dict, output_file: str) -> None:
+    with open(output_file, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _metric(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def prometheus_metrics(report: dict, prefix: str = "smart_search") -> str:
+    '''
+    Renders a run report in the Prometheus text exposition format, e.g. for the node exporter's textfile
+    collector, so runs can be compared on a dashboard
+    '''
+    run = _label(report["run"])
+    lines = [
+        f"# TYPE {prefix}_wall_seconds gauge",
+        f'{prefix}_wall_seconds{{run="{run}"}} {report["wall_seconds"]}',
+        f"# TYPE {prefix}_stage_seconds gauge",
+    ]
+    for stage, values in report["stages"].items():
+        lines.append(f'{prefix}_stage_seconds{{run="{run}",stage="{_label(stage)}"}} {values["seconds"]}')
+    lines.append(f"# TYPE {prefix}_stage_calls gauge")
+    for stage, values in report["stages"].items():
+        lines.append(f'{prefix}_stage_calls{{run="{run}",stage="{_label(stage)}"}} {values["calls"]}')
+    lines.append(f"# TYPE {prefix}_events gauge")
+    for event, value in sorted(report["counters"].items()):
+        lines.append(f'{prefix}_events{{run="{run}",event="{_label(event)}"}} {value}')
+    lines.append(f"# TYPE {prefix}_backend gauge")
+    for backend, metrics in report["backends"].items():
+        for metric, value in sorted(metrics.items()):
+            lines.append(f'{prefix}_backend{{run="{run}",backend="{_label(backend)}",metric="{_label(metric)}"}} {value}')
+    for key, value in sorted(report["cache"].items()):
+        if isinstance(value, (int, float)):
+            lines.append(f"# TYPE {prefix}_cache_{_metric(key)} gauge")
+            lines.append(f'{prefix}_cache_{_metric(key)}{{run="{run}"}} {value}')
+    lines.append(f"# TYPE {prefix}_node_seconds gauge")
+    for node in report["slowest_nodes"]:
+        lines.append(f'{prefix}_node_seconds{{run="{run}",path="{_label(node["path"])}"}} {node["seconds"]}')
+    return "\n".join(lines) + "\n"
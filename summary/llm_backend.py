@@ -0,0 +1,237 @@
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import hashlib
+import random
+import threading
+import time
+
+import ollama
+
+from summary.run_stats import RunStats
+
+# output token caps (num_predict) per kind of prompt; kinds not listed here are not capped
+DEFAULT_MAX_TOKENS = {
+    "function": 256,
+    "batch": 2048,  # one JSON object answering up to max_batch_size functions
+    "file": 384,
+    "directory": 512,
+    "context": 256,
+    "relation": 512,
+    "preamble": 1,  # only encodes the shared context of a file session, the answer is not used
+}
+
+
+class LLMError(Exception):
+    '''
+    Raised when a backend gave up on a prompt
+    '''
+
+
+class CircuitOpenError(LLMError):
+    '''
+    Raised without calling the model while the circuit breaker is open
+    '''
+
+
+class ContextUnsupportedError(LLMError):
+    '''
+    Raised when a context is passed to a backend that can not continue from one
+    '''
+
+
+class Generation:
+    '''
+    A response together with what the backend reported about it: the context to continue from (the encoded
+    prompt and response, for backends that support it), the number and time of prompt and completion tokens
+    evaluated and the time the server spent on the request in total. Backends that report nothing leave them 0.
+    '''
+    __slots__ = ("text", "context", "prompt_eval_count", "prompt_eval_seconds", "eval_count", "eval_seconds",
+                 "total_seconds")
+
+    def __init__(self, text: str, context: Optional[List[int]] = None, prompt_eval_count: int = 0,
+                 prompt_eval_seconds: float = 0.0, eval_count: int = 0, eval_seconds: float = 0.0,
+                 total_seconds: float = 0.0):
+        self.text = text
+        self.context = context
+        self.prompt_eval_count = prompt_eval_count
+        self.prompt_eval_seconds = prompt_eval_seconds
+        self.eval_count = eval_count
+        self.eval_seconds = eval_seconds
+        self.total_seconds = total_seconds
+
+
+class LLMBackend:
+    '''
+    The one way the summary, relation and api modules talk to a language model. Subclasses implement _generate;
+    this class adds per kind output token caps, retries with exponential backoff and jitter for transient errors,
+    and a circuit breaker that fails fast for reset_seconds after failure_threshold prompts in a row have failed,
+    instead of letting every queued prompt wait through its own retries against a server that is down.
+    Backends with supports_context can continue a generation from the context of an earlier one, so a shared
+    prompt prefix is only encoded once. Safe to call from the scheduler's worker threads.
+    '''
+    supports_context = False
+
+    def __init__(self, model: str, max_tokens: Optional[Dict[str, int]] = None, retries: int = 3,
+                 backoff_seconds: float = 0.5, max_backoff_seconds: float = 8.0, failure_threshold: int = 5,
+                 reset_seconds: float = 30.0):
+        self.model = model
+        self.max_tokens = dict(DEFAULT_MAX_TOKENS if max_tokens is None else max_tokens)
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.stats = RunStats()
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+
+    def generate(self, prompt: str, kind: str = "default", options: Optional[dict] = None) -> str:
+        '''
+        Returns the model's response to prompt. kind names the call site (function, file, directory, ...) and
+        selects its output token cap; options are passed on to the model (e.g. temperature).
+        '''
+        return self.generate_full(prompt, kind, options).text
+
+    def generate_full(self, prompt: str, kind: str = "default", options: Optional[dict] = None,
+                      context: Optional[List[int]] = None) -> Generation:
+        '''
+        Like generate, but continues from the context of an earlier Generation when one is given and returns the
+        whole Generation
+        '''
+        if context is not None and not self.supports_context:
+            raise ContextUnsupportedError(f"{type(self).__name__} can not continue from a context")
+        with self._lock:
+            if time.monotonic() < self._open_until:
+                self.stats.incr("circuit rejections")
+                raise CircuitOpenError(f"{self.model} failed {self._consecutive_failures} times in a row, "
+                                       f"not calling it for {self.reset_seconds}s")
+        options = dict(options or {})
+        options.setdefault("num_predict", self.max_tokens.get(kind, -1))
+        attempt = 0
+        while True:
+            try:
+                self.stats.incr("model calls")
+                start = time.perf_counter()
+                response = self._generate_full(prompt, options, context)
+            except Exception as e:
+                if attempt < self.retries and self.is_retryable(e):
+                    attempt += 1
+                    self.stats.incr("retries")
+                    delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempt - 1))
+                    time.sleep(delay * random.uniform(0.5, 1.0))
+                    continue
+                self._record_failure()
+                raise LLMError(f"{kind} prompt failed after {attempt + 1} attempts: {e}") from e
+            with self._lock:
+                self._consecutive_failures = 0
+            self._record_generation(response, time.perf_counter() - start)
+            return response
+
+    def _record_generation(self, generation: Generation, seconds: float) -> None:
+        self.stats.incr("model seconds", seconds)
+        self.stats.incr("prompt tokens", generation.prompt_eval_count)
+        self.stats.incr("prompt eval seconds", generation.prompt_eval_seconds)
+        self.stats.incr("completion tokens", generation.eval_count)
+        self.stats.incr("eval seconds", generation.eval_seconds)
+        if generation.total_seconds:
+            # time the request spent queued on the server or in transit, outside the server's own timers
+            self.stats.incr("queue wait seconds", max(0.0, seconds - generation.total_seconds))
+
+    def _record_failure(self) -> None:
+        self.stats.incr("failures")
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= self.failure_threshold:
+                self.stats.incr("circuit opened")
+                self._open_until = time.monotonic() + self.reset_seconds
+
+    def reset_circuit(self) -> None:
+        '''
+        closes the circuit breaker, for a caller that has just seen the model server recover
+        '''
+        with self._lock:
+            self._consecutive_failures = 0
+            self._open_until = 0.0
+
+    def is_retryable(self, error: Exception) -> bool:
+        return True
+
+    def health_check(self) -> bool:
+        '''
+        whether the model server answers, without generating anything
+        '''
+        return True
+
+    def _generate_full(self, prompt: str, options: dict, context: Optional[List[int]]) -> Generation:
+        return Generation(self._generate(prompt, options))
+
+    def _generate(self, prompt: str, options: dict) -> str:
+        raise NotImplementedError
+
+
+class OllamaBackend(LLMBackend):
+    '''
+    Calls an Ollama server through one ollama.Client, which keeps its HTTP connections open between requests.
+    keep_alive keeps the model loaded between prompts instead of unloading it after every request
+    (the old 'keep_alive': 0 option forced a reload for each one).
+    '''
+    supports_context = True
+
+    def __init__(self, model: str = "llama3.2:latest", host: Optional[str] = None,
+                 keep_alive: Union[float, str] = "30m", timeout: Optional[float] = None, **kwargs):
+        super().__init__(model, **kwargs)
+        self.host = host
+        self.keep_alive = keep_alive
+        self.client = ollama.Client(host=host, timeout=timeout)
+
+    def is_retryable(self, error: Exception) -> bool:
+        # client errors such as an unknown model will fail the same way again; overload and server errors may not
+        if isinstance(error, ollama.ResponseError):
+            return error.status_code == 429 or error.status_code >= 500 or error.status_code == -1
+        return True
+
+    def health_check(self) -> bool:
+        try:
+            self.client.list()
+        except Exception:
+            return False
+        return True
+
+    def _generate_full(self, prompt: str, options: dict, context: Optional[List[int]]) -> Generation:
+        response = self.client.generate(
+            model=self.model,
+            prompt=prompt,
+            context=context,
+            stream=False,
+            keep_alive=self.keep_alive,
+            options=options,
+        )
+        return Generation(
+            response['response'],
+            context=response.get('context'),
+            prompt_eval_count=response.get('prompt_eval_count') or 0,
+            prompt_eval_seconds=(response.get('prompt_eval_duration') or 0) / 1e9,
+            eval_count=response.get('eval_count') or 0,
+            eval_seconds=(response.get('eval_duration') or 0) / 1e9,
+            total_seconds=(response.get('total_duration') or 0) / 1e9,
+        )
+
+
+class FakeBackend(LLMBackend):
+    '''
+    Answers without a model server, for tests and benchmarks. responder maps (prompt, options) to the response;
+    by default every prompt gets a short deterministic answer derived from its hash. Every call is recorded.
+    '''
+    def __init__(self, responder: Optional[Callable[[str, dict], str]] = None, model: str = "fake", **kwargs):
+        kwargs.setdefault("backoff_seconds", 0.0)
+        super().__init__(model, **kwargs)
+        self.responder = responder
+        self.calls: List[Tuple[str, dict]] = []
+        self._calls_lock = threading.Lock()
+
+    def _generate(self, prompt: str, options: dict) -> str:
+        with self._calls_lock:
+            self.calls.append((prompt, options))
+        if self.responder is not None:
+            return self.responder(prompt, options)
+        return f"summary {hashlib.md5(prompt.encode('utf-8')).hexdigest()[:8]}"
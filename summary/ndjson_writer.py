@@ -0,0 +1,274 @@
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+
+def node_record(node) -> dict:
+    '''
+    Converts a finished node into one NDJSON record. Children are not nested; each record points at its parent
+    through parent_path and keeps its position among the parent's children in index.
+    '''
+    parent = node.parent
+    return {
+        "path": node.path,
+        "parent_path": parent.path if parent is not None else None,
+        "index": node.index if parent is not None else 0,
+        "name": node.name,
+        "type": node.type.name,
+        "summaries": [summary.model_dump() for summary in node.summaries],
+        "final_summary": node.final_summary.model_dump() if node.final_summary else None,
+    }
+
+
+class NDJSONTreeWriter:
+    '''
+    Writes each node of the summary tree as one line of JSON as soon as it is finished, so the output never has to
+    be held in memory as one document and everything written before a crash is kept. Safe to call from the
+    scheduler's worker threads.
+    '''
+    def __init__(self, output_file: str, mode: str = "w"):
+        self.output_file = output_file
+        self._file = open(output_file, mode, encoding="utf-8")
+        self._lock = threading.Lock()
+        self.written = 0
+
+    def write_node(self, node) -> None:
+        self.write_record(node_record(node))
+
+    def write_record(self, record: dict) -> None:
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.written += 1
+
+    def fsync(self) -> None:
+        '''
+        forces everything written so far to disk
+        '''
+        with self._lock:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_records(input_file: str) -> Iterator[dict]:
+    '''
+    Streams the records of an NDJSON summary file, skipping a truncated last line left behind by a crash
+    '''
+    with open(input_file, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping malformed line in {input_file}")
+
+
+def rebuild_tree(input_file: str) -> Optional[dict]:
+    '''
+    Rebuilds the nested dictionary written by ContextAwareFunctionSummaryGenerator.dumps() from an NDJSON file.
+    If a path was written more than once, its last record wins.
+    '''
+    nodes: Dict[str, dict] = {}
+    for record in iter_records(input_file):
+        if "kind" in record:  # e.g. function records of a checkpoint
+            continue
+        nodes[record["path"]] = record
+
+    children: Dict[str, List[dict]] = defaultdict(list)
+    root = None
+    for record in nodes.values():
+        if record["parent_path"] is None:
+            root = record
+        else:
+            children[record["parent_path"]].append(record)
+
+    return nest_records(root, children) if root is not None else None
+
+
+def nest_records(record: dict, children: Dict[str, List[dict]]) -> dict:
+    '''
+    Builds the nested dumps() shape of the subtree below record, given the child records of every path
+    '''
+    return {
+        "name": record["name"],
+        "type": record["type"],
+        "path": record["path"],
+        "summaries": record["summaries"],
+        "final_summary": record["final_summary"],
+        "children": [
+            nest_records(child, children)
+            for child in sorted(children[record["path"]], key=lambda r: r["index"])
+        ],
+    }
+
+
+def node_document(record: dict) -> Optional[dict]:
+    '''
+    the vector store document of the final summary of a node record, or None if it has no summary
+    '''
+    final = record.get("final_summary")
+    if not final or final.get("summary") is None:
+        return None
+    return {
+        "page_content": final["summary"],
+        "metadata": {
+            "type": record["type"],
+            "name": final.get("name", ""),
+            "path": record["path"],
+            "code": final.get("code", ""),
+            "summary": final["summary"],
+        },
+    }
+
+
+def function_document(path: str, func: dict) -> dict:
+    '''
+    the vector store document of one function summary of the python file at path
+    '''
+    metadata = {
+        "type": "FUNCTION",
+        "name": func["name"],
+        "path": path,
+        "code": func["code"],
+        "summary": func["summary"],
+    }
+    # copies of the same function share a fingerprint, so queries can collapse them; the call graph id looks up
+    # the callers and callees of a function
+    for key in ("fingerprint", "duplicate_of", "function"):
+        if func.get("metadata", {}).get(key):
+            metadata[key] = func["metadata"][key]
+    return {"page_content": f"{func['summary']}\n\n{func['code']}", "metadata": metadata}
+
+
+def document_id(document: dict) -> str:
+    '''
+    stable id of a document, so publishing it again replaces the earlier copy
+    '''
+    metadata = document["metadata"]
+    if metadata["type"] != "FUNCTION":
+        return f"{metadata['type']}:{metadata['path']}"
+    digest = hashlib.md5(metadata["code"].encode("utf-8")).hexdigest()[:12]
+    return f"FUNCTION:{metadata['path']}::{metadata['name']}:{digest}"
+
+
+def iter_documents(input_file: str) -> Iterator[dict]:
+    '''
+    Streams vector store documents ({"page_content", "metadata"}, the format of vdb/data/langchain_docs.json)
+    straight from an NDJSON summary file without rebuilding the tree
+    '''
+    for record in iter_records(input_file):
+        if "kind" in record:
+            continue
+        document = node_document(record)
+        if document is not None:
+            yield document
+        if record["type"] == "PYTHON_FILE":
+            for func in record.get("summaries", []):
+                yield function_document(record["path"], func)
+
+
+class DocumentPublisher:
+    '''
+    Appends vector store documents to an NDJSON file while a run is in progress: every function summary as soon as
+    it is written and every file and directory summary once its node is finished. A reader such as the RAG api
+    picks up what was appended since it last looked with read_published, so questions can be answered from the
+    part of the repository summarized so far. Every document carries an id and is published once.
+    '''
+    def __init__(self, output_file: str, mode: str = "w"):
+        self.writer = NDJSONTreeWriter(output_file, mode)
+        self.published = set()
+        if mode == "w":
+            # every run starts its file with its own id, so a PublishedReader notices the file was rewritten even
+            # when the new run grew past the offset it had reached in the old one
+            self.writer.write_record({"kind": "run", "run": uuid.uuid4().hex})
+        self._lock = threading.Lock()
+
+    def publish(self, document: dict) -> None:
+        document = dict(document, id=document_id(document))
+        with self._lock:
+            if document["id"] in self.published:
+                return
+            self.published.add(document["id"])
+        self.writer.write_record(document)
+
+    def publish_function(self, path: str, summary_result) -> None:
+        self.publish(function_document(path, summary_result.model_dump()))
+
+    def publish_node(self, node) -> None:
+        record = node_record(node)
+        if record["type"] == "PYTHON_FILE":
+            # functions that were reused instead of summarized were not published yet
+            for func in record["summaries"]:
+                self.publish(function_document(record["path"], func))
+        document = node_document(record)
+        if document is not None and document["page_content"]:
+            self.publish(document)
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def read_published(input_file: str, offset: int = 0) -> Tuple[List[dict], int]:
+    '''
+    Returns the documents a DocumentPublisher appended to input_file after byte offset, and the offset to continue
+    from next time. A line that is still being written is left for the next call.
+    '''
+    if not os.path.exists(input_file):
+        return [], offset
+    if offset > os.path.getsize(input_file):
+        offset = 0  # the file was truncated by a new run
+    with open(input_file, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    documents = []
+    for line in data[:end].splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            print(f"Skipping malformed line in {input_file}")
+            continue
+        if "kind" not in record:
+            documents.append(record)
+    return documents, offset + end
+
+
+class PublishedReader:
+    '''
+    Follows the file of a DocumentPublisher across runs: read returns what was appended since the last call, and
+    starts over from the top when a new run rewrote the file, which it tells by the run record on its first line.
+    '''
+    def __init__(self, input_file: str):
+        self.input_file = input_file
+        self.offset = 0
+        self.first_line: Optional[bytes] = None
+
+    def read(self) -> List[dict]:
+        try:
+            with open(self.input_file, "rb") as f:
+                first_line = f.readline()
+        except FileNotFoundError:
+            return []
+        if first_line != self.first_line:
+            self.first_line = first_line
+            self.offset = 0
+        documents, self.offset = read_published(self.input_file, self.offset)
+        return documents
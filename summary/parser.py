@@ -2,13 +2,13 @@ from typing import List
 import requests
 import base64
 
+from summary.ast_extract import extract_source
+
 url = r"https://github.com/CornellDataScience/MathSearch"
 base_url = r"https://api.github.com/repos/CornellDataScience/MathSearch/contents"
 
 
 def parse(file_path) -> List[str]:
-    import ast
-
     funcs = []
     full_path = base_url + file_path
     try:
@@ -19,12 +19,10 @@ def parse(file_path) -> List[str]:
         else:
             print("Content was not found.")
 
-        tree = ast.parse(content)
-        lines = content.decode("utf-8").splitlines()
-
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                funcs.append("\n".join(lines[node.lineno - 1 : node.end_lineno]))
+        parsed = extract_source(content.decode("utf-8"), file_path)
+        if parsed.error is not None:
+            raise SyntaxError(parsed.error)
+        funcs = [func.code for func in parsed.functions]
 
     except Exception as e:
         print(f"Error parsing file {file_path}: {e}")
@@ -1,13 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 from pydantic import BaseModel
-import ollama
+import hashlib
+import json
 import os
-import ast
 import re
+import time
+
+from summary.repo_scanner import RepoManifest, RepoScanner
+from summary.ignore_rules import IgnoreRules, summarize_skipped
+from summary.ast_extract import ASTExtractor
+from summary.import_graph import CALLED, SUBCLASSED, Dependency, ModuleIndex
+from summary.graph_store import GraphStore
+from summary.llm_backend import LLMBackend, LLMError, OllamaBackend
+from summary.run_stats import RunStats
+from summary.summary_cache import SummaryCache
+from summary.instrumentation import StageTimer, run_report, write_report
 
 class FileRelationship(BaseModel):
     uses: str
     description: str
+    symbols: Dict[str, List[str]] = {}  # imported name -> called and/or subclassed, see import_graph.Dependency
 
 class UsedByRelationship(BaseModel):
     used_by: str
@@ -20,243 +33,304 @@ class FileContext(BaseModel):
 class RelationalContext:
     def _build_codebase_index(self) -> None:
         """Build an index of all files and packages in the codebase"""
-        for root, dirs, files in os.walk(self.base_path):
-            # Add Python files to codebase_files
-            for file in files:
-                if file.endswith('.py'):
-                    # Convert to relative path from base_path
-                    rel_path = os.path.relpath(os.path.join(root, file), self.base_path)
-                    # Convert to import-style path
-                    import_path = rel_path.replace('/', '.').replace('\\', '.')[:-3]  # Remove .py
-                    self.codebase_files.add(import_path)
-            
+        for entry in self.manifest.python_files():
+            # Convert to relative path from base_path
+            rel_path = os.path.relpath(entry.path, self.base_path)
+            # Convert to import-style path
+            import_path = rel_path.replace('/', '.').replace('\\', '.')[:-3]  # Remove .py
+            self.codebase_files.add(import_path)
+
             # Check for packages (directories with __init__.py)
-            if '__init__.py' in files:
+            if entry.name == '__init__.py':
                 # Convert to relative path from base_path
-                rel_path = os.path.relpath(root, self.base_path)
+                rel_path = os.path.relpath(os.path.dirname(entry.path), self.base_path)
                 # Convert to import-style path
                 import_path = rel_path.replace('/', '.').replace('\\', '.')
                 self.codebase_packages.add(import_path)
 
-    def __init__(self, base_path: str):
+    def __init__(self, base_path: str, manifest: Optional[RepoManifest] = None,
+                 ignore: Optional[IgnoreRules] = None, extractor: Optional[ASTExtractor] = None,
+                 backend: Optional[LLMBackend] = None, max_workers: int = 4, cache: Optional[SummaryCache] = None):
         self.base_path = base_path
+        self.max_workers = max_workers  # number of files analyzed concurrently
+        # relationships of files whose content and dependencies did not change are reused from here
+        self.cache = cache
+        self.backend = backend if backend is not None else OllamaBackend("llama3.2:latest")
         self.relationships: Dict[str, FileContext] = {}
+        self.graph = GraphStore()  # the uses edges between files, answers used_by and transitive queries
+        self.stats = RunStats()
+        self.timer = StageTimer()  # wall time per stage and per file, for the run report
+        self.wall_seconds = 0.0
         self.codebase_files = set()  # Set of all files in the codebase
         self.codebase_packages = set()  # Set of all packages in the codebase
+        # vendored and generated code is left out of the index and never analyzed
+        self.ignore = ignore if ignore is not None else IgnoreRules()
+        # one scan of the codebase shared by the index and process_directory
+        if manifest is None:
+            with self.timer.stage("scan"):
+                manifest = RepoScanner(base_path, ignore=self.ignore).scan()
+        self.manifest = manifest
+        # parses each python file once, shared with the summary generators when they run in the same process
+        self.extractor = extractor if extractor is not None else ASTExtractor()
         self._build_codebase_index()  # Build the index on initialization
+        # resolves imports, relative ones included, to the files of the codebase without an LLM
+        self.index = ModuleIndex(base_path, [entry.path for entry in self.manifest.python_files()])
         self.relationship_prompt = """
-        Analyze the following Python code and identify how it uses other files in the codebase.
-        For each imported file, describe SPECIFICALLY how the imported components are used in the code.
-        Look for:
+        Analyze the following Python code and describe how it uses each of the local modules listed below.
+        The components imported from each module and how the code uses them (called, subclassed) are listed
+        next to it. For each module, describe SPECIFICALLY:
         1. What classes/functions are imported
         2. How these imports are used in the code (specific methods called, inheritance, etc.)
         3. The purpose of using these imports in the context of this file
         
-        Format your response in this EXACT format:
-        target_file|Imports [component] for [specific usage details], [another usage], and [another usage]
+        Format your response with one line per module in this EXACT format:
+        module|Imports [component] for [specific usage details], [another usage], and [another usage]
         
         Example:
-        validator.py|Imports DataValidator for validating user input data, enforcing data type constraints, and checking required fields
+        validator|Imports DataValidator for validating user input data, enforcing data type constraints, and checking required fields
         
         DO NOT mention generic terms like "use in the code". Instead, describe the specific purposes and functionalities.
         Description should be clear and concise. Should be a single sentence yet descriptive
         
-        Here's the code to analyze:
+        Modules:
         """
 
     def _is_local_import(self, import_path: str) -> bool:
         """Check if an import is from our local codebase"""
         return import_path in self.codebase_files or import_path in self.codebase_packages
 
-    def _extract_imports(self, file_content: str) -> List[str]:
-        """Extract all import statements from a file and identify local imports"""
-        try:
-            tree = ast.parse(file_content)
-            local_imports = []
-            
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
-                    for name in node.names:
-                        if self._is_local_import(name.name):
-                            local_imports.append(name.name)
-                elif isinstance(node, ast.ImportFrom):
-                    if node.module and self._is_local_import(node.module):
-                        local_imports.append(node.module)
-            
-            return local_imports
-        except Exception as e:
-            print(f"Error parsing imports: {e}")
+    def _dependencies(self, file_path: str, file_content: str) -> List[Dependency]:
+        """The local modules a file imports and the names it calls or subclasses from them, found statically"""
+        parsed = self.extractor.extract(file_content, file_path)
+        if parsed.error is not None:
+            print(f"Error parsing imports: {parsed.error}")
             return []
+        return self.index.symbol_dependencies(file_path, parsed)
+
+    def _extract_imports(self, file_content: str, file_path: str = "") -> List[str]:
+        """Extract all import statements from a file and identify local imports"""
+        return [dependency.module for dependency in self._dependencies(file_path, file_content)]
+
+    @staticmethod
+    def _describe_usage(dependency: Dependency) -> str:
+        """The statically found usage of one module, e.g. format_name (called), Base (subclassed), CONFIG"""
+        if not dependency.symbols:
+            return "imported as a module"
+        return ", ".join(f"{name} ({', '.join(kinds)})" if kinds else name
+                         for name, kinds in dependency.symbols.items())
+
+    @staticmethod
+    def _static_description(dependency: Dependency) -> str:
+        """A description built from the static usage alone, for modules the model did not describe"""
+        called = [name for name, kinds in dependency.symbols.items() if CALLED in kinds]
+        subclassed = [name for name, kinds in dependency.symbols.items() if SUBCLASSED in kinds]
+        imported = list(dependency.symbols) or [dependency.module]
+        description = f"Imports {', '.join(imported)} from {dependency.module}"
+        usages = ([f"calling {', '.join(called)}"] if called else []) + \
+                 ([f"subclassing {', '.join(subclassed)}"] if subclassed else [])
+        return description + (f" for {' and '.join(usages)}" if usages else "")
+
+    def _cache_key(self, file_content: str, dependencies: List[Dependency]) -> str:
+        """
+        Key of the relationships of a file in self.cache: the model, the prompt, the content of the file and the
+        content of every module it imports, so a file is analyzed again when it or any of its dependencies change
+        """
+        dependency_hashes = []
+        for dependency in dependencies:
+            entry = self.manifest.get(dependency.path)
+            dependency_hashes.append(f"{dependency.module}:{entry.sha256 if entry is not None else ''}")
+        return SummaryCache.make_key(self.backend.model, self.relationship_prompt,
+                                     hashlib.sha256(file_content.encode("utf-8")).hexdigest(),
+                                     *sorted(dependency_hashes))
 
     def _analyze_file_relationships(self, file_path: str, file_content: str) -> List[FileRelationship]:
-        """Analyze a file's content to infer its relationships with other files"""
+        """
+        Analyze a file's content to infer its relationships with other files. The dependencies are resolved
+        statically; the model only describes them, all of them in one prompt, and files without local
+        imports are not sent to the model at all. If the model fails, every dependency keeps its static
+        description, and the result is not cached, so the file is described again on the next run.
+        """
         try:
-            # First get local imports
-            local_imports = self._extract_imports(file_content)
-            
-            # Then use LLM to infer relationships
-            response = ollama.generate(
-                model="llama3.2:latest",
-                prompt=self.relationship_prompt + file_content,
-                stream=False,
-                options={
-                    'num_predict': -1,
-                    'keep_alive': 0,
-                    'temperature': 0.2  # Lower temperature for more focused responses
-                },
-            )
-            
-            relationships = []
-            seen_targets = set()  # Track seen targets to avoid duplicates
-            
+            dependencies = self._dependencies(file_path, file_content)
+            if not dependencies:
+                return []
+            self.stats.incr("static dependencies", len(dependencies))
+            key = self._cache_key(file_content, dependencies) if self.cache is not None else None
+            if key is not None:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self.stats.incr("relation cache hits")
+                    return [FileRelationship(**relationship) for relationship in json.loads(cached)]
+            by_module = {dependency.module: dependency for dependency in dependencies}
+            modules = "\n".join(f"{dependency.module}: {self._describe_usage(dependency)}"
+                                 for dependency in dependencies)
+            try:
+                response = self._generate(f"{self.relationship_prompt}{modules}\n\nHere's the code to analyze:\n"
+                                          f"{file_content}")
+            except LLMError as e:
+                print(f"Error describing relationships for {file_path}, keeping the static descriptions: {e}")
+                self.stats.incr("relation prompt failures")
+                response, key = "", None
+
+            descriptions = {}
             # Parse LLM response
-            for line in response['response'].strip().split('\n'):
+            for line in response.strip().split('\n'):
                 line = line.strip()
                 if not line or '|' not in line:
                     continue
-                    
-                try:
-                    target, desc = line.split('|', 1)
-                    target = target.strip()
-                    desc = desc.strip()
-                    
-                    # Skip if we've already processed this target
-                    if target in seen_targets:
-                        continue
-                        
-                    # Only add if it's a local file and description is meaningful
-                    if (self._is_local_import(target) and 
-                        len(desc) > 20 and  # Ensure description is substantial
-                        "use in the code" not in desc.lower()):  # Avoid generic descriptions
-                        relationship = FileRelationship(
-                            uses=target,
-                            description=desc
-                        )
-                        relationships.append(relationship)
-                        seen_targets.add(target)
-                except (ValueError, IndexError) as e:
-                    print(f"Warning: Skipping malformed relationship line: {line}")
-                    continue
-            
-            # For any remaining imports that weren't described by the LLM
-            for imp in local_imports:
-                if imp not in seen_targets:
-                    # Get a more detailed description for this import
-                    detail_prompt = f"""
-                    Analyze this specific import '{imp}' in the following code and describe 
-                    SPECIFICALLY how it is used. Focus on actual functionality, methods called,
-                    and purpose in the code. DO NOT use generic descriptions.
-                    Description should be clear and concise. Should be a single sentence yet descriptive
-                    
-                    {file_content}
-                    """
-                    
-                    detail_response = ollama.generate(
-                        model="llama3.2:latest",
-                        prompt=detail_prompt,
-                        stream=False,
-                        options={
-                            'num_predict': -1,
-                            'keep_alive': 0,
-                            'temperature': 0.2
-                        },
-                    )
-                    
-                    description = detail_response['response'].strip()
-                    if len(description) > 20:  # Ensure description is substantial
-                        relationship = FileRelationship(
-                            uses=imp,
-                            description=f"Imports {imp} for {description}"
-                        )
-                        relationships.append(relationship)
-            
+                target, desc = line.split('|', 1)
+                target = target.strip().strip('`')
+                if target.endswith('.py'):
+                    target = target[:-3].replace('/', '.')
+                desc = desc.strip()
+                # Only keep meaningful descriptions of the modules that were asked about
+                if (target in by_module and target not in descriptions and
+                    len(desc) > 20 and  # Ensure description is substantial
+                    "use in the code" not in desc.lower()):  # Avoid generic descriptions
+                    descriptions[target] = desc
+
+            relationships = []
+            for dependency in dependencies:
+                description = descriptions.get(dependency.module)
+                if description is None:
+                    self.stats.incr("static relation descriptions")
+                    description = self._static_description(dependency)
+                relationships.append(FileRelationship(
+                    uses=dependency.module,
+                    description=description,
+                    symbols=dependency.symbols
+                ))
+            if key is not None:
+                self.cache.put(key, json.dumps([relationship.model_dump() for relationship in relationships]))
             return relationships
         except Exception as e:
             print(f"Error analyzing relationships for {file_path}: {e}")
             return []
 
-    def _build_used_by_relationships(self):
-        """Build the used_by relationships for each file based on the uses relationships"""
-        # Initialize used_by lists for all files
-        for file_path in self.relationships:
-            if not isinstance(self.relationships[file_path], FileContext):
-                self.relationships[file_path] = FileContext(
-                    uses_relationships=self.relationships[file_path],
-                    used_by_relationships=[]
-                )
+    def _generate(self, prompt: str) -> str:
+        self.stats.incr("relation prompts")
+        with self.timer.stage("llm"):
+            # Lower temperature for more focused responses
+            return self.backend.generate(prompt, kind="relation", options={'temperature': 0.2})
 
-        # Build used_by relationships
+    def _build_graph(self) -> GraphStore:
+        """The uses relationships of every analyzed file as a graph between file paths"""
+        graph = GraphStore()
         for source_file, context in self.relationships.items():
+            graph.add_node(source_file)
             for relationship in context.uses_relationships:
-                target_file = relationship.uses
-                # Convert to full path if needed
-                if not target_file.endswith('.py'):
-                    target_file = f"{target_file}.py"
-                if not target_file.startswith('testrelation/'):
-                    target_file = f"testrelation/{target_file}"
-                
-                # Add used_by relationship to the target file
-                if target_file in self.relationships:
-                    # Rephrase description from target's perspective
-                    original_desc = relationship.description.lower()
-                    
-                    # Remove common import prefixes if they exist
-                    desc = original_desc
-                    for prefix in ["imports", "uses", "utilizes"]:
-                        if desc.startswith(prefix.lower()):
-                            desc = desc[len(prefix):].strip()
-                            if desc.startswith("for"):
-                                desc = desc[3:].strip()
-                    
-                    # Extract the component name if mentioned
-                    component = ""
-                    if target_file.replace(".py", "") in desc:
-                        parts = desc.split(target_file.replace(".py", ""))
-                        if len(parts) > 1:
-                            desc = parts[1].strip()
-                    
-                    # Create the new description
-                    source_name = os.path.basename(source_file).replace(".py", "")
-                    new_desc = f"{source_name} expects {desc}"
-                    
-                    used_by = UsedByRelationship(
-                        used_by=source_file,
-                        description=new_desc
-                    )
-                    self.relationships[target_file].used_by_relationships.append(used_by)
+                target_file = self.index.modules.get(relationship.uses)
+                if target_file is not None:
+                    graph.add_edge(source_file, target_file, relationship.description, relationship.symbols)
+        return graph
 
-    def process_file(self, file_path: str) -> None:
-        """Process a single file and store its relationships"""
+    @staticmethod
+    def _used_by_description(source_file: str, module: str, description: str) -> str:
+        """Rephrases the description of a uses relationship from the perspective of the module it uses"""
+        desc = description.lower()
+
+        # Remove common import prefixes if they exist
+        for prefix in ["imports", "uses", "utilizes"]:
+            if desc.startswith(prefix):
+                desc = desc[len(prefix):].strip()
+                if desc.startswith("for"):
+                    desc = desc[3:].strip()
+
+        # Drop everything up to the module name if it is mentioned
+        parts = desc.split(module.lower(), 1)
+        if len(parts) > 1 and parts[1].strip():
+            desc = parts[1].strip()
+
+        source_name = os.path.basename(source_file).replace(".py", "")
+        return f"{source_name} expects {desc}"
+
+    def _build_used_by_relationships(self):
+        """
+        Build the used_by relationships for each file based on the uses relationships, from the reverse
+        adjacency of the dependency graph
+        """
+        self.graph = self._build_graph()
+        for target_file, context in self.relationships.items():
+            module = self.index.names.get(os.path.normpath(target_file), "")
+            context.used_by_relationships = [
+                UsedByRelationship(
+                    used_by=source_file,
+                    description=self._used_by_description(source_file, module,
+                                                          self.graph.edge(source_file, target_file)[0])
+                )
+                for source_file in self.graph.used_by(target_file)
+            ]
+
+    def save_graph(self, output_file: str) -> None:
+        """Save the dependency graph to a SQLite file, see GraphStore"""
+        self.graph.save(output_file)
+
+    def load_graph(self, input_file: str) -> None:
+        """Open a dependency graph saved with save_graph; it is read lazily as it is queried"""
+        self.graph = GraphStore.open(input_file)
+
+    def _analyze_file(self, file_path: str) -> Optional[FileContext]:
+        """Analyze a single file, None if it can not be read or its analysis fails"""
+        start = time.perf_counter()
+        context = None
         try:
-            with open(file_path, 'r') as f:
-                content = f.read()
+            content = self.manifest.read_text(file_path)
+            if content is None:
+                return None
             
             relationships = self._analyze_file_relationships(file_path, content)
-            self.relationships[file_path] = FileContext(
+            context = FileContext(
                 uses_relationships=relationships,
                 used_by_relationships=[]
             )
         except Exception as e:
             print(f"Error processing file {file_path}: {e}")
+            self.stats.incr("failed files")
+        self.stats.incr("files analyzed")
+        self.timer.record_node(file_path, time.perf_counter() - start)
+        return context
+
+    def process_file(self, file_path: str) -> None:
+        """Process a single file and store its relationships"""
+        context = self._analyze_file(file_path)
+        if context is not None:
+            self.relationships[file_path] = context
 
     def process_directory(self, directory: str) -> None:
-        """Process all Python files in a directory recursively"""
-        # First build/update the codebase index
-        self._build_codebase_index()
-        
-        # Then process all files
-        for root, _, files in os.walk(directory):
-            for file in files:
-                if file.endswith('.py'):
-                    full_path = os.path.join(root, file)
-                    self.process_file(full_path)
+        """
+        Process all Python files in a directory recursively. Files are analyzed concurrently by up to
+        self.max_workers threads, and the used_by relationships are built once all of them are done.
+        """
+        # The codebase index was built from the manifest on initialization; only directories outside
+        # of base_path need a scan of their own
+        start = time.perf_counter()
+        manifest = self.manifest
+        if not manifest.is_dir(directory):
+            with self.timer.stage("scan"):
+                manifest = RepoScanner(directory, ignore=self.ignore).scan()
+        print(summarize_skipped(manifest.skipped))
+        with self.timer.stage("parse"):
+            self.extractor.extract_manifest(manifest)
+        with self.timer.stage("analyze"):
+            paths = [entry.path for entry in manifest.python_files(under=directory)]
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # map keeps the order of the files, so the output is the same as a sequential run
+                for file_path, context in zip(paths, executor.map(self._analyze_file, paths)):
+                    if context is not None:
+                        self.relationships[file_path] = context
         
         # After processing all files, build the used_by relationships
-        self._build_used_by_relationships()
+        with self.timer.stage("invert"):
+            self._build_used_by_relationships()
+        self.wall_seconds += time.perf_counter() - start
+
+    def report(self) -> dict:
+        """The run report of the relation pass, see instrumentation.run_report"""
+        return run_report("relationalcontext", self.wall_seconds, self.timer, self.stats,
+                          {"main": self.backend.stats}, self.cache.stats() if self.cache is not None else None)
 
     def save_to_json(self, output_file: str) -> None:
         """Save relationships to a JSON file"""
-        import json
         with open(output_file, 'w') as f:
             json.dump(
                 {k: v.model_dump() for k, v in self.relationships.items()},
@@ -266,7 +340,6 @@ class RelationalContext:
 
     def load_from_json(self, input_file: str) -> None:
         """Load relationships from a JSON file"""
-        import json
         with open(input_file, 'r') as f:
             data = json.load(f)
             self.relationships = {
@@ -275,11 +348,15 @@ class RelationalContext:
             }
 
 def main():
-    # Example usage
+    # Example usage, run from the repository root: python -m summary.relationalcontext
     base_path = "testrelation"  # Your codebase path
-    context = RelationalContext(base_path)
+    # rerunning on an unchanged codebase answers every file from the cache
+    context = RelationalContext(base_path, cache=SummaryCache("relationships_cache.sqlite"))
     context.process_directory(base_path)
     context.save_to_json("relationships.json")
+    context.save_graph("relationships.sqlite")
+    write_report(context.report(), "relationships_report.json")
+    context.cache.close()
 
 if __name__ == "__main__":
     main()
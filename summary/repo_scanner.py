@@ -0,0 +1,215 @@
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+import hashlib
+import io
+import os
+import threading
+
+from summary.ignore_rules import IgnoreRules
+
+
+def decode_text(raw: bytes) -> str:
+    '''
+    the text of file content read as bytes, exactly as open(path, "r") would have returned it (default encoding,
+    universal newlines)
+    '''
+    return io.TextIOWrapper(io.BytesIO(raw)).read()
+
+
+class ManifestEntry:
+    '''
+    One file or directory found by RepoScanner. sha256 is None for directories.
+    '''
+    __slots__ = ("path", "name", "is_dir", "size", "mtime", "sha256")
+
+    def __init__(self, path: str, name: str, is_dir: bool, size: int, mtime: float, sha256: Optional[str] = None):
+        self.path = path
+        self.name = name
+        self.is_dir = is_dir
+        self.size = size
+        self.mtime = mtime
+        self.sha256 = sha256
+
+    def __repr__(self) -> str:
+        return f"ManifestEntry({self.path!r}, is_dir={self.is_dir}, size={self.size})"
+
+
+class RepoManifest:
+    '''
+    Everything RepoScanner found under root: paths, types, sizes, mtimes and content hashes, plus the children of
+    every directory in the order the file system listed them. Paths are joined onto root the way the summary
+    generators name their nodes; lookups accept any equivalent spelling of a path.
+    Recently read file contents are kept up to content_cache_bytes so several passes over the same files in one
+    process only read them once.
+    '''
+    def __init__(self, root: str, content_cache_bytes: int = 64 * 1024 * 1024):
+        self.root = root
+        self.entries: Dict[str, ManifestEntry] = {}
+        self.skipped: List[Tuple[str, str]] = []  # (path, reason) of entries left out by the ignore rules
+        self._children: Dict[str, List[str]] = {}
+        self.content_cache_bytes = content_cache_bytes
+        self._contents: "OrderedDict[str, str]" = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, entry: ManifestEntry, parent: Optional[str]) -> None:
+        key = os.path.normpath(entry.path)
+        self.entries[key] = entry
+        if entry.is_dir:
+            self._children.setdefault(key, [])
+        if parent is not None:
+            self._children.setdefault(os.path.normpath(parent), []).append(key)
+
+    def get(self, path: str) -> Optional[ManifestEntry]:
+        return self.entries.get(os.path.normpath(path))
+
+    def is_dir(self, path: str) -> bool:
+        entry = self.get(path)
+        return entry is not None and entry.is_dir
+
+    def children(self, path: str) -> List[ManifestEntry]:
+        return [self.entries[key] for key in self._children.get(os.path.normpath(path), [])]
+
+    def files(self, suffix: str = "", under: Optional[str] = None) -> Iterator[ManifestEntry]:
+        '''
+        yields the files ending in suffix, optionally only those below the directory under
+        '''
+        prefix = None
+        if under is not None and os.path.normpath(under) != os.path.normpath(self.root):
+            prefix = os.path.normpath(under) + os.sep
+        for key, entry in self.entries.items():
+            if entry.is_dir or not entry.name.endswith(suffix):
+                continue
+            if prefix is None or key.startswith(prefix):
+                yield entry
+
+    def python_files(self, under: Optional[str] = None) -> Iterator[ManifestEntry]:
+        return self.files(".py", under)
+
+    def hashes(self) -> Dict[str, str]:
+        '''
+        maps every file path to the sha256 of its content, the manifest format used for incremental runs
+        '''
+        return {entry.path: entry.sha256 for entry in self.entries.values() if not entry.is_dir}
+
+    def read_text(self, path: str) -> Optional[str]:
+        key = os.path.normpath(path)
+        with self._lock:
+            if key in self._contents:
+                self._contents.move_to_end(key)
+                return self._contents[key]
+        try:
+            with open(path, "r") as f:
+                content = f.read()
+        except Exception as e:
+            print(f"Error reading file {path}: {e}")
+            return None
+        self.remember_text(path, content)
+        return content
+
+    def remember_text(self, path: str, content: str) -> None:
+        '''
+        keeps the text of a file that was just read for later read_text calls, if it fits in the cache
+        '''
+        key = os.path.normpath(path)
+        size = len(content)
+        if size > self.content_cache_bytes:
+            return
+        with self._lock:
+            if key in self._contents:
+                self._cached_bytes -= len(self._contents.pop(key))
+            self._contents[key] = content
+            self._cached_bytes += size
+            while self._cached_bytes > self.content_cache_bytes:
+                _, evicted = self._contents.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+
+class RepoScanner:
+    '''
+    Walks a repository once with os.scandir and builds a RepoManifest. Each directory is listed once and every
+    entry is stat'ed once; with hash_contents, every file is read once to hash it, and the text of the files the
+    summary passes read (text_suffixes) is kept in the manifest's content cache from that same read, so as long as
+    it fits there read_text and ASTExtractor.extract_manifest do not read them again. Symlinked directories are
+    not followed. Entries matching the ignore rules (including the .gitignore files found on the way) and files
+    over their size limit are left out and recorded in manifest.skipped; ignored directories are not entered.
+    '''
+    text_suffixes = (".py", ".md")
+
+    def __init__(self, root: str, hash_contents: bool = True, ignore: Optional[IgnoreRules] = None):
+        self.root = root
+        self.hash_contents = hash_contents
+        self.ignore = ignore if ignore is not None else IgnoreRules()
+
+    def scan(self) -> RepoManifest:
+        manifest = RepoManifest(self.root)
+        root_stat = os.stat(self.root)
+        manifest.add(ManifestEntry(self.root, os.path.basename(os.path.normpath(self.root)), True,
+                                   0, root_stat.st_mtime), None)
+        ignore = self.ignore.copy()  # .gitignore files found during the scan only apply to this scan
+        stack = [(self.root, "")]
+        while stack:
+            directory, rel_dir = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    dir_entries = list(it)
+            except OSError as e:
+                print(f"Error listing directory {directory}: {e}")
+                continue
+            if ignore.use_gitignore and any(e.name == ".gitignore" for e in dir_entries):
+                ignore.add_gitignore(os.path.join(directory, ".gitignore"), rel_dir)
+            subdirs = []
+            for dir_entry in dir_entries:
+                path = os.path.join(directory, dir_entry.name)
+                rel_path = f"{rel_dir}/{dir_entry.name}" if rel_dir else dir_entry.name
+                try:
+                    is_dir = dir_entry.is_dir(follow_symlinks=False)
+                    stat = dir_entry.stat(follow_symlinks=False)
+                except OSError as e:
+                    print(f"Error reading {path}: {e}")
+                    continue
+                reason = ignore.skip_reason(rel_path, is_dir, stat.st_size)
+                if reason is not None:
+                    manifest.skipped.append((path, reason))
+                    continue
+                entry = ManifestEntry(path, dir_entry.name, is_dir, 0 if is_dir else stat.st_size, stat.st_mtime)
+                if not is_dir and self.hash_contents:
+                    if dir_entry.name.endswith(self.text_suffixes) and stat.st_size <= manifest.content_cache_bytes:
+                        entry.sha256 = self.hash_text_file(path, manifest)
+                    else:
+                        entry.sha256 = self.hash_file(path)
+                manifest.add(entry, directory)
+                if is_dir:
+                    subdirs.append((path, rel_path))
+            # keep a depth first order close to os.walk's
+            stack.extend(reversed(subdirs))
+        return manifest
+
+    @staticmethod
+    def hash_text_file(path: str, manifest: RepoManifest) -> Optional[str]:
+        '''
+        hashes a file from one read that also puts its text in the manifest's content cache
+        '''
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+        except OSError as e:
+            print(f"Error hashing file {path}: {e}")
+            return None
+        try:
+            manifest.remember_text(path, decode_text(raw))
+        except UnicodeDecodeError:
+            pass  # read_text reports it if a pass asks for the text
+        return hashlib.sha256(raw).hexdigest()
+
+    @staticmethod
+    def hash_file(path: str) -> Optional[str]:
+        digest = hashlib.sha256()
+        try:
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        except OSError as e:
+            print(f"Error hashing file {path}: {e}")
+            return None
+        return digest.hexdigest()
@@ -0,0 +1,27 @@
+from collections import Counter
+from typing import Dict
+import threading
+
+
+class RunStats:
+    '''
+    Thread safe counters collected over a summary run, e.g. how many model calls were made or saved
+    '''
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def incr(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counts[key] += amount
+
+    def get(self, key: str) -> float:
+        with self._lock:
+            return self._counts[key]
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._counts)
+
+    def __str__(self) -> str:
+        return ", ".join(f"{key}={value}" for key, value in sorted(self.snapshot().items()))
@@ -0,0 +1,112 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+import heapq
+import itertools
+import threading
+import time
+
+from summary.run_stats import RunStats
+
+
+class SummaryScheduler:
+    '''
+    Runs summary jobs on a bounded pool of worker threads while respecting the dependencies between them.
+    A job is only handed to the pool once every future it depends on has finished, so a file summary starts
+    as soon as the summaries of its functions are done and a directory summary as soon as its children are.
+    No worker ever blocks waiting on another job, so the pool can not deadlock no matter how deep the tree is.
+    Jobs that are ready to run wait in a queue ordered by their priority, highest first and in the order they
+    became ready among equals. A scheduler created with paused=True only starts running jobs once resume() is
+    called, so everything scheduled before that is ordered by priority as a whole.
+    The time jobs spend ready but waiting for a worker is added up in stats.
+    '''
+    def __init__(self, max_workers: int = 4, paused: bool = False, stats: Optional[RunStats] = None):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summary")
+        self.stats = stats if stats is not None else RunStats()
+        self._ready = []  # heap of (-priority, sequence number, time ready, future, fn, args, kwargs)
+        self._order = itertools.count()
+        self._paused = paused
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def completed(value: Any = None) -> Future:
+        '''
+        returns a future that is already resolved to value, for work that needs no job
+        '''
+        future = Future()
+        future.set_result(value)
+        return future
+
+    def schedule(self, fn: Callable, *args, deps: Optional[List[Future]] = None, priority: float = 0,
+                 **kwargs) -> Future:
+        '''
+        Runs fn(*args, **kwargs) on the pool once all futures in deps are done and returns a future for its result.
+        If one of the dependencies failed, the job is not run and its future fails with the same exception.
+        '''
+        deps = list(deps or [])
+        result = Future()
+        if not deps:
+            self._submit(result, fn, args, kwargs, priority)
+            return result
+
+        remaining = [len(deps)]
+        lock = threading.Lock()
+
+        def on_dep_done(_):
+            with lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if not ready:
+                return
+            failed = next((dep for dep in deps if dep.exception() is not None), None)
+            if failed is not None:
+                result.set_exception(failed.exception())
+            else:
+                self._submit(result, fn, args, kwargs, priority)
+
+        for dep in deps:
+            dep.add_done_callback(on_dep_done)
+        return result
+
+    def _submit(self, result: Future, fn: Callable, args, kwargs, priority: float = 0) -> None:
+        with self._lock:
+            heapq.heappush(self._ready, (-priority, next(self._order), time.perf_counter(), result, fn, args, kwargs))
+            if self._paused:
+                return
+        self._executor.submit(self._run_next)
+
+    def _run_next(self) -> None:
+        # every queued job submits one call of this, which runs whichever ready job ranks highest at that moment
+        with self._lock:
+            _, _, ready_at, result, fn, args, kwargs = heapq.heappop(self._ready)
+        self.stats.incr("scheduler jobs")
+        self.stats.incr("scheduler queue seconds", time.perf_counter() - ready_at)
+        if not result.set_running_or_notify_cancel():
+            return
+        try:
+            result.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            result.set_exception(e)
+
+    def resume(self) -> None:
+        '''
+        starts running the jobs of a paused scheduler
+        '''
+        with self._lock:
+            if not self._paused:
+                return
+            self._paused = False
+            queued = len(self._ready)
+        for _ in range(queued):
+            self._executor.submit(self._run_next)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
@@ -0,0 +1,78 @@
+from typing import List, Optional
+import threading
+
+from summary.ast_extract import ImportInfo, ParsedFile
+from summary.llm_backend import ContextUnsupportedError, LLMBackend
+
+
+def import_line(info: ImportInfo) -> str:
+    names = ", ".join(name if asname is None else f"{name} as {asname}" for name, asname in info.names)
+    if not info.is_from:
+        return f"import {names}"
+    return f"from {'.' * info.level}{info.module or ''} import {names}"
+
+
+def file_preamble(path: str, parsed: Optional[ParsedFile], max_imports: int = 40) -> str:
+    '''
+    The context every function of a file shares: its path, module docstring and imports
+    '''
+    lines = [f"The following functions are from the python file {path}."]
+    if parsed is not None and parsed.docstring:
+        lines.append(f"The module docstring is:\n{parsed.docstring.strip()}")
+    if parsed is not None and parsed.imports:
+        imports = [import_line(info) for info in parsed.imports[:max_imports]]
+        if len(parsed.imports) > max_imports:
+            imports.append(f"# and {len(parsed.imports) - max_imports} more imports")
+        lines.append("The file imports:\n" + "\n".join(imports))
+    return "\n".join(lines) + "\n\n"
+
+
+class FileSession:
+    '''
+    Lets the prompts for the functions of one file share its preamble. When the backend supports contexts the
+    preamble is encoded once by start() and every prompt continues from the returned context, so the model only
+    evaluates the function itself; otherwise, or when encoding fails, the preamble is put in front of every prompt.
+    Prompt evaluation time saved is estimated as the time encoding the preamble took, once per continued prompt.
+    '''
+    def __init__(self, backend: LLMBackend, preamble: str):
+        self.backend = backend
+        self.preamble = preamble
+        self.context: Optional[List[int]] = None
+        self.preamble_eval_seconds = 0.0
+        self.preamble_eval_count = 0
+        self.continued = 0  # prompts that continued from the context
+        self._lock = threading.Lock()
+
+    def start(self) -> "FileSession":
+        if not self.backend.supports_context:
+            return self
+        try:
+            generation = self.backend.generate_full(self.preamble + "Reply with OK.", kind="preamble")
+        except Exception as e:
+            print(f"Error encoding file preamble, sending it with every prompt instead: {e}")
+            return self
+        self.context = generation.context or None
+        self.preamble_eval_seconds = generation.prompt_eval_seconds
+        self.preamble_eval_count = generation.prompt_eval_count
+        return self
+
+    def generate(self, backend: LLMBackend, prompt: str, kind: str) -> str:
+        '''
+        answers prompt in the context of the file, with backend (the small model may answer in place of the one
+        the session was started with; it then gets the preamble as text)
+        '''
+        if self.context is not None and backend is self.backend:
+            try:
+                text = backend.generate_full(prompt, kind=kind, context=self.context).text
+            except ContextUnsupportedError:
+                pass
+            else:
+                with self._lock:
+                    self.continued += 1
+                return text
+        return backend.generate(self.preamble + prompt, kind=kind)
+
+    @property
+    def seconds_saved(self) -> float:
+        with self._lock:
+            return self.continued * self.preamble_eval_seconds
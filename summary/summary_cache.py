@@ -0,0 +1,109 @@
+from typing import Dict, Optional
+import hashlib
+import sqlite3
+import threading
+import time
+
+
+class SummaryCache:
+    '''
+    Persistent, content addressed cache of generated summaries backed by SQLite.
+    Entries are keyed by a hash of the model name and the full prompt (which contains the code or the child
+    summaries being summarized), so an entry is reused exactly when the model would be asked the same question again.
+    Entries are evicted when they have not been used for max_age_seconds, and the least recently used entries are
+    dropped once the cache holds more than max_entries. Hit and miss counters are kept for the lifetime of the object.
+    '''
+    def __init__(self, path: str = "summary_cache.sqlite", max_entries: Optional[int] = 200_000,
+                 max_age_seconds: Optional[float] = 30 * 24 * 3600, evict_every: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.evict_every = evict_every  # run eviction after this many writes
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, *parts: str) -> str:
+        '''
+        hashes the model name and the prompt parts into a cache key
+        '''
+        digest = hashlib.sha256(model.encode("utf-8"))
+        for part in parts:
+            digest.update(b"\0")
+            digest.update(part.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE summaries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, value, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._conn.commit()
+            self._writes += 1
+            if self.evict_every and self._writes % self.evict_every == 0:
+                self._evict()
+
+    def evict(self) -> int:
+        '''
+        removes expired and least recently used entries, returns the number of entries removed
+        '''
+        with self._lock:
+            return self._evict()
+
+    def _evict(self) -> int:
+        removed = 0
+        if self.max_age_seconds is not None:
+            cursor = self._conn.execute(
+                "DELETE FROM summaries WHERE last_used < ?", (time.time() - self.max_age_seconds,)
+            )
+            removed += cursor.rowcount
+        if self.max_entries is not None:
+            cursor = self._conn.execute(
+                "DELETE FROM summaries WHERE key IN ("
+                "SELECT key FROM summaries ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            removed += cursor.rowcount
+        self._conn.commit()
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._evict()
+            self._conn.close()
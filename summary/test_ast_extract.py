@@ -0,0 +1,119 @@
+import os
+import sys
+import unittest
+import tempfile
+import shutil
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.ast_extract import ASTExtractor, extract_source
+from summary.repo_scanner import RepoScanner
+
+
+SOURCE = '''import os
+import numpy as np
+from . import helpers
+from ..core.models import Model as M, Field
+
+
+def top(a):
+    return a
+
+
+class Service:
+    def run(self):
+        def inner():
+            return 1
+        return inner()
+
+    async def fetch(self):
+        return await other()
+'''
+
+
+class TestExtractSource(unittest.TestCase):
+    def test_functions_in_source_order(self):
+        parsed = extract_source(SOURCE)
+        self.assertIsNone(parsed.error)
+        self.assertEqual([f.qualname for f in parsed.functions],
+                         ["top", "Service.run", "Service.run.inner", "Service.fetch"])
+        top, run, inner, fetch = parsed.functions
+        self.assertEqual(top.code, "def top(a):\n    return a")
+        self.assertEqual((top.lineno, top.end_lineno), (7, 8))
+        self.assertIsNone(top.class_name)
+        self.assertEqual(run.class_name, "Service")
+        self.assertIsNone(inner.class_name)
+        self.assertTrue(fetch.is_async)
+        self.assertEqual(fetch.class_name, "Service")
+
+    def test_imports(self):
+        imports = extract_source(SOURCE).imports
+        self.assertEqual([(i.module, i.level, i.is_from) for i in imports],
+                         [("os", 0, False), ("numpy", 0, False), (None, 1, True), ("core.models", 2, True)])
+        self.assertEqual(imports[1].names, [("numpy", "np")])
+        self.assertEqual(imports[3].names, [("Model", "M"), ("Field", None)])
+
+    def test_fingerprints(self):
+        original, reformatted, renamed, other_global = extract_source(
+            'def load(path):\n    data = read(path)\n    return data\n'
+            'def load(path):\n    """Loads path."""\n    data = read( path )  # same\n    return data\n'
+            'def fetch(url):\n    body = read(url)\n    return body\n'
+            'def load(path):\n    data = write(path)\n    return data\n').functions
+        self.assertEqual(original.fingerprint, reformatted.fingerprint)
+        self.assertNotEqual(original.fingerprint, renamed.fingerprint)
+        self.assertEqual(original.renamed_fingerprint, renamed.renamed_fingerprint)
+        self.assertNotEqual(original.renamed_fingerprint, other_global.renamed_fingerprint)
+
+    def test_syntax_error(self):
+        parsed = extract_source("def broken(:\n")
+        self.assertIsNotNone(parsed.error)
+        self.assertEqual(parsed.functions, [])
+
+
+class TestASTExtractor(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        for i in range(4):
+            with open(os.path.join(self.test_dir, f"mod{i}.py"), "w") as f:
+                f.write(f"def f{i}():\n    return {i}\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_each_file_is_parsed_once(self):
+        extractor = ASTExtractor(max_workers=1)
+        manifest = RepoScanner(self.test_dir).scan()
+        parsed = extractor.extract_manifest(manifest)
+        self.assertEqual(len(parsed), 4)
+        self.assertEqual(extractor.parsed, 4)
+        with open(os.path.join(self.test_dir, "mod2.py")) as f:
+            content = f.read()
+        self.assertEqual([func.name for func in extractor.extract(content).functions], ["f2"])
+        # a second pass over the same manifest finds everything cached
+        self.assertEqual(extractor.extract_manifest(manifest), {})
+        self.assertEqual(extractor.parsed, 4)
+
+    def test_crlf_files_are_found_by_their_manifest_hash(self):
+        with open(os.path.join(self.test_dir, "crlf.py"), "wb") as f:
+            f.write(b"def g():\r\n    return 5\r\n")
+        extractor = ASTExtractor(max_workers=1)
+        manifest = RepoScanner(self.test_dir).scan()
+        parsed = extractor.parsed_manifest(manifest)
+        self.assertEqual(parsed[os.path.join(self.test_dir, "crlf.py")].functions[0].code, "def g():\n    return 5")
+        self.assertEqual(len(parsed), 5)
+        self.assertEqual(extractor.parsed_manifest(manifest), parsed)
+        self.assertEqual(extractor.parsed, 5)
+        # the text the generators read from the file hits the same parse
+        self.assertIs(extractor.extract(manifest.read_text(os.path.join(self.test_dir, "crlf.py"))),
+                      parsed[os.path.join(self.test_dir, "crlf.py")])
+
+    def test_process_pool(self):
+        extractor = ASTExtractor(max_workers=2, min_pool_files=1, chunksize=1)
+        paths = [os.path.join(self.test_dir, f"mod{i}.py") for i in range(4)]
+        parsed = extractor.extract_paths(paths)
+        self.assertEqual([parsed[path].functions[0].name for path in paths], ["f0", "f1", "f2", "f3"])
+        self.assertEqual(extractor.extract("def f1():\n    return 1\n").functions[0].qualname, "f1")
+
+
+if __name__ == '__main__':
+    unittest.main()
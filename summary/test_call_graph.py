@@ -0,0 +1,73 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.ast_extract import ASTExtractor
+from summary.call_graph import CallGraphBuilder, callers_and_callees, function_id
+from summary.import_graph import ModuleIndex
+from summary.repo_scanner import RepoScanner
+from summary.testing import write_files
+
+
+class TestCallGraph(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        write_files(self.root, {
+            "pkg/__init__.py": "from .base import Base\n",
+            "pkg/base.py": "class Base:\n"
+                           "    def __init__(self):\n        self.setup()\n"
+                           "    def setup(self):\n        pass\n"
+                           "    def save(self):\n        return validate(self)\n\n"
+                           "def validate(obj):\n    return obj\n",
+            "pkg/models.py": "from pkg import Base\nfrom . import base\n\n"
+                             "class Model(Base):\n"
+                             "    def setup(self):\n        super().setup()\n"
+                             "    def save(self, other):\n"
+                             "        other.save()\n        base.validate(self)\n        return self.setup()\n",
+            "app.py": "from pkg.models import Model\n\n"
+                      "def main():\n"
+                      "    def helper():\n        return Model()\n"
+                      "    helper().save(None)\n    print('done')\n",
+        })
+        manifest = RepoScanner(self.root).scan()
+        builder = CallGraphBuilder(ModuleIndex.from_manifest(manifest), ASTExtractor().parsed_manifest(manifest))
+        self.builder = builder
+        self.graph = builder.build()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def id(self, rel_path, qualname):
+        return function_id(os.path.join(self.root, rel_path), qualname)
+
+    def callees(self, rel_path, qualname):
+        return set(self.graph.uses(self.id(rel_path, qualname)))
+
+    def test_calls_resolve_through_imports_and_classes(self):
+        models = os.path.join("pkg", "models.py")
+        base = os.path.join("pkg", "base.py")
+        # the nested function and the class it instantiates, through its inherited __init__
+        self.assertEqual(self.callees("app.py", "main"), {self.id("app.py", "main.helper")})
+        self.assertEqual(self.callees("app.py", "main.helper"), {self.id(base, "Base.__init__")})
+        # self.setup() in Base.__init__ stays in Base, the module attribute base.validate resolves to the function
+        self.assertEqual(self.callees(base, "Base.__init__"), {self.id(base, "Base.setup")})
+        self.assertEqual(self.callees(models, "Model.save"), {self.id(base, "validate"), self.id(models, "Model.setup")})
+        # super() skips the class itself; Base comes from a re-export in pkg/__init__.py
+        self.assertEqual(self.callees(models, "Model.setup"), {self.id(base, "Base.setup")})
+        self.assertEqual(self.callees(base, "Base.save"), {self.id(base, "validate")})
+        # other.save() and print() can not be resolved
+        self.assertGreaterEqual(self.builder.unresolved, 2)
+
+    def test_callers_and_callees(self):
+        related = callers_and_callees(self.graph, self.id(os.path.join("pkg", "base.py"), "validate"))
+        self.assertEqual(set(related["callers"]), {self.id(os.path.join("pkg", "base.py"), "Base.save"),
+                                                   self.id(os.path.join("pkg", "models.py"), "Model.save")})
+        self.assertEqual(related["callees"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from benchmarks.fake_ollama import FakeOllamaServer
+from summary.endpoint_pool import EndpointPool
+from summary.llm_backend import LLMError, OllamaBackend
+
+
+def answering_server(**kwargs):
+    return FakeOllamaServer(respond=lambda prompt: f"answer to {prompt}", **kwargs)
+
+
+class TestEndpointPool(unittest.TestCase):
+    def setUp(self):
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.close()
+
+    def pool(self, servers, **kwargs):
+        for server in servers:
+            self.servers.append(server.start())
+        return EndpointPool([OllamaBackend("fake", host=server.url, retries=0) for server in servers], **kwargs)
+
+    def run_prompts(self, pool, count, workers=8):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda i: pool.generate(f"prompt {i}", kind="function"), range(count)))
+
+    def test_faster_endpoints_take_more_work(self):
+        fast, slow = answering_server(latency=0.01), answering_server(latency=0.08)
+        pool = self.pool([fast, slow], max_concurrency=2)
+        answers = self.run_prompts(pool, 40)
+        self.assertEqual(answers, [f"answer to prompt {i}" for i in range(40)])
+        self.assertGreater(fast.generated, 2 * slow.generated)
+        self.assertLessEqual(fast.max_active, 2)
+        self.assertLessEqual(slow.max_active, 2)
+        throughput = pool.throughput()
+        self.assertEqual(sum(row["calls"] for row in throughput.values()), 40)
+        self.assertIn(fast.url, pool.report())
+
+    def test_prompts_of_a_failing_endpoint_are_requeued(self):
+        healthy, broken = answering_server(latency=0.01), answering_server(failing=True)
+        pool = self.pool([broken, healthy], max_concurrency=2, health_check_seconds=60)
+        answers = self.run_prompts(pool, 20)
+        self.assertEqual(len(answers), 20)
+        self.assertEqual(healthy.generated, 20)
+        self.assertGreater(pool.stats.get("requeued prompts"), 0)
+        self.assertFalse(pool.throughput()[broken.url]["healthy"])
+
+    def test_recovered_endpoint_rejoins_after_health_check(self):
+        first, second = answering_server(failing=True), answering_server()
+        pool = self.pool([first, second], max_concurrency=1, health_check_seconds=0.05)
+        pool.generate("one")
+        self.assertFalse(pool.throughput()[first.url]["healthy"])
+        first.failing = False
+        time.sleep(0.1)
+        self.run_prompts(pool, 10, workers=2)
+        self.assertTrue(pool.throughput()[first.url]["healthy"])
+        self.assertGreater(first.generated, 0)
+        self.assertGreater(pool.stats.get("health checks"), 0)
+
+    def test_last_endpoint_is_waited_for_until_its_health_check(self):
+        server = answering_server(fail_first=1)
+        pool = self.pool([server], health_check_seconds=0.05)
+        self.assertEqual(pool.generate("prompt"), "answer to prompt")
+        self.assertEqual(pool.stats.get("requeued prompts"), 1)
+        self.assertEqual(pool.stats.get("health checks"), 1)
+
+    def test_health_check_closes_the_endpoint_circuit(self):
+        server = answering_server(fail_first=1).start()
+        self.servers.append(server)
+        backend = OllamaBackend("fake", host=server.url, retries=0, failure_threshold=1, reset_seconds=60)
+        pool = EndpointPool([backend], health_check_seconds=0.05)
+        self.assertEqual(pool.generate("prompt"), "answer to prompt")
+        self.assertEqual(backend.stats.get("circuit rejections"), 0)
+
+    def test_fails_when_every_endpoint_is_down(self):
+        pool = self.pool([answering_server(failing=True)], health_check_seconds=0.05, failure_threshold=100)
+        start = time.monotonic()
+        with self.assertRaises(LLMError):
+            pool.generate("prompt")
+        with self.assertRaises(LLMError):
+            pool.generate("prompt")
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_concurrency_limit_per_endpoint(self):
+        with self.assertRaises(ValueError):
+            EndpointPool([OllamaBackend("fake"), OllamaBackend("fake")], max_concurrency=[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import os
+import sys
+import unittest
+import tempfile
+import shutil
+import threading
+import json
+import base64
+import hashlib
+import io
+import tarfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.github_fetch import GitHubFetcher
+
+
+class LocalGitHubServer:
+    """Serves a local directory like the github contents and tarball apis would, with ETags"""
+    def __init__(self, root, repo="owner/repo"):
+        self.root = root
+        self.repo = repo
+        self.sha = "abc123"  # of the commit the tarball is made from
+        self.requests = []  # (path, status) of every request
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, body = server.respond(self.path, self.headers.get("If-None-Match"))
+                server.requests.append((self.path, status))
+                self.send_response(status)
+                self.send_header("ETag", server.etag(self.path))
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.httpd.server_port}"
+        self.contents_url = f"{self.base}/repos/{repo}/contents"
+        self.tarball_url = GitHubFetcher.archive_url(repo, api=self.base)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def local_path(self, url_path):
+        return os.path.join(self.root, url_path[len(f"/repos/{self.repo}/contents"):].lstrip("/"))
+
+    def etag(self, url_path):
+        digest = hashlib.sha256(url_path.encode("utf-8"))
+        for directory, _, files in sorted(os.walk(self.root)):
+            for name in sorted(files):
+                with open(os.path.join(directory, name), "rb") as f:
+                    digest.update(name.encode("utf-8") + f.read())
+        return f'"{digest.hexdigest()}"'
+
+    def respond(self, url_path, if_none_match):
+        if if_none_match == self.etag(url_path):
+            return 304, b""
+        if url_path.startswith(self.tarball_url[len(self.base):]):
+            buffer = io.BytesIO()
+            with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+                tar.add(self.root, arcname=f"{self.repo.replace('/', '-')}-{self.sha}")
+            return 200, buffer.getvalue()
+        path = self.local_path(url_path)
+        if os.path.isdir(path):
+            listing = [
+                {"name": name, "type": "dir" if os.path.isdir(os.path.join(path, name)) else "file",
+                 "size": 0 if os.path.isdir(os.path.join(path, name)) else os.path.getsize(os.path.join(path, name))}
+                for name in os.listdir(path)
+            ]
+            return 200, json.dumps(listing).encode("utf-8")
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                content = base64.b64encode(f.read()).decode("ascii")
+            return 200, json.dumps({"content": content, "encoding": "base64"}).encode("utf-8")
+        return 404, b"{}"
+
+
+class TestGitHubFetcher(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.repo = os.path.join(self.test_dir, "repo")
+        os.makedirs(os.path.join(self.repo, "pkg"))
+        for name in ("a.py", "b.py", "c.py"):
+            with open(os.path.join(self.repo, "pkg", name), "w") as f:
+                f.write(f"def {name[0]}():\n    pass\n")
+        self.server = LocalGitHubServer(self.repo)
+        self.cache_dir = os.path.join(self.test_dir, "cache")
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.test_dir)
+
+    def test_unchanged_archive_costs_one_conditional_request(self):
+        fetcher = GitHubFetcher(self.cache_dir)
+        root = fetcher.download_archive(self.server.tarball_url)
+        self.assertEqual(os.path.basename(root), "repo")
+        self.assertEqual(fetcher.session.headers["Accept"], "application/vnd.github+json")
+        with open(os.path.join(root, "pkg", "a.py")) as f:
+            self.assertEqual(f.read(), "def a():\n    pass\n")
+
+        # a new process with the same cache directory
+        fetcher = GitHubFetcher(self.cache_dir)
+        self.assertEqual(fetcher.download_archive(self.server.tarball_url), root)
+        self.assertEqual(fetcher.stats.get("not modified"), 1)
+        self.assertEqual(fetcher.stats.get("archives extracted"), 0)
+        self.assertEqual([status for _, status in self.server.requests], [200, 304])
+
+        with open(os.path.join(self.repo, "pkg", "a.py"), "w") as f:
+            f.write("def a():\n    return 1\n")
+        self.server.sha = "def456"
+        # a new commit is extracted to the same directory, so its paths match the previous run's
+        self.assertEqual(fetcher.download_archive(self.server.tarball_url), root)
+        with open(os.path.join(root, "pkg", "a.py")) as f:
+            self.assertEqual(f.read(), "def a():\n    return 1\n")
+        self.assertEqual(fetcher.stats.get("archives extracted"), 1)
+
+    def test_prefetched_files_and_conditional_contents_requests(self):
+        fetcher = GitHubFetcher(self.cache_dir, max_workers=3)
+        listing = fetcher.get_json(self.server.contents_url + "/pkg")
+        urls = [f"{self.server.contents_url}/pkg/{item['name']}" for item in listing]
+        fetcher.prefetch(urls)
+        contents = {url.rsplit("/", 1)[-1]: fetcher.get_file(url) for url in urls}
+        self.assertEqual(contents["b.py"], "def b():\n    pass\n")
+        self.assertEqual(len(self.server.requests), 4)
+
+        fetcher = GitHubFetcher(self.cache_dir)
+        self.assertEqual(fetcher.get_file(urls[0]), contents[urls[0].rsplit("/", 1)[-1]])
+        self.assertEqual(self.server.requests[-1][1], 304)
+
+    def test_missing_file_raises(self):
+        fetcher = GitHubFetcher(self.cache_dir)
+        with self.assertRaises(Exception):
+            fetcher.get_file(self.server.contents_url + "/missing.py")
+
+
+if __name__ == '__main__':
+    unittest.main()
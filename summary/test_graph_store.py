@@ -0,0 +1,59 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.graph_store import GraphStore
+
+
+class TestGraphStore(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        # app -> views -> models -> base, and a cycle views <-> forms
+        self.graph = GraphStore.from_edges([
+            ("app", "views"), ("views", "models"), ("models", "base"), ("views", "forms"), ("forms", "views"),
+            ("admin", "models"),
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def check_queries(self, graph):
+        self.assertEqual(sorted(graph.uses("views")), ["forms", "models"])
+        self.assertEqual(sorted(graph.used_by("models")), ["admin", "views"])
+        self.assertEqual(graph.uses("missing"), [])
+        self.assertEqual(graph.dependencies("app"), {"views": 1, "models": 2, "forms": 2, "base": 3})
+        self.assertEqual(graph.dependents("base", max_hops=2), {"models": 1, "views": 2, "admin": 2})
+        self.assertEqual(graph.dependents("base"), {"models": 1, "views": 2, "admin": 2, "forms": 3, "app": 3})
+        self.assertEqual(graph.strongly_connected_components(), [["forms", "views"]])
+        self.assertEqual(len(graph.strongly_connected_components(min_size=1)), 5)
+        self.assertEqual(graph.edge_count(), 6)
+
+    def test_queries(self):
+        self.check_queries(self.graph)
+
+    def test_saved_graph_loads_lazily(self):
+        self.graph.add_edge("app", "models", "Imports Model for rendering", {"Model": ["called"]})
+        path = os.path.join(self.test_dir, "graph.sqlite")
+        self.graph.save(path)
+        loaded = GraphStore.open(path)
+        self.assertEqual(loaded.names, [])  # nothing is read before the first query
+        self.assertEqual(loaded.edge("app", "models"), ("Imports Model for rendering", {"Model": ["called"]}))
+        self.assertIsNone(loaded.edge("models", "app"))
+        self.assertEqual(loaded.dependencies("app", max_hops=1), {"views": 1, "models": 1})
+        loaded.add_edge("base", "app")
+        self.assertEqual(loaded.strongly_connected_components(), [["app", "base", "forms", "models", "views"]])
+        loaded.close()
+
+    def test_deep_chain_does_not_recurse(self):
+        graph = GraphStore.from_edges((str(i), str(i + 1)) for i in range(20_000))
+        graph.add_edge("20000", "0")
+        self.assertEqual(len(graph.strongly_connected_components()[0]), 20_001)
+        self.assertEqual(len(graph.dependents("0")), 20_000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.ast_extract import extract_source
+from summary.import_graph import ModuleIndex
+from summary.repo_scanner import RepoScanner
+from summary.testing import write_files
+
+
+class TestImportGraph(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        write_files(self.root, {
+            "pkg/__init__.py": "",
+            "pkg/core.py": "import json\n",
+            "pkg/sub/__init__.py": "from .. import core\n",
+            "pkg/sub/helpers.py": "from ..core import load\nfrom . import missing\nimport pkg.core.load\n",
+            "app.py": "from pkg import core\nfrom pkg.sub import helpers\nimport helpers as h\n",
+        })
+        self.index = ModuleIndex.from_manifest(RepoScanner(self.root).scan())
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def dependencies(self, rel_path):
+        path = os.path.join(self.root, rel_path)
+        with open(path) as f:
+            parsed = extract_source(f.read(), path)
+        return {os.path.relpath(target, self.root) for target in self.index.dependencies(path, parsed)}
+
+    def test_relative_and_from_imports_resolve_to_files(self):
+        self.assertEqual(self.dependencies("pkg/sub/__init__.py"), {"pkg/core.py"})
+        # "from . import missing" falls back to the package itself
+        self.assertEqual(self.dependencies("pkg/sub/helpers.py"), {"pkg/core.py", "pkg/sub/__init__.py"})
+        # "import helpers" is matched by the unique module ending in helpers
+        self.assertEqual(self.dependencies("app.py"), {"pkg/core.py", "pkg/sub/helpers.py"})
+
+    def test_standard_library_imports_are_not_local(self):
+        self.assertEqual(self.dependencies("pkg/core.py"), set())
+
+    def test_symbol_usage_of_imported_names(self):
+        path = os.path.join(self.root, "pkg", "sub", "__init__.py")
+        parsed = extract_source(
+            "from ..core import Base, load as load_core, CONSTANT\n"
+            "from pkg.sub import helpers\n"
+            "import pkg.core\n"
+            "class View(Base):\n"
+            "    def run(self):\n"
+            "        helpers.format(load_core())\n"
+            "        return pkg.core.Base.create()\n", path)
+        dependencies = {os.path.relpath(d.path, self.root): d for d in self.index.symbol_dependencies(path, parsed)}
+        self.assertEqual(list(dependencies), ["pkg/core.py", "pkg/sub/helpers.py"])
+        self.assertEqual(dependencies["pkg/core.py"].module, "pkg.core")
+        self.assertEqual(dependencies["pkg/core.py"].symbols,
+                         {"Base": ["subclassed"], "load": ["called"], "CONSTANT": [], "Base.create": ["called"]})
+        self.assertEqual(dependencies["pkg/sub/helpers.py"].symbols, {"format": ["called"]})
+
+
+if __name__ == '__main__':
+    unittest.main()
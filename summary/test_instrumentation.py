@@ -0,0 +1,63 @@
+import os
+import sys
+import json
+import time
+import unittest
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.instrumentation import StageTimer, backend_metrics, prometheus_metrics, run_report
+from summary.llm_backend import FakeBackend, Generation
+from summary.run_stats import RunStats
+
+
+class CountingBackend(FakeBackend):
+    """Reports token counts and timings the way Ollama does"""
+    def _generate_full(self, prompt, options, context):
+        return Generation(self._generate(prompt, options), prompt_eval_count=100, prompt_eval_seconds=0.5,
+                          eval_count=20, eval_seconds=1.0, total_seconds=0.0)
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_stages_and_slowest_nodes(self):
+        timer = StageTimer()
+        with timer.stage("parse"):
+            time.sleep(0.01)
+        timer.add("parse", 0.5)
+        timer.record_node("a.py", 0.2)
+        timer.record_node("b.py", 0.1)
+        timer.record_node("a.py", 0.2)
+        stages = timer.stages()
+        self.assertEqual(stages["parse"]["calls"], 2)
+        self.assertGreater(stages["parse"]["seconds"], 0.5)
+        self.assertEqual(timer.slowest_nodes(1), [{"path": "a.py", "seconds": 0.4}])
+
+    def test_backend_token_throughput(self):
+        backend = CountingBackend()
+        backend.generate("one")
+        backend.generate("two")
+        metrics = backend_metrics(backend.stats)
+        self.assertEqual(metrics["prompt tokens"], 200)
+        self.assertEqual(metrics["completion tokens per second"], 20)
+        self.assertEqual(metrics["prompt tokens per second"], 200)
+        self.assertEqual(metrics["model calls"], 2)
+
+    def test_report_renders_as_prometheus_metrics(self):
+        timer = StageTimer()
+        timer.add("llm", 1.5)
+        timer.record_node('odd "name".py', 1.5)
+        stats = RunStats()
+        stats.incr("batched_prompts", 3)
+        report = run_report("test", 2.0, timer, stats, {"main": RunStats()}, {"hits": 3, "misses": 1, "hit_rate": 0.75})
+        json.dumps(report)
+        metrics = prometheus_metrics(report)
+        self.assertIn('smart_search_stage_seconds{run="test",stage="llm"} 1.5', metrics)
+        self.assertIn('smart_search_events{run="test",event="batched_prompts"} 3', metrics)
+        self.assertIn('smart_search_cache_hit_rate{run="test"} 0.75', metrics)
+        self.assertIn('path="odd \\"name\\".py"', metrics)
+        for line in metrics.splitlines():
+            self.assertTrue(line.startswith("# TYPE smart_search_") or line.startswith("smart_search_"), line)
+
+
+if __name__ == '__main__':
+    unittest.main()
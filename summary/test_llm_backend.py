@@ -0,0 +1,86 @@
+import os
+import sys
+import unittest
+
+import ollama
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from benchmarks.fake_ollama import FakeOllamaServer
+from summary.llm_backend import CircuitOpenError, FakeBackend, LLMError, OllamaBackend
+
+
+class FlakyBackend(FakeBackend):
+    """Fails the first `failures` calls with `error`"""
+    def __init__(self, failures, error=None, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+        self.error = error or ConnectionError("connection refused")
+
+    def _generate(self, prompt, options):
+        if self.failures > 0:
+            self.failures -= 1
+            raise self.error
+        return super()._generate(prompt, options)
+
+
+class TestLLMBackend(unittest.TestCase):
+    def test_output_caps_per_kind(self):
+        backend = FakeBackend(max_tokens={"function": 100})
+        backend.generate("a", kind="function")
+        backend.generate("b", kind="directory")
+        backend.generate("c", kind="function", options={"num_predict": 5, "temperature": 0.2})
+        self.assertEqual([options for _, options in backend.calls],
+                         [{"num_predict": 100}, {"num_predict": -1}, {"num_predict": 5, "temperature": 0.2}])
+
+    def test_transient_errors_are_retried(self):
+        backend = FlakyBackend(failures=2, retries=3)
+        self.assertTrue(backend.generate("prompt").startswith("summary "))
+        self.assertEqual(backend.stats.get("retries"), 2)
+
+    def test_gives_up_after_retries(self):
+        backend = FlakyBackend(failures=10, retries=2)
+        with self.assertRaises(LLMError):
+            backend.generate("prompt")
+        self.assertEqual(backend.stats.get("model calls"), 3)
+
+    def test_client_errors_are_not_retried(self):
+        backend = OllamaBackend("missing-model", retries=3)
+        self.assertFalse(backend.is_retryable(ollama.ResponseError("model not found", 404)))
+        self.assertTrue(backend.is_retryable(ollama.ResponseError("overloaded", 503)))
+        self.assertTrue(backend.is_retryable(ConnectionError()))
+
+    def test_circuit_breaker_fails_fast(self):
+        backend = FlakyBackend(failures=2, retries=0, failure_threshold=2, reset_seconds=60)
+        for _ in range(2):
+            with self.assertRaises(LLMError):
+                backend.generate("prompt")
+        with self.assertRaises(CircuitOpenError):
+            backend.generate("prompt")
+        self.assertEqual(backend.stats.get("model calls"), 2)
+
+        backend.reset_circuit()
+        self.assertTrue(backend.generate("prompt").startswith("summary "))
+
+
+class TestOllamaBackend(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOllamaServer(respond=lambda prompt: "  a summary\n").start()
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_requests_keep_the_model_loaded(self):
+        backend = OllamaBackend("llama3.2:latest", host=self.server.url,
+                                keep_alive="10m")
+        self.assertEqual(backend.generate("summarize", kind="file"), "  a summary\n")
+        backend.generate("again", kind="function")
+        first, second = self.server.bodies
+        self.assertEqual(first["keep_alive"], "10m")
+        self.assertEqual(first["options"]["num_predict"], 384)
+        self.assertEqual(second["options"]["num_predict"], 256)
+        self.assertEqual(first["model"], "llama3.2:latest")
+
+
+if __name__ == '__main__':
+    unittest.main()
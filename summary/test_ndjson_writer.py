@@ -0,0 +1,58 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.ndjson_writer import DocumentPublisher, PublishedReader, read_published
+from summary.tree_generate_summary import SummaryResult
+
+
+class TestDocumentPublisher(unittest.TestCase):
+    def test_published_documents_are_read_incrementally(self):
+        output_dir = tempfile.mkdtemp()
+        try:
+            output_file = os.path.join(output_dir, "published.ndjson")
+            publisher = DocumentPublisher(output_file)
+            summary = SummaryResult(name="load", summary="loads it", code="def load(): pass", metadata={})
+            publisher.publish_function("core.py", summary)
+            documents, offset = read_published(output_file)
+            self.assertEqual([d["metadata"]["name"] for d in documents], ["load"])
+            publisher.publish_function("core.py", summary)  # published once
+            publisher.publish_function("a.py", summary)
+            with open(output_file, "a") as f:
+                f.write('{"partial": ')  # a line still being written
+            documents, offset = read_published(output_file, offset)
+            self.assertEqual([d["metadata"]["path"] for d in documents], ["a.py"])
+            self.assertEqual(read_published(output_file, offset), ([], offset))
+            publisher.close()
+        finally:
+            shutil.rmtree(output_dir)
+
+    def test_republished_file_is_read_from_the_start(self):
+        output_dir = tempfile.mkdtemp()
+        try:
+            output_file = os.path.join(output_dir, "published.ndjson")
+            reader = PublishedReader(output_file)
+            summary = SummaryResult(name="load", summary="loads it", code="def load(): pass", metadata={})
+            with_long_code = SummaryResult(name="save", summary="saves it", code="def save(): " + "x" * 500,
+                                           metadata={})
+            for runs in ([f"a{i}.py" for i in range(5)], ["b0.py"], ["c0.py", "c1.py"]):
+                publisher = DocumentPublisher(output_file)
+                for path in runs:
+                    publisher.publish_function(path, with_long_code if path.startswith("c") else summary)
+                publisher.close()
+                # the second run is shorter and the third longer than the offset the reader reached before
+                self.assertEqual([d["metadata"]["path"] for d in reader.read()], runs)
+            # a file truncated in place is read from the start as well
+            with open(output_file, "w") as f:
+                f.write('{"id": "x"}\n')
+            self.assertEqual(read_published(output_file, 10 ** 6), ([{"id": "x"}], 12))
+        finally:
+            shutil.rmtree(output_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
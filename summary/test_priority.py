@@ -0,0 +1,48 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.ast_extract import ASTExtractor
+from summary.priority import PriorityRanker, git_activity
+from summary.repo_scanner import RepoScanner
+from summary.scheduler import SummaryScheduler
+from summary.testing import write_files
+
+
+class TestPriority(unittest.TestCase):
+    def test_most_imported_file_ranks_first(self):
+        root = tempfile.mkdtemp()
+        try:
+            write_files(root, {
+                "core.py": "def load():\n    pass\n",
+                "a.py": "from core import load\n",
+                "b.py": "import core\n",
+                "lib/leaf.py": "import a\n",
+            })
+            manifest = RepoScanner(root).scan()
+            scores = PriorityRanker().rank(manifest, ASTExtractor())
+            files = sorted((entry.path for entry in manifest.python_files()), key=scores.get, reverse=True)
+            self.assertEqual(os.path.basename(files[0]), "core.py")
+            self.assertEqual(scores[os.path.normpath(root)], scores[os.path.normpath(files[0])])
+            self.assertEqual(scores[os.path.join(root, "lib")], scores[os.path.join(root, "lib", "leaf.py")])
+            self.assertEqual(git_activity(root), {})
+        finally:
+            shutil.rmtree(root)
+
+    def test_ready_jobs_run_highest_priority_first(self):
+        order = []
+        with SummaryScheduler(max_workers=1, paused=True) as scheduler:
+            futures = [scheduler.schedule(order.append, name, priority=priority)
+                       for name, priority in [("low", 0), ("high", 5), ("middle", 1), ("high too", 5)]]
+            scheduler.resume()
+            for future in futures:
+                future.result(timeout=5)
+        self.assertEqual(order, ["high", "high too", "middle", "low"])
+
+
+if __name__ == '__main__':
+    unittest.main()
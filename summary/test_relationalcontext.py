@@ -0,0 +1,158 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.llm_backend import LLMBackend
+from summary.relationalcontext import RelationalContext
+from summary.summary_cache import SummaryCache
+from summary.testing import write_files
+
+
+class FakeDescriber(LLMBackend):
+    """Describes every module listed in a relation prompt, except the ones in skip"""
+    def __init__(self, skip=(), delay=0.0, fail=False):
+        super().__init__("fake", backoff_seconds=0.0)
+        self.skip = set(skip)
+        self.fail = fail
+        self.delay = delay
+        self.prompts = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def _generate(self, prompt, options):
+        with self.lock:
+            self.prompts.append(prompt)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        if self.fail:
+            raise ConnectionError("model is down")
+        listed = prompt.split("Modules:", 1)[1].split("Here's the code to analyze:", 1)[0]
+        modules = [line.split(":", 1)[0].strip() for line in listed.strip().splitlines()]
+        return "\n".join(f"{module}|Imports helpers from {module} for the specific purpose of testing relations"
+                         for module in modules if module not in self.skip)
+
+
+class TestRelationalContext(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        write_files(self.root, {
+            "pkg/__init__.py": "",
+            "pkg/models.py": "import json\n\nclass Model:\n    pass\n",
+            "pkg/util.py": "def slugify(text):\n    return text\n",
+            "pkg/views.py": "from .models import Model\nfrom pkg import util\nimport os\n\n"
+                            "class View(Model):\n    def name(self):\n        return util.slugify(os.name)\n",
+            "app.py": "from pkg.views import View\nfrom pkg import models, util\n\nView().name()\n",
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def analyze(self, backend, **kwargs):
+        context = RelationalContext(self.root, backend=backend, **kwargs)
+        context.process_directory(self.root)
+        return context
+
+    def uses(self, context, rel_path):
+        return {r.uses: r for r in context.relationships[os.path.join(self.root, rel_path)].uses_relationships}
+
+    def test_one_prompt_per_file_with_local_imports(self):
+        backend = FakeDescriber()
+        context = self.analyze(backend)
+        # models.py and util.py import nothing local and are never sent to the model
+        self.assertEqual(len(backend.prompts), 2)
+        views = self.uses(context, os.path.join("pkg", "views.py"))
+        self.assertEqual(set(views), {"pkg.models", "pkg.util"})
+        self.assertEqual(views["pkg.models"].symbols, {"Model": ["subclassed"]})
+        self.assertEqual(views["pkg.util"].symbols, {"slugify": ["called"]})
+        self.assertIn("for the specific purpose", views["pkg.util"].description)
+        self.assertEqual(set(self.uses(context, "app.py")), {"pkg.views", "pkg.models", "pkg.util"})
+        self.assertEqual(self.uses(context, "app.py")["pkg.views"].symbols, {"View": ["called"]})
+
+    def test_used_by_comes_from_the_graph(self):
+        context = self.analyze(FakeDescriber())
+        util = os.path.join(self.root, "pkg", "util.py")
+        used_by = context.relationships[util].used_by_relationships
+        self.assertEqual(sorted(os.path.relpath(r.used_by, self.root) for r in used_by),
+                         ["app.py", os.path.join("pkg", "views.py")])
+        self.assertTrue(all(" expects " in r.description for r in used_by))
+        self.assertEqual(set(context.graph.dependents(util)),
+                         {os.path.join(self.root, "pkg", "views.py"), os.path.join(self.root, "app.py")})
+
+        path = os.path.join(self.root, "relationships.sqlite")
+        context.save_graph(path)
+        loaded = RelationalContext(self.root, backend=FakeDescriber())
+        loaded.load_graph(path)
+        self.assertEqual(set(loaded.graph.dependencies(os.path.join(self.root, "app.py"))),
+                         {os.path.join(self.root, "pkg", name) for name in ("views.py", "models.py", "util.py")})
+        loaded.graph.close()
+
+    def test_files_are_analyzed_concurrently(self):
+        sequential = self.analyze(FakeDescriber(), max_workers=1)
+        backend = FakeDescriber(delay=0.05)
+        concurrent = self.analyze(backend, max_workers=4)
+        self.assertEqual(backend.max_active, 2)
+        self.assertEqual(list(sequential.relationships), list(concurrent.relationships))
+        self.assertEqual({k: v.model_dump() for k, v in sequential.relationships.items()},
+                         {k: v.model_dump() for k, v in concurrent.relationships.items()})
+
+    def test_unchanged_files_are_served_from_cache(self):
+        cache = SummaryCache(os.path.join(tempfile.mkdtemp(dir=self.root), "cache.sqlite"))
+        first = self.analyze(FakeDescriber(), cache=cache)
+        backend = FakeDescriber()
+        second = self.analyze(backend, cache=cache)
+        self.assertEqual(backend.prompts, [])
+        self.assertEqual(second.stats.get("relation cache hits"), 2)
+        self.assertEqual({k: v.model_dump() for k, v in first.relationships.items()},
+                         {k: v.model_dump() for k, v in second.relationships.items()})
+
+        # a changed dependency invalidates the files that import it, here both
+        with open(os.path.join(self.root, "pkg", "models.py"), "a") as f:
+            f.write("\nclass Other(Model):\n    pass\n")
+        backend = FakeDescriber()
+        self.analyze(backend, cache=cache)
+        self.assertEqual(len(backend.prompts), 2)
+        # a changed file that nothing imports only invalidates itself
+        with open(os.path.join(self.root, "app.py"), "a") as f:
+            f.write("\nprint('changed')\n")
+        backend = FakeDescriber()
+        self.analyze(backend, cache=cache)
+        self.assertEqual(len(backend.prompts), 1)
+        cache.close()
+
+    def test_undescribed_modules_get_a_static_description(self):
+        backend = FakeDescriber(skip={"pkg.models"})
+        context = self.analyze(backend)
+        self.assertEqual(len(backend.prompts), 2)
+        views = self.uses(context, os.path.join("pkg", "views.py"))
+        self.assertEqual(views["pkg.models"].description, "Imports Model from pkg.models for subclassing Model")
+        self.assertEqual(context.stats.get("static relation descriptions"), 2)
+
+
+    def test_dependencies_are_kept_when_the_model_fails(self):
+        cache = SummaryCache(os.path.join(tempfile.mkdtemp(dir=self.root), "cache.sqlite"))
+        context = self.analyze(FakeDescriber(fail=True), cache=cache)
+        views = self.uses(context, os.path.join("pkg", "views.py"))
+        self.assertEqual(views["pkg.models"].description, "Imports Model from pkg.models for subclassing Model")
+        self.assertEqual(set(self.uses(context, "app.py")), {"pkg.views", "pkg.models", "pkg.util"})
+        self.assertEqual(set(context.graph.dependencies(os.path.join(self.root, "app.py"))),
+                         {os.path.join(self.root, "pkg", name) for name in ("views.py", "models.py", "util.py")})
+        self.assertEqual(context.stats.get("relation prompt failures"), 2)
+        # the static descriptions are not cached, the next run asks the model again
+        backend = FakeDescriber()
+        self.analyze(backend, cache=cache)
+        self.assertEqual(len(backend.prompts), 2)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
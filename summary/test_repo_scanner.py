@@ -0,0 +1,160 @@
+import os
+import sys
+import unittest
+import tempfile
+import shutil
+import hashlib
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.ast_extract import ASTExtractor
+from summary.repo_scanner import RepoScanner
+from summary.ignore_rules import IgnoreRules
+from summary.relationalcontext import RelationalContext
+
+
+class TestRepoScanner(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.pkg = os.path.join(self.test_dir, "pkg")
+        os.makedirs(os.path.join(self.pkg, "sub"))
+        self.files = {
+            os.path.join(self.pkg, "__init__.py"): "",
+            os.path.join(self.pkg, "models.py"): "class Model:\n    pass\n",
+            os.path.join(self.pkg, "sub", "views.py"): "from pkg.models import Model\n",
+            os.path.join(self.test_dir, "README.md"): "# readme\n",
+        }
+        for path, content in self.files.items():
+            with open(path, "w") as f:
+                f.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_manifest_records_every_entry(self):
+        manifest = RepoScanner(self.test_dir).scan()
+        for path, content in self.files.items():
+            entry = manifest.get(path)
+            self.assertFalse(entry.is_dir)
+            self.assertEqual(entry.size, len(content))
+            self.assertEqual(entry.sha256, hashlib.sha256(content.encode()).hexdigest())
+        self.assertTrue(manifest.is_dir(os.path.join(self.pkg, "sub")))
+        self.assertEqual(
+            sorted(entry.name for entry in manifest.children(self.pkg)),
+            sorted(os.listdir(self.pkg)),
+        )
+        # equivalent spellings of a path find the same entry
+        self.assertIs(manifest.get(self.pkg + "/sub/../models.py"), manifest.get(os.path.join(self.pkg, "models.py")))
+
+    def test_files_under_a_directory(self):
+        manifest = RepoScanner(self.test_dir).scan()
+        self.assertEqual(len(list(manifest.python_files())), 3)
+        self.assertEqual(
+            [entry.name for entry in manifest.python_files(under=os.path.join(self.pkg, "sub"))],
+            ["views.py"],
+        )
+        self.assertEqual(set(manifest.hashes()), set(self.files))
+
+    def test_read_text_is_cached(self):
+        manifest = RepoScanner(self.test_dir).scan()
+        path = os.path.join(self.pkg, "models.py")
+        self.assertEqual(manifest.read_text(path), self.files[path])
+        os.remove(path)
+        self.assertEqual(manifest.read_text(path), self.files[path])
+
+    def test_python_files_are_read_once(self):
+        manifest = RepoScanner(self.test_dir).scan()
+        for path in self.files:
+            os.remove(path)
+        # the read that hashed them during the scan is the only one
+        for path, content in self.files.items():
+            self.assertEqual(manifest.read_text(path), content)
+        parsed = ASTExtractor(max_workers=1).extract_manifest(manifest)
+        self.assertEqual(parsed[os.path.join(self.pkg, "models.py")].classes[0].name, "Model")
+        self.assertEqual(len(parsed), 3)
+
+    def test_relational_context_index_comes_from_the_manifest(self):
+        manifest = RepoScanner(self.test_dir).scan()
+        context = RelationalContext(self.test_dir, manifest=manifest)
+        self.assertEqual(context.codebase_files, {"pkg.__init__", "pkg.models", "pkg.sub.views"})
+        self.assertEqual(context.codebase_packages, {"pkg"})
+        self.assertEqual(context._extract_imports(self.files[os.path.join(self.pkg, "sub", "views.py")]),
+                         ["pkg.models"])
+
+
+class TestIgnoreRules(unittest.TestCase):
+    def test_default_patterns(self):
+        rules = IgnoreRules()
+        self.assertTrue(rules.is_ignored("venv", True))
+        self.assertTrue(rules.is_ignored("pkg/node_modules", True))
+        self.assertTrue(rules.is_ignored("pkg/.ipynb_checkpoints", True))
+        self.assertTrue(rules.is_ignored("smart_search.egg-info", True))
+        self.assertFalse(rules.is_ignored("venv", False))  # directory patterns do not match files
+        self.assertFalse(rules.is_ignored("pkg/models.py", False))
+        # build, dist and env are only tool output at the root, deeper down they can be packages
+        self.assertTrue(rules.is_ignored("build", True))
+        self.assertFalse(rules.is_ignored("pkg/env", True))
+        self.assertFalse(rules.is_ignored("tools/build", True))
+
+    def test_gitignore_semantics(self):
+        rules = IgnoreRules([])
+        rules.add_patterns(["# comment", "*.log", "/generated/", "docs/**/*.py", "!keep.log", "sub/out.txt"])
+        self.assertTrue(rules.is_ignored("a/b/debug.log", False))
+        self.assertFalse(rules.is_ignored("a/keep.log", False))
+        self.assertTrue(rules.is_ignored("generated", True))
+        self.assertFalse(rules.is_ignored("pkg/generated", True))  # anchored to the root
+        self.assertTrue(rules.is_ignored("docs/conf.py", False))
+        self.assertTrue(rules.is_ignored("docs/a/b/conf.py", False))
+        self.assertTrue(rules.is_ignored("sub/out.txt", False))
+        self.assertFalse(rules.is_ignored("pkg/sub/out.txt", False))
+
+    def test_nested_gitignore_is_relative_to_its_directory(self):
+        rules = IgnoreRules([])
+        rules.add_patterns(["/fixtures/"], base="pkg")
+        self.assertTrue(rules.is_ignored("pkg/fixtures", True))
+        self.assertFalse(rules.is_ignored("fixtures", True))
+
+
+class TestScannerIgnoreRules(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        for directory in ["venv/lib", "pkg/fixtures", "pkg/__pycache__"]:
+            os.makedirs(os.path.join(self.test_dir, directory))
+        files = {
+            ".gitignore": "*.log\n",
+            "app.py": "x = 1\n",
+            "debug.log": "noise",
+            "big.py": "x = 1\n" * 100,
+            "venv/lib/vendored.py": "x = 1\n",
+            "pkg/.gitignore": "/fixtures/\n",
+            "pkg/fixtures/data.py": "x = 1\n",
+            "pkg/module.py": "x = 1\n",
+        }
+        for path, content in files.items():
+            with open(os.path.join(self.test_dir, path), "w") as f:
+                f.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_scan_skips_and_reports(self):
+        manifest = RepoScanner(self.test_dir, ignore=IgnoreRules(max_file_size=100)).scan()
+        names = sorted(os.path.relpath(entry.path, self.test_dir) for entry in manifest.python_files())
+        self.assertEqual(names, ["app.py", os.path.join("pkg", "module.py")])
+        skipped = {os.path.relpath(path, self.test_dir): reason for path, reason in manifest.skipped}
+        self.assertEqual(skipped, {
+            "venv": "ignored",
+            "debug.log": "ignored",
+            "big.py": "too large",
+            os.path.join("pkg", "fixtures"): "ignored",
+            os.path.join("pkg", "__pycache__"): "ignored",
+        })
+
+    def test_gitignore_can_be_disabled(self):
+        manifest = RepoScanner(self.test_dir, ignore=IgnoreRules(use_gitignore=False)).scan()
+        self.assertIsNotNone(manifest.get(os.path.join(self.test_dir, "debug.log")))
+        self.assertIsNotNone(manifest.get(os.path.join(self.test_dir, "pkg", "fixtures", "data.py")))
+
+
+if __name__ == "__main__":
+    unittest.main()
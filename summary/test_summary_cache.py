@@ -0,0 +1,70 @@
+import os
+import sys
+import unittest
+import tempfile
+import shutil
+import time
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.summary_cache import SummaryCache
+
+
+class TestSummaryCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "cache.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_key_depends_on_model_and_prompt(self):
+        key = SummaryCache.make_key("llama3.2:latest", "summarize", "def f(): pass")
+        self.assertEqual(key, SummaryCache.make_key("llama3.2:latest", "summarize", "def f(): pass"))
+        self.assertNotEqual(key, SummaryCache.make_key("llama3.1:latest", "summarize", "def f(): pass"))
+        self.assertNotEqual(key, SummaryCache.make_key("llama3.2:latest", "summarize", "def g(): pass"))
+
+    def test_hits_and_misses(self):
+        cache = SummaryCache(self.path)
+        key = SummaryCache.make_key("model", "prompt")
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "a summary")
+        self.assertEqual(cache.get(key), "a summary")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+        self.assertAlmostEqual(stats["hit_rate"], 0.5)
+        cache.close()
+
+    def test_persists_across_instances(self):
+        cache = SummaryCache(self.path)
+        cache.put("key", "value")
+        cache.close()
+        reopened = SummaryCache(self.path)
+        self.assertEqual(reopened.get("key"), "value")
+        reopened.close()
+
+    def test_evicts_least_recently_used_beyond_max_entries(self):
+        cache = SummaryCache(self.path, max_entries=2, max_age_seconds=None, evict_every=0)
+        for key in ["a", "b", "c"]:
+            cache.put(key, key)
+            time.sleep(0.01)
+        cache.get("a")  # a is now more recently used than b
+        self.assertEqual(cache.evict(), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "a")
+        self.assertEqual(cache.get("c"), "c")
+        cache.close()
+
+    def test_evicts_expired_entries(self):
+        cache = SummaryCache(self.path, max_entries=None, max_age_seconds=0.05, evict_every=0)
+        cache.put("old", "value")
+        time.sleep(0.1)
+        cache.put("new", "value")
+        self.assertEqual(cache.evict(), 1)
+        self.assertIsNone(cache.get("old"))
+        self.assertEqual(cache.get("new"), "value")
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
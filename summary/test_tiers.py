@@ -0,0 +1,62 @@
+import os
+import sys
+import textwrap
+import unittest
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.ast_extract import extract_source
+from summary.tiers import DOCSTRING, MAIN, SMALL, TEMPLATE, TierSelector
+
+
+def features(code):
+    '''
+    the features ast_extract computes for the first function in code, None if there is none
+    '''
+    functions = extract_source(textwrap.dedent(code)).functions
+    return functions[0].features if functions else None
+
+
+class TestTierSelector(unittest.TestCase):
+    def setUp(self):
+        self.selector = TierSelector(use_small=True, small_max_statements=3)
+
+    def test_trivial_shapes_use_templates(self):
+        cases = {
+            "def stub(self):\n    pass": "placeholder",
+            "    def name(self):\n        return self._name": "returns the _name attribute",
+            "def version():\n    return '1.0'": "always returns '1.0'",
+            "def set_name(self, name):\n    self._name = name": "sets the _name attribute",
+            "def __init__(self, a, b):\n    self.a = a\n    self.b = b\n    self.c = None": "stores a, b and c",
+        }
+        for code, expected in cases.items():
+            tier, summary = self.selector.select(features(code))
+            self.assertEqual(tier, TEMPLATE, code)
+            self.assertIn(expected, summary)
+
+    def test_descriptive_docstring_is_used(self):
+        code = ('def load(path):\n    """\n    Loads the configuration file at path and validates\n    its schema.\n\n'
+                '    Args:\n        path: where the file is\n    """\n    with open(path) as f:\n        return parse(f)')
+        self.assertEqual(self.selector.select(features(code)),
+                         (DOCSTRING, "Loads the configuration file at path and validates its schema."))
+        # too short to describe the function
+        self.assertEqual(self.selector.select(features('def load(path):\n    """Load."""\n    return parse(path)'))[0], SMALL)
+
+    def test_size_decides_between_small_and_main(self):
+        self.assertEqual(self.selector.select(features("def add(a, b):\n    return a + b")), (SMALL, None))
+        long = "def f(x):\n" + "".join(f"    x += {i}\n" for i in range(5)) + "    return x"
+        self.assertEqual(self.selector.select(features(long)), (MAIN, None))
+        self.assertEqual(TierSelector().select(features("def add(a, b):\n    return a + b")), (MAIN, None))
+
+    def test_features(self):
+        found = features("async def get(self, key, *, default=None):\n    if key:\n        return 1\n")
+        self.assertEqual(found.args, ["key", "default"])
+        self.assertEqual(found.statements, 2)
+        self.assertIsNone(found.shape)
+        self.assertEqual(found.lines, 3)
+        self.assertIsNone(features("x = 1"))
+        self.assertEqual(TierSelector().select(None), (MAIN, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
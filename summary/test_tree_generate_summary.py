@@ -0,0 +1,618 @@
+import os
+import sys
+import unittest
+import tempfile
+import shutil
+import threading
+import time
+import json
+import hashlib
+from contextlib import redirect_stdout
+import io
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.tree_generate_summary import ContextAwareFunctionSummaryGenerator, ItemTypes, load_tree
+from summary.ndjson_writer import NDJSONTreeWriter, iter_documents, rebuild_tree
+from summary.tree_generate_summary import SummaryResult, node_from_dict
+from summary.checkpoint import Checkpoint, CheckpointIndex
+from summary.ignore_rules import IgnoreRules
+from summary.llm_backend import Generation, LLMBackend
+from summary.github_fetch import GitHubFetcher
+from summary.test_github_fetch import LocalGitHubServer
+from summary.incremental import IncrementalIndex, build_manifest, diff_manifests
+from summary.scheduler import SummaryScheduler
+from summary.aggregation import split_text
+from summary.token_budget import estimate_tokens
+from summary.summary_cache import SummaryCache
+from summary.code_ref import SOURCES, CodeRef, code_text
+from summary.call_graph import function_id
+
+
+class FakeOllama(LLMBackend):
+    """Backend that answers deterministically without a model server and tracks concurrency"""
+    def __init__(self, delay=0.0):
+        super().__init__("fake", backoff_seconds=0.0)
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def _generate(self, prompt, options):
+        with self.lock:
+            self.calls.append(prompt)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        digest = hashlib.md5(prompt.encode("utf-8")).hexdigest()[:8]
+        return f"summary {digest}"
+
+
+class BatchFakeOllama(FakeOllama):
+    """Answers batch prompts with a JSON object, leaving out the functions named in skip"""
+    def __init__(self, skip=()):
+        super().__init__()
+        self.skip = skip
+
+    def _generate(self, prompt, options):
+        if "JSON object" not in prompt:
+            return super()._generate(prompt, options)
+        with self.lock:
+            self.calls.append(prompt)
+        labels = [line[4:] for line in prompt.splitlines() if line.startswith("### ")]
+        answer = {label: f"batched summary of {label}" for label in labels if label not in self.skip}
+        return "Here you go:\n```json\n" + json.dumps(answer) + "\n```"
+
+
+class ContextFakeOllama(FakeOllama):
+    """Returns a context for every prompt and reports one second of prompt evaluation for each"""
+    supports_context = True
+
+    def __init__(self):
+        super().__init__()
+        self.contexts = {}  # prompt -> context it continued from
+
+    def _generate_full(self, prompt, options, context):
+        with self.lock:
+            self.contexts[prompt] = context
+        return Generation(self._generate(prompt, options), context=[len(self.calls)], prompt_eval_count=10,
+                          prompt_eval_seconds=1.0)
+
+
+class DownOllama(FakeOllama):
+    """Fails every prompt that contains fail_on, like a model server that went away"""
+    def __init__(self, fail_on):
+        super().__init__()
+        self.fail_on = fail_on
+
+    def _generate(self, prompt, options):
+        if self.fail_on in prompt:
+            raise ConnectionError("model server is down")
+        return super()._generate(prompt, options)
+
+
+class Crash(BaseException):
+    """Simulates the process dying in the middle of a run"""
+
+
+class CrashingOllama(FakeOllama):
+    def __init__(self, crash_on):
+        super().__init__()
+        self.crash_on = crash_on
+
+    def _generate(self, prompt, options):
+        if self.crash_on in prompt:
+            raise Crash()
+        return super()._generate(prompt, options)
+
+
+def write_repo(root):
+    """Creates a small repository with nested packages"""
+    pkg = os.path.join(root, "pkg")
+    sub = os.path.join(pkg, "sub")
+    os.makedirs(sub)
+    with open(os.path.join(root, "README.md"), "w") as f:
+        f.write("# Test repo\n")
+    with open(os.path.join(pkg, "main.py"), "w") as f:
+        f.write("def add(a, b):\n    return a + b\n\ndef subtract(a, b):\n    return a - b\n")
+    with open(os.path.join(sub, "helpers.py"), "w") as f:
+        f.write("def upper(text):\n    return text.upper()\n\ndef lower(text):\n    return text.lower()\n")
+    with open(os.path.join(sub, "config.txt"), "w") as f:
+        f.write("not python")
+
+
+class TestSummaryScheduler(unittest.TestCase):
+    def test_job_waits_for_dependencies(self):
+        order = []
+        with SummaryScheduler(max_workers=4) as scheduler:
+            slow = scheduler.schedule(lambda: (time.sleep(0.05), order.append("slow")))
+            fast = scheduler.schedule(lambda: order.append("fast"))
+            parent = scheduler.schedule(lambda: order.append("parent"), deps=[slow, fast])
+            parent.result(timeout=5)
+        self.assertEqual(order[-1], "parent")
+        self.assertEqual(sorted(order[:2]), ["fast", "slow"])
+
+    def test_failed_dependency_propagates(self):
+        def boom():
+            raise RuntimeError("boom")
+        with SummaryScheduler(max_workers=2) as scheduler:
+            failing = scheduler.schedule(boom)
+            parent = scheduler.schedule(lambda: "never", deps=[failing])
+            with self.assertRaises(RuntimeError):
+                parent.result(timeout=5)
+
+
+class TestContextAwareFunctionSummaryGenerator(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        write_repo(self.test_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def run_generator(self, fake, **kwargs):
+        generator = ContextAwareFunctionSummaryGenerator(self.test_dir, "", backend=fake, **kwargs)
+        with redirect_stdout(io.StringIO()):
+            generator.run()
+        return generator
+
+    def find(self, node, name):
+        if node.name == name:
+            return node
+        for child in node.children:
+            found = self.find(child, name)
+            if found:
+                return found
+        return None
+
+    def test_concurrent_tree_matches_sequential(self):
+        sequential = self.run_generator(FakeOllama(), max_workers=1)
+        concurrent = self.run_generator(FakeOllama(delay=0.02), max_workers=4)
+        self.assertEqual(json.loads(sequential.dumps()), json.loads(concurrent.dumps()))
+
+    def test_functions_run_concurrently(self):
+        fake = FakeOllama(delay=0.05)
+        self.run_generator(fake, max_workers=4)
+        self.assertGreater(fake.max_active, 1)
+        self.assertLessEqual(fake.max_active, 4)
+
+    def test_file_summary_uses_function_summaries(self):
+        generator = self.run_generator(FakeOllama(), max_workers=3)
+        main_node = self.find(generator.root, "main.py")
+        self.assertEqual(main_node.type, ItemTypes.PYTHON_FILE)
+        self.assertEqual([s.name for s in main_node.summaries], ["add", "subtract"])
+        self.assertIn("def add(a, b):", code_text(main_node.final_summary.code))
+        sub_node = self.find(generator.root, "sub")
+        self.assertEqual(sub_node.final_summary.type, "DIRECTORY")
+        self.assertEqual([c.name for c in sub_node.children], ["helpers.py"])
+        self.assertEqual(generator.root.final_summary.type, "DIRECTORY")
+
+    def test_tree_keeps_code_as_references(self):
+        generator = self.run_generator(FakeOllama())
+        main_node = self.find(generator.root, "main.py")
+        self.assertIsInstance(main_node.final_summary.code, CodeRef)
+        self.assertEqual([(s.code.lineno, s.code.end_lineno) for s in main_node.summaries], [(1, 2), (4, 5)])
+        self.assertEqual(code_text(main_node.summaries[1].code), "def subtract(a, b):\n    return a - b")
+        self.assertFalse(hasattr(main_node, "__dict__"))
+        self.assertIs(main_node.parent, self.find(generator.root, "pkg"))
+        self.assertIs(main_node.name, self.find(self.run_generator(FakeOllama()).root, "main.py").name)
+        self.assertEqual(main_node.path, os.path.join(self.test_dir, "pkg", "main.py"))
+
+        # dumps resolves the references to the same document as before
+        tree = json.loads(generator.dumps())
+        main_dict = [c for c in [c for c in tree["children"] if c["name"] == "pkg"][0]["children"]
+                     if c["name"] == "main.py"][0]
+        with open(os.path.join(self.test_dir, "pkg", "main.py")) as f:
+            self.assertEqual(main_dict["final_summary"]["code"], f.read())
+        self.assertEqual(main_dict["summaries"][0]["code"], "def add(a, b):\n    return a + b")
+        self.assertEqual(node_from_dict(tree).path, "")
+
+    def test_code_changed_after_summarizing_is_marked_stale(self):
+        generator = self.run_generator(FakeOllama())
+        main_path = os.path.join(self.test_dir, "pkg", "main.py")
+        with open(main_path, "a") as f:
+            f.write("\ndef multiply(a, b):\n    return a * b\n")
+        SOURCES._files.clear()
+        tree = json.loads(generator.dumps())
+        main_dict = [c for c in [c for c in tree["children"] if c["name"] == "pkg"][0]["children"]
+                     if c["name"] == "main.py"][0]
+        for summary in [main_dict["final_summary"]] + main_dict["summaries"]:
+            self.assertEqual(summary["code"], "")
+            self.assertTrue(summary["metadata"]["stale"])
+        helpers_dict = self.find(node_from_dict(tree), "helpers.py").final_summary
+        self.assertNotIn("stale", helpers_dict.metadata)
+        self.assertIn("def ", helpers_dict.code)
+
+    def test_call_graph_in_function_metadata(self):
+        calls_path = os.path.join(self.test_dir, "pkg", "calls.py")
+        with open(calls_path, "w") as f:
+            f.write("from pkg.main import add\n\ndef total(a, b, c):\n    return add(add(a, b), c)\n")
+        generator = self.run_generator(FakeOllama(), call_graph_mode=True)
+        add = self.find(generator.root, "main.py").summaries[0]
+        total = self.find(generator.root, "calls.py").summaries[0]
+        self.assertEqual(add.metadata["function"], function_id(os.path.join(self.test_dir, "pkg", "main.py"), "add"))
+        self.assertEqual(add.metadata["called_by"], [function_id(calls_path, "total")])
+        self.assertEqual(total.metadata["calls"], [add.metadata["function"]])
+        self.assertEqual(generator.stats.get("resolved calls"), 1)  # calls are recorded once per function
+
+    def test_unchanged_repo_is_served_from_cache(self):
+        cache = SummaryCache(os.path.join(self.test_dir, "cache.sqlite"))
+        first = self.run_generator(FakeOllama(), cache=cache)
+        fake = FakeOllama()
+        second = self.run_generator(fake, cache=cache)
+        self.assertEqual(fake.calls, [])
+        self.assertEqual(json.loads(first.dumps()), json.loads(second.dumps()))
+
+        with open(os.path.join(self.test_dir, "pkg", "main.py"), "a") as f:
+            f.write("\ndef multiply(a, b):\n    return a * b\n")
+        fake = FakeOllama()
+        self.run_generator(fake, cache=cache)
+        # the new function, its file and the directories above it
+        self.assertEqual(len(fake.calls), 4)
+        cache.close()
+
+    def test_incremental_run_only_regenerates_changed_nodes(self):
+        first = self.run_generator(FakeOllama())
+        output_file = os.path.join(self.test_dir, "summary_output.json")
+        with open(output_file, "w") as f:
+            f.write(first.dumps())
+        manifest = build_manifest(self.test_dir)
+
+        with open(os.path.join(self.test_dir, "pkg", "main.py"), "a") as f:
+            f.write("\ndef multiply(a, b):\n    return a * b\n")
+        changed = diff_manifests(manifest, build_manifest(self.test_dir))
+        self.assertEqual(changed, {os.path.join(self.test_dir, "pkg", "main.py")})
+
+        fake = FakeOllama()
+        second = self.run_generator(fake, reuse=IncrementalIndex(load_tree(output_file), changed))
+        # multiply, main.py, pkg, the root and the root README (README nodes are not kept in the tree);
+        # sub/ and the other functions are reused
+        self.assertEqual(len(fake.calls), 5)
+        self.assertEqual([s.name for s in self.find(second.root, "main.py").summaries], ["add", "subtract", "multiply"])
+        self.assertEqual(
+            self.find(second.root, "sub").final_summary.summary,
+            self.find(first.root, "sub").final_summary.summary,
+        )
+
+    def test_batch_mode_packs_functions_of_a_file(self):
+        fake = BatchFakeOllama()
+        generator = self.run_generator(fake, batch_token_budget=500)
+        main_node = self.find(generator.root, "main.py")
+        self.assertEqual([s.summary for s in main_node.summaries],
+                         ["batched summary of add", "batched summary of subtract"])
+        self.assertEqual(main_node.summaries[0].metadata["batch_size"], 2)
+        stats = generator.stats.snapshot()
+        self.assertEqual(stats["batched_prompts"], 2)
+        self.assertEqual(stats["model_calls_saved"], 2)
+        # two batches, two files, three directories and the README
+        self.assertEqual(len(fake.calls), 8)
+
+    def test_batch_mode_falls_back_for_missing_functions(self):
+        fake = BatchFakeOllama(skip=("lower",))
+        generator = self.run_generator(fake, batch_token_budget=500)
+        helpers = self.find(generator.root, "helpers.py")
+        self.assertEqual([s.name for s in helpers.summaries], ["upper", "lower"])
+        self.assertEqual(helpers.summaries[0].summary, "batched summary of upper")
+        self.assertTrue(helpers.summaries[1].summary.startswith("summary "))
+        stats = generator.stats.snapshot()
+        self.assertEqual(stats["batch_fallbacks"], 1)
+        self.assertEqual(stats["model_calls_saved"], 1)
+
+    def test_wide_directory_is_map_reduced(self):
+        wide = os.path.join(self.test_dir, "wide")
+        os.makedirs(wide)
+        for i in range(30):
+            with open(os.path.join(wide, f"mod{i}.py"), "w") as f:
+                f.write(f"def f{i}():\n    return {i}\n")
+        fake = FakeOllama()
+        generator = self.run_generator(fake, prompt_token_budget=60)
+        stats = generator.stats.snapshot()
+        self.assertGreaterEqual(stats["map-reduced directory prompts"], 1)
+        self.assertGreater(stats["map-reduce chunks"], 1)
+        # every prompt stays within the budget plus the fixed instruction in front of it
+        self.assertLessEqual(max(estimate_tokens(prompt) for prompt in fake.calls), 60 + 30)
+        self.assertTrue(self.find(generator.root, "wide").final_summary.summary.startswith("summary "))
+
+    def test_long_function_is_summarized_in_segments(self):
+        body = "".join(f"    total += {i}\n" for i in range(200))
+        code = "def long():\n    total = 0\n" + body + "    return total"
+        with open(os.path.join(self.test_dir, "pkg", "long.py"), "w") as f:
+            f.write(code + "\n")
+        fake = FakeOllama()
+        generator = self.run_generator(fake, prompt_token_budget=200)
+        self.assertEqual(generator.stats.get("segmented functions"), 1)
+        self.assertLessEqual(max(estimate_tokens(prompt) for prompt in fake.calls), 200 + 30)
+        summary = self.find(generator.root, "long.py").summaries[0]
+        self.assertEqual(summary.code, code)
+        self.assertTrue(summary.summary.startswith("summary "))
+
+    def test_split_text_keeps_lines_within_budget(self):
+        text = "\n".join(["short line"] * 50 + ["x" * 300])
+        segments = split_text(text, 20)
+        self.assertEqual("".join(segments), text)
+        self.assertTrue(all(estimate_tokens(segment) <= 20 for segment in segments))
+
+    def test_cheap_tiers_skip_the_model(self):
+        with open(os.path.join(self.test_dir, "pkg", "model.py"), "w") as f:
+            f.write("class Model:\n"
+                    "    def __init__(self, name):\n        self.name = name\n\n"
+                    "    def get_name(self):\n        return self.name\n\n"
+                    "    def describe(self):\n        \"\"\"Returns a sentence that describes the model by name.\"\"\"\n"
+                    "        return f'model {self.name}'\n")
+        main, small = FakeOllama(delay=0.01), FakeOllama()
+        generator = self.run_generator(main, small_backend=small)
+        tiers = {s.name: s.metadata["tier"] for s in self.find(generator.root, "model.py").summaries}
+        self.assertEqual(tiers, {"__init__": "template", "get_name": "template", "describe": "docstring"})
+        tiers = {s.name: s.metadata["tier"] for s in self.find(generator.root, "main.py").summaries}
+        self.assertEqual(tiers, {"add": "small", "subtract": "small"})
+        self.assertFalse(any("self.name" in prompt for prompt in main.calls + small.calls))
+        # add, subtract, upper and lower; main only writes file and directory summaries
+        self.assertEqual(len(small.calls), 4)
+        self.assertFalse(any("def " in prompt for prompt in main.calls))
+        self.assertEqual(generator.stats.get("template tier functions"), 2)
+
+        main, small = BatchFakeOllama(), BatchFakeOllama()
+        generator = self.run_generator(main, small_backend=small, batch_token_budget=500)
+        self.assertEqual([(s.metadata["batch_size"], s.metadata["tier"])
+                          for s in self.find(generator.root, "main.py").summaries], [(2, "small")] * 2)
+        self.assertFalse(any("def " in prompt for prompt in main.calls))
+
+    def test_identical_functions_are_summarized_once(self):
+        with open(os.path.join(self.test_dir, "pkg", "copy.py"), "w") as f:
+            # the same add as pkg/main.py with other formatting and a comment, and a renamed copy of upper
+            f.write("def add(a,b):\n    # sum\n    return (a + b)\n\n"
+                    "def shout(words):\n    return words.upper()\n")
+        fake = FakeOllama()
+        generator = self.run_generator(fake, max_workers=3)
+        self.assertEqual(sum("return (a + b)" in prompt or "return a + b" in prompt for prompt in fake.calls), 1)
+        main, copy = self.find(generator.root, "main.py"), self.find(generator.root, "copy.py")
+        self.assertEqual(copy.summaries[0].summary, main.summaries[0].summary)
+        self.assertEqual(copy.summaries[0].metadata["fingerprint"], main.summaries[0].metadata["fingerprint"])
+        # whichever file was reached first is the original
+        duplicate, original = (main, copy) if "duplicate_of" in main.summaries[0].metadata else (copy, main)
+        self.assertEqual(duplicate.summaries[0].metadata["duplicate_of"], f"{original.path}::add")
+        self.assertNotIn("duplicate_of", original.summaries[0].metadata)
+        self.assertEqual(generator.stats.get("deduplicated functions"), 1)
+        # without renaming, shout is not a copy of upper
+        self.assertNotIn("duplicate_of", self.find(generator.root, "copy.py").summaries[1].metadata)
+
+        fake = FakeOllama()
+        generator = self.run_generator(fake, rename_identifiers=True)
+        self.assertEqual(generator.stats.get("deduplicated functions"), 2)
+        self.assertEqual(len(generator.duplicate_clusters), 2)
+
+    def test_copies_with_other_docstrings_keep_their_own_tier(self):
+        with open(os.path.join(self.test_dir, "pkg", "copy.py"), "w") as f:
+            # the add of pkg/main.py with a docstring that describes it
+            f.write('def add(a, b):\n    """\n    Adds the two numbers a and b and returns their sum to the caller.\n'
+                    '    """\n    return a + b\n')
+        generator = self.run_generator(FakeOllama(), max_workers=1)
+        main, copy = self.find(generator.root, "main.py"), self.find(generator.root, "copy.py")
+        self.assertEqual(copy.summaries[0].metadata["tier"], "docstring")
+        self.assertEqual(main.summaries[0].metadata["tier"], "main")
+        self.assertNotIn("duplicate_of", main.summaries[0].metadata)
+        self.assertNotIn("Adds the two numbers", main.summaries[0].summary)
+        self.assertEqual(generator.stats.get("deduplicated functions"), 0)
+
+    def test_session_encodes_the_file_preamble_once(self):
+        with open(os.path.join(self.test_dir, "pkg", "main.py"), "w") as f:
+            f.write('"""Arithmetic helpers."""\nimport math\nfrom os import path as p\n\n'
+                    "def add(a, b):\n    return a + b\n\ndef subtract(a, b):\n    return a - b\n")
+        fake = ContextFakeOllama()
+        generator = self.run_generator(fake, session_mode=True)
+        preambles = [prompt for prompt in fake.calls if prompt.startswith("The following functions")]
+        # one per python file
+        self.assertEqual(len(preambles), 2)
+        main_preamble = next(prompt for prompt in preambles if "main.py" in prompt)
+        self.assertIn("Arithmetic helpers.", main_preamble)
+        self.assertIn("from os import path as p", main_preamble)
+        function_prompts = [prompt for prompt in fake.calls
+                            if "def " in prompt and not prompt.startswith("The following functions")]
+        self.assertEqual(len(function_prompts), 4)
+        self.assertTrue(all(fake.contexts[prompt] is not None for prompt in function_prompts))
+        main = self.find(generator.root, "main.py")
+        self.assertEqual(main.final_summary.metadata["prompt_eval_seconds_saved"], 2.0)
+        self.assertEqual(generator.stats.get("prompt eval seconds saved by file sessions"), 4.0)
+
+    def test_session_falls_back_to_the_preamble_in_every_prompt(self):
+        fake = FakeOllama()
+        generator = self.run_generator(fake, session_mode=True)
+        function_prompts = [prompt for prompt in fake.calls if "def " in prompt]
+        self.assertEqual(len(function_prompts), 4)
+        self.assertTrue(all(prompt.startswith("The following functions are from the python file")
+                            for prompt in function_prompts))
+        self.assertEqual(self.find(generator.root, "main.py").final_summary.metadata["prompt_eval_seconds_saved"], 0)
+
+    def test_priority_mode_summarizes_imported_files_first(self):
+        # both other files import helpers.py, nothing imports main.py
+        with open(os.path.join(self.test_dir, "pkg", "sub", "user.py"), "w") as f:
+            f.write("from helpers import upper\n\ndef shout(text):\n    return upper(text) + '!'\n")
+        with open(os.path.join(self.test_dir, "pkg", "main.py"), "a") as f:
+            f.write("\nfrom pkg.sub.helpers import lower\n")
+        fake = FakeOllama()
+        generator = self.run_generator(fake, max_workers=1, priority_mode=True)
+        function_prompts = [prompt for prompt in fake.calls if "def " in prompt]
+        self.assertIn("text.upper()", function_prompts[0])
+        self.assertIn("text.lower()", function_prompts[1])
+        helpers = os.path.join(self.test_dir, "pkg", "sub", "helpers.py")
+        self.assertGreater(generator.priority(helpers), generator.priority(os.path.join(self.test_dir, "pkg", "main.py")))
+
+    def test_run_report_covers_every_stage(self):
+        cache = SummaryCache(os.path.join(self.test_dir, "cache.sqlite"))
+        generator = self.run_generator(FakeOllama(), cache=cache)
+        report = json.loads(json.dumps(generator.report()))
+        self.assertTrue({"scan", "parse", "llm", "summarize", "write"} <= set(report["stages"]))
+        self.assertEqual(report["stages"]["llm"]["calls"], report["backends"]["main"]["model calls"])
+        self.assertGreater(report["counters"]["scheduler jobs"], 0)
+        self.assertEqual(report["cache"]["misses"], report["backends"]["main"]["model calls"])
+        slowest = report["slowest_nodes"]
+        # the root node has an empty path
+        self.assertTrue(slowest and all(node["path"].startswith(self.test_dir) or node["path"] == "" for node in slowest))
+        self.assertEqual(slowest, sorted(slowest, key=lambda node: node["seconds"], reverse=True))
+        cache.close()
+
+    def test_ndjson_stream_rebuilds_the_same_tree(self):
+        output_file = os.path.join(self.test_dir, "summary.ndjson")
+        writer = NDJSONTreeWriter(output_file)
+        generator = ContextAwareFunctionSummaryGenerator(self.test_dir, "", backend=FakeOllama())
+        generator.node_listeners.append(writer.write_node)
+        with redirect_stdout(io.StringIO()):
+            generator.run()
+        writer.close()
+        # every node written, children before their parents
+        with open(output_file) as f:
+            records = [json.loads(line) for line in f]
+        paths = [record["path"] for record in records]
+        self.assertEqual(len(paths), 5)
+        self.assertEqual(paths[-1], "")
+        # the index of a record is the position add_child gave the node among its parent's children
+        self.assertEqual({record["path"]: record["index"] for record in records if record["parent_path"] == ""},
+                         {child.path: i for i, child in enumerate(generator.root.children)})
+        self.assertEqual(rebuild_tree(output_file), json.loads(generator.dumps()))
+
+        documents = list(iter_documents(output_file))
+        functions = [doc["metadata"]["name"] for doc in documents if doc["metadata"]["type"] == "FUNCTION"]
+        self.assertEqual(sorted(functions), ["add", "lower", "subtract", "upper"])
+
+    def test_released_nodes_keep_streamed_output_complete(self):
+        output_file = os.path.join(self.test_dir, "summary.ndjson")
+        reference = self.run_generator(FakeOllama())
+        writer = NDJSONTreeWriter(output_file)
+        generator = ContextAwareFunctionSummaryGenerator(self.test_dir, "", backend=FakeOllama())
+        generator.node_listeners.append(writer.write_node)
+        generator.release_finished_nodes = True
+        with redirect_stdout(io.StringIO()):
+            generator.run()
+        writer.close()
+        self.assertEqual(generator.root.children, [])
+        self.assertEqual(rebuild_tree(output_file), json.loads(reference.dumps()))
+        # the parses of finished files are dropped, and only the text of each summary is kept for duplicates
+        self.assertEqual(generator.extractor._by_hash, {})
+        self.assertEqual(generator._summarizing, {})
+        self.assertTrue(all(isinstance(summary, str) for _, summary in generator.fingerprints.values()))
+
+    def resume_after_crash(self, make_generator):
+        checkpoint_file = os.path.join(self.test_dir, "checkpoint.ndjson")
+        crashing = CrashingOllama(crash_on="def lower")
+        checkpoint = Checkpoint(checkpoint_file)
+        generator = make_generator(None, crashing)
+        generator.function_listeners.append(checkpoint.record_function)
+        generator.node_listeners.append(checkpoint.record_node)
+        with redirect_stdout(io.StringIO()):
+            with self.assertRaises(Crash):
+                generator.run()
+        checkpoint.close()
+
+        fake = FakeOllama()
+        resumed = make_generator(CheckpointIndex(checkpoint_file, node_from_dict, SummaryResult), fake)
+        with redirect_stdout(io.StringIO()):
+            resumed.run()
+        # README summaries are not kept in the tree, so they are never checkpointed
+        finished_before_crash = {prompt for prompt in crashing.calls if "# Test repo" not in prompt}
+        self.assertTrue(finished_before_crash)
+        self.assertFalse(finished_before_crash & set(fake.calls))
+        self.assertTrue(any("def lower" in prompt for prompt in fake.calls))
+        return resumed
+
+    def test_resume_skips_checkpointed_work(self):
+        reference = self.run_generator(FakeOllama(), max_workers=1)
+        resumed = self.resume_after_crash(
+            lambda reuse, backend: ContextAwareFunctionSummaryGenerator(self.test_dir, "", max_workers=1, reuse=reuse,
+                                                                        backend=backend),
+        )
+        self.assertEqual(json.loads(resumed.dumps()), json.loads(reference.dumps()))
+
+    def test_failed_nodes_are_not_checkpointed(self):
+        checkpoint_file = os.path.join(self.test_dir, "checkpoint.ndjson")
+        checkpoint = Checkpoint(checkpoint_file)
+        generator = ContextAwareFunctionSummaryGenerator(self.test_dir, "", max_workers=1, backend=FakeOllama())
+        generator.backend = DownOllama(fail_on=generator.file_prompt)
+        generator.function_listeners.append(checkpoint.record_function)
+        generator.node_listeners.append(checkpoint.record_node)
+        with redirect_stdout(io.StringIO()):
+            generator.run()
+        checkpoint.close()
+        with redirect_stdout(io.StringIO()):
+            index = CheckpointIndex(checkpoint_file, node_from_dict, SummaryResult)
+        main_py = os.path.join(self.test_dir, "pkg", "main.py")
+        for path in (main_py, os.path.join(self.test_dir, "pkg"), self.test_dir):
+            self.assertIsNone(index.reusable_node(path))
+        self.assertIsNotNone(index.reusable_function(main_py, "add", "def add(a, b):\n    return a + b"))
+
+    def test_failed_node_keeps_a_root_without_a_path_out(self):
+        checkpoint_file = os.path.join(self.test_dir, "checkpoint.ndjson")
+        checkpoint = Checkpoint(checkpoint_file)
+        root = node_from_dict({"name": "root", "type": "DIRECTORY", "path": "", "summaries": [],
+                               "final_summary": None, "children": [
+                                   {"name": "main.py", "type": "PYTHON_FILE", "path": "main.py", "children": [],
+                                    "summaries": [], "final_summary": {"name": "main.py", "summary": "",
+                                                                       "code": "", "metadata": {"error": "down"}}}]})
+        checkpoint.record_node(root.children[0])
+        checkpoint.record_node(root)
+        checkpoint.close()
+        with open(checkpoint_file) as f:
+            self.assertEqual(f.read(), "")
+
+    def test_checkpoint_counts_writes_from_many_threads(self):
+        checkpoint = Checkpoint(os.path.join(self.test_dir, "checkpoint.ndjson"), sync_every=7, sync_seconds=3600)
+        summary = SummaryResult(name="add", summary="adds", code="def add(a, b):\n    return a + b", metadata={})
+        threads = [threading.Thread(target=lambda: [checkpoint.record_function("main.py", summary)
+                                                    for _ in range(100)]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        checkpoint.close()
+        self.assertEqual(checkpoint._unsynced, 800 % 7)
+
+    def test_resume_appends_after_a_partial_line(self):
+        checkpoint_file = os.path.join(self.test_dir, "checkpoint.ndjson")
+        summary = SummaryResult(name="add", summary="adds", code="def add(a, b):\n    return a + b", metadata={})
+        checkpoint = Checkpoint(checkpoint_file)
+        checkpoint.record_function("main.py", summary)
+        checkpoint.close()
+        with open(checkpoint_file, "a") as f:
+            f.write('{"kind": "function", "path": "hel')  # the crash cut this record short
+        checkpoint = Checkpoint(checkpoint_file, resume=True)
+        checkpoint.record_function("other.py", summary)
+        checkpoint.close()
+        with redirect_stdout(io.StringIO()) as output:
+            index = CheckpointIndex(checkpoint_file, node_from_dict, SummaryResult)
+        self.assertNotIn("malformed", output.getvalue())
+        self.assertEqual(sorted(path for path, _, _ in index.functions), ["main.py", "other.py"])
+
+    def test_resume_in_api_mode(self):
+        server = LocalGitHubServer(self.test_dir)
+        self.addCleanup(server.close)
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+
+        def make_generator(reuse, backend):
+            generator = ContextAwareFunctionSummaryGenerator("", server.contents_url, max_workers=1, reuse=reuse,
+                                                             backend=backend, fetcher=GitHubFetcher(cache_dir))
+            generator.using_api = True
+            return generator
+
+        resumed = self.resume_after_crash(make_generator)
+        helpers = self.find(resumed.root, "helpers.py")
+        self.assertEqual(helpers.path, "/pkg/sub/helpers.py")
+        self.assertEqual([s.name for s in helpers.summaries], ["upper", "lower"])
+
+    def test_ignored_and_oversized_entries_are_skipped(self):
+        os.makedirs(os.path.join(self.test_dir, "venv", "lib"))
+        with open(os.path.join(self.test_dir, "venv", "lib", "vendored.py"), "w") as f:
+            f.write("def vendored():\n    pass\n")
+        fake = FakeOllama()
+        generator = self.run_generator(fake, ignore=IgnoreRules(max_functions=1))
+        self.assertIsNone(self.find(generator.root, "venv"))
+        self.assertIsNone(self.find(generator.root, "main.py"))
+        reasons = sorted(reason for _, reason in generator.skipped)
+        self.assertEqual(reasons, ["ignored", "too many functions", "too many functions"])
+        self.assertFalse(any("def " in prompt for prompt in fake.calls))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,13 @@
+import os
+
+
+def write_files(root, files):
+    '''
+    writes files, a dict of path relative to root -> content, creating the directories on the way; shared by the
+    tests that build a small repository
+    '''
+    for rel_path, content in files.items():
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
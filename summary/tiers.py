@@ -0,0 +1,139 @@
+from typing import List, Optional, Tuple
+from pydantic import BaseModel
+import ast
+
+# the ways a function summary can be produced, cheapest first
+TEMPLATE = "template"  # filled in from the shape of a trivial function, no model call
+DOCSTRING = "docstring"  # taken from a descriptive docstring, no model call
+SMALL = "small"  # short functions, answered by the small, fast model
+MAIN = "main"  # everything else, answered by the main model
+TIERS = [TEMPLATE, DOCSTRING, SMALL, MAIN]
+
+
+class FunctionFeatures(BaseModel):
+    name: str
+    args: List[str]  # without self and cls
+    docstring: Optional[str] = None
+    statements: int  # statements in the body, nested ones included, the docstring excluded
+    lines: int
+    shape: Optional[str] = None  # empty | getter | setter | init_assign | constant, for trivial bodies
+    attributes: List[str] = []  # the self attributes a getter, setter or init_assign touches
+    constant: Optional[str] = None  # source of the constant a constant function returns
+
+
+def function_features(func) -> FunctionFeatures:
+    '''
+    Computes the features tier selection looks at from the AST node of one function (FunctionDef or
+    AsyncFunctionDef); ast_extract calls it while it parses the file, so the function is not parsed again.
+    '''
+    docstring = ast.get_docstring(func)
+    body = func.body[1:] if docstring is not None else func.body
+    args = [arg.arg for arg in func.args.posonlyargs + func.args.args + func.args.kwonlyargs
+            if arg.arg not in ("self", "cls")]
+    features = FunctionFeatures(
+        name=func.name,
+        args=args,
+        docstring=docstring,
+        statements=sum(1 for stmt in body for node in ast.walk(stmt) if isinstance(node, ast.stmt)),
+        lines=func.end_lineno - func.lineno + 1,
+    )
+    features.shape, features.attributes, features.constant = _shape(func, body)
+    return features
+
+
+def _self_attribute(node) -> Optional[str]:
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "self":
+        return node.attr
+    return None
+
+
+def _shape(func, body) -> Tuple[Optional[str], List[str], Optional[str]]:
+    if all(isinstance(stmt, ast.Pass) or (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant)
+                                          and stmt.value.value is Ellipsis) for stmt in body):
+        return "empty", [], None
+    if len(body) == 1 and isinstance(body[0], ast.Return) and body[0].value is not None:
+        value = body[0].value
+        if _self_attribute(value):
+            return "getter", [_self_attribute(value)], None
+        if isinstance(value, ast.Constant):
+            return "constant", [], ast.unparse(value)
+    assigned = []
+    for stmt in body:
+        if isinstance(stmt, ast.Assign):
+            targets = stmt.targets
+        elif isinstance(stmt, ast.AnnAssign):
+            targets = [stmt.target]
+        else:
+            return None, [], None
+        if len(targets) != 1 or _self_attribute(targets[0]) is None:
+            return None, [], None
+        if stmt.value is not None and not isinstance(stmt.value, (ast.Name, ast.Constant)):
+            return None, [], None
+        assigned.append(_self_attribute(targets[0]))
+    if func.name == "__init__":
+        return "init_assign", assigned, None
+    if len(assigned) == 1:
+        return "setter", assigned, None
+    return None, [], None
+
+
+def _names(names: List[str]) -> str:
+    if len(names) <= 1:
+        return "".join(names)
+    return ", ".join(names[:-1]) + " and " + names[-1]
+
+
+class TierSelector:
+    '''
+    Chooses how a function is summarized from its AST features. Trivial bodies (pass, a getter, a setter, an
+    __init__ that only stores its arguments, returning a constant) get a template summary and a descriptive
+    docstring is used as it is, both without calling a model. Short functions go to the small model when there is
+    one and everything else to the main model.
+    '''
+    def __init__(self, min_docstring_words: int = 6, small_max_statements: int = 8, use_small: bool = False):
+        self.min_docstring_words = min_docstring_words
+        self.small_max_statements = small_max_statements
+        self.use_small = use_small
+
+    def select(self, features: Optional[FunctionFeatures]) -> Tuple[str, Optional[str]]:
+        '''
+        returns the tier for a function with features (FunctionInfo.features) and, for the tiers that need no model,
+        its summary; functions without features go to the main model
+        '''
+        if features is None:
+            return MAIN, None
+        template = self.template_summary(features)
+        docstring = self.docstring_summary(features)
+        # a stub's docstring says more about it than the template does
+        if docstring is not None and (template is None or features.shape == "empty"):
+            return DOCSTRING, docstring
+        if template is not None:
+            return TEMPLATE, template
+        if self.use_small and features.statements <= self.small_max_statements:
+            return SMALL, None
+        return MAIN, None
+
+    def template_summary(self, features: FunctionFeatures) -> Optional[str]:
+        name = features.name
+        if features.shape == "empty":
+            return f"The function {name} is a placeholder that does nothing."
+        if features.shape == "getter":
+            return f"The function {name} returns the {features.attributes[0]} attribute of the object."
+        if features.shape == "constant":
+            return f"The function {name} always returns {features.constant}."
+        if features.shape == "setter":
+            return f"The function {name} sets the {features.attributes[0]} attribute of the object."
+        if features.shape == "init_assign":
+            if not features.attributes:
+                return "Initializes the object without setting any attributes."
+            return f"Initializes the object and stores {_names(features.attributes)} as its attributes."
+        return None
+
+    def docstring_summary(self, features: FunctionFeatures) -> Optional[str]:
+        if not features.docstring:
+            return None
+        # the first paragraph is the description; parameter and return sections follow it
+        paragraph = " ".join(features.docstring.strip().split("\n\n")[0].split())
+        if len(paragraph.split()) < self.min_docstring_words:
+            return None
+        return paragraph
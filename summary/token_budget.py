@@ -0,0 +1,34 @@
+from typing import Callable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# rough number of characters per token for llama style tokenizers on source code and english
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    '''
+    cheap estimate of the number of tokens in text, good enough to keep prompts inside a budget
+    '''
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def pack(items: List[T], budget: int, size: Callable[[T], int], max_items: Optional[int] = None) -> List[List[T]]:
+    '''
+    Greedily packs consecutive items into groups whose total size stays within budget, keeping their order.
+    An item that is larger than the budget on its own is put in a group by itself.
+    '''
+    groups: List[List[T]] = []
+    current: List[T] = []
+    used = 0
+    for item in items:
+        item_size = size(item)
+        full = max_items is not None and len(current) >= max_items
+        if current and (used + item_size > budget or full):
+            groups.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += item_size
+    if current:
+        groups.append(current)
+    return groups
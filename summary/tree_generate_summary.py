@@ -1,37 +1,111 @@
-from typing import List, Dict, Optional
-import ollama
-from pydantic import BaseModel
+from typing import Callable, List, Dict, Optional, Tuple, Union
+from pydantic import BaseModel, ConfigDict, field_serializer
 import os 
-import requests
+import sys
+import weakref
 import json 
-import base64
 from enum import Flag, auto
+from concurrent.futures import Future
+import argparse
+import threading
+import time
+
+from summary.scheduler import SummaryScheduler
+from summary.summary_cache import SummaryCache
+from summary.run_stats import RunStats
+from summary.token_budget import estimate_tokens, pack
+from summary.ndjson_writer import DocumentPublisher, NDJSONTreeWriter, rebuild_tree
+from summary.checkpoint import Checkpoint, CheckpointIndex
+from summary.incremental import IncrementalIndex, diff_manifests, git_changed_paths, load_manifest, save_manifest
+from summary.repo_scanner import RepoManifest, RepoScanner
+from summary.ignore_rules import IgnoreRules, summarize_skipped
+from summary.ast_extract import ASTExtractor
+from summary.llm_backend import LLMBackend, OllamaBackend
+from summary.endpoint_pool import EndpointPool
+from summary.github_fetch import GITHUB_API, GitHubFetcher
+from summary.aggregation import MapReduceAggregator, split_text
+from summary.tiers import DOCSTRING, MAIN, SMALL, TEMPLATE, FunctionFeatures, TierSelector
+from summary.session import FileSession, file_preamble
+from summary.priority import PriorityRanker, git_activity
+from summary.instrumentation import StageTimer, prometheus_metrics, run_report, write_report
+from summary.code_ref import SOURCES, CodeRef, SourceFile, code_text, is_stale
+from summary.call_graph import CallGraphBuilder, function_id
+from summary.graph_store import GraphStore
+from summary.import_graph import ModuleIndex
 
 base_url = "mathsearch"
 content_base_url = "mathsearch"
 class SummaryResult(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     name: str
     summary: str
-    code: str
+    code: Union[str, CodeRef]  # a CodeRef into the local checkout in the tree, always text once serialized
     metadata: dict
     type: Optional[str] = None  # Add type field
 
+    # code whose file changed on disk after it was summarized is serialized empty, with "stale": true in metadata,
+    # rather than as new code next to a summary of the old one
+    @field_serializer("code")
+    def serialize_code(self, code: Union[str, CodeRef]) -> str:
+        return "" if is_stale(code) else code_text(code)
+
+    @field_serializer("metadata")
+    def serialize_metadata(self, metadata: dict) -> dict:
+        return dict(metadata, stale=True) if is_stale(self.code) else metadata
+
 class ItemTypes(Flag): 
     PYTHON_FILE = auto()
     DIRECTORY = auto()
     README_FILE = auto()
     OTHER = auto()
 class Node: 
+    '''
+    A file or directory of the summary tree. Large repositories have millions of these, so nodes are slotted, the
+    parent is a weak reference (a tree held only through a subtree is freed), and the path is kept as the interned
+    directory prefix shared with the siblings plus the interned name. Code is kept as CodeRefs where possible.
+    Children are added with add_child, which records their position among the parent's children in index.
+    '''
+    __slots__ = ("name", "type", "_prefix", "_path", "summaries", "final_summary", "children", "_parent", "index",
+                 "__weakref__")
+
     def __init__(self, name: str, node_type: ItemTypes, path: str, summaries: List[SummaryResult] = None, 
                  final_summary: SummaryResult = None, children: List['Node'] = None, 
                  parent: Optional['Node'] = None): 
-        self.name = name
+        self.name = sys.intern(name)
         self.type = node_type
         self.path = path
         self.summaries = summaries or []
         self.final_summary = final_summary
         self.children = children or []
+        for index, child in enumerate(self.children):
+            child.index = index
         self.parent = parent
+        self.index = 0
+
+    @property
+    def path(self) -> str:
+        return self._path if self._prefix is None else self._prefix + self.name
+
+    @path.setter
+    def path(self, path: str) -> None:
+        if self.name and path.endswith(self.name) and len(path) > len(self.name):
+            self._prefix, self._path = sys.intern(path[:-len(self.name)]), None
+        else:
+            self._prefix, self._path = None, path
+
+    @property
+    def parent(self) -> Optional['Node']:
+        return self._parent() if self._parent is not None else None
+
+    @parent.setter
+    def parent(self, parent: Optional['Node']) -> None:
+        self._parent = weakref.ref(parent) if parent is not None else None
+
+    def add_child(self, child: 'Node') -> None:
+        child.parent = self
+        child.index = len(self.children)
+        self.children.append(child)
 
 
 
@@ -43,13 +117,68 @@ class ContextAwareFunctionSummaryGenerator:
     To make the summary generation of each function context aware, we do a depth first search on the file system tree and appending the context for each 
     step of the traversal. The run function runs the whole module and stores the results in self.summaries. 
     '''
-    def __init__(self, base_url, content_base_url):
+    def __init__(self, base_url, content_base_url, max_workers: int = 4, cache: Optional[SummaryCache] = None,
+                 reuse: Optional[IncrementalIndex] = None, batch_token_budget: Optional[int] = None,
+                 max_batch_size: int = 8, manifest: Optional[RepoManifest] = None,
+                 ignore: Optional[IgnoreRules] = None, extractor: Optional[ASTExtractor] = None,
+                 backend: Optional[LLMBackend] = None, fetcher: Optional[GitHubFetcher] = None,
+                 prompt_token_budget: int = 1500, small_backend: Optional[LLMBackend] = None,
+                 tiers: Optional[TierSelector] = None, deduplicate: bool = True, rename_identifiers: bool = False,
+                 session_mode: bool = False, priority_mode: bool = False, call_graph_mode: bool = False):
         self.using_api = False
+        self.fetcher = fetcher  # pooled and cached github requests in api mode, created on first use
+        self.backend = backend if backend is not None else OllamaBackend("llama3.2:latest")
+        self.small_backend = small_backend  # a smaller, faster model for short functions
+        # decides which functions are summarized by a template, their docstring, the small or the main model
+        self.tiers = tiers if tiers is not None else TierSelector(use_small=small_backend is not None)
+        self.max_workers = max_workers  # number of summaries generated concurrently
+        self.cache = cache  # summaries of unchanged code are reused from here instead of calling the model
+        self.reuse = reuse  # unchanged nodes of a previous run are taken from here verbatim
+        self.manifest = manifest  # scan of the local checkout, made by run() when not given
+        self.ignore = ignore if ignore is not None else IgnoreRules()  # vendored and generated code to leave out
+        self.skipped: List[Tuple[str, str]] = []  # (path, reason) of everything left out of the tree
+        self.extractor = extractor if extractor is not None else ASTExtractor()  # parses each python file once
+        # when set, small functions of the same file are summarized together in prompts of up to this many tokens
+        self.batch_token_budget = batch_token_budget
+        self.max_batch_size = max_batch_size
+        self.stats = RunStats()
+        self.timer = StageTimer()  # wall time per stage and per node, for the run report
+        self.wall_seconds = 0.0
+        # functions with the same normalized AST are summarized once and the summary is copied to the others
+        self.deduplicate = deduplicate
+        self.rename_identifiers = rename_identifiers  # also treat copies that only differ in local names as duplicates
+        # dedup_key -> ("path::name" of the first copy, its summary); only the text is kept, not the result
+        self.fingerprints: Dict[str, Tuple[str, str]] = {}
+        # dedup_key -> ("path::name" of the first copy, future of fingerprints[key]) until that is set
+        self._summarizing: Dict[str, Tuple[str, Future]] = {}
+        self.duplicate_clusters: Dict[str, List[str]] = {}  # dedup_key -> "path::name" of every copy
+        self._fingerprint_lock = threading.Lock()
+        # the functions of a file are summarized in a FileSession that shares the path, docstring and imports of the file
+        self.session_mode = session_mode
+        # the most imported, largest and most recently changed files are summarized first, see PriorityRanker
+        self.priority_mode = priority_mode
+        self.priorities: Dict[str, float] = {}  # normalized path -> score, filled in by run() in priority mode
+        # with call_graph_mode the calls between local functions are resolved statically before summarizing and
+        # every function summary records its callers and callees; needs a local checkout
+        self.call_graph_mode = call_graph_mode
+        self.call_graph: Optional[GraphStore] = None
+        # function code and combined child summaries larger than this many tokens are summarized in parts first
+        self.aggregator = MapReduceAggregator(prompt_token_budget, max_workers, stats=self.stats)
+        self.node_listeners: List[Callable[[Node], None]] = []  # called with every node once it is finished
+        # called with the file path and summary of every newly summarized function
+        self.function_listeners: List[Callable[[str, SummaryResult], None]] = []
+        self.release_finished_nodes = False  # set when listeners stream the output, see node_finished
         self.base_url = base_url
         self.function_prompt = "create a short natural language summary of the function"
+        self.batch_function_prompt = (
+            "create a short natural language summary of each of the following functions. "
+            "Respond with only a JSON object that maps each function name, exactly as given after ###, to its summary."
+        )
         self.directory_prompt = "create a short natural language summary of the directory"
         self.file_prompt = "create a short natural language summary of the file"
         self.context_prompt = "create a short natural language summary of the context"
+        self.chunk_prompt = "create a short natural language summary of the following summaries, keeping the names they mention"
+        self.segment_prompt = "create a short natural language summary of this part of a longer function"
         self.content_base_url = content_base_url
         self.root: Node 
     def request_file_content(self, file_path):
@@ -57,15 +186,7 @@ class ContextAwareFunctionSummaryGenerator:
         requests file content from the github api path self.content_base_url + file_path and returns the file content as a string
         '''
         try:
-            full_path = self.content_base_url + file_path
-            resp = requests.get(full_path)
-            if resp.status_code == requests.codes.ok:
-                resp = resp.json()
-                byte_content = base64.b64decode(resp["content"])
-                return byte_content.decode("utf-8")
-            else:
-                print("Content was not found.")
-                return "Content Not Found"
+            return self.get_fetcher().get_file(self.content_base_url + file_path)
         except Exception as e:
             print(f"Error requesting file {file_path}: {e}")
             return "Content Not Found"
@@ -74,6 +195,8 @@ class ContextAwareFunctionSummaryGenerator:
         '''
         reads file content from the local file system and returns the file content as a string
         '''
+        if self.manifest is not None:
+            return self.manifest.read_text(file_path)
         try:
             with open(file_path, "r") as f:
                 return f.read()
@@ -95,20 +218,35 @@ class ContextAwareFunctionSummaryGenerator:
                 
     def extract_context_from_function_summaries(self, summaries: List[SummaryResult]) -> str: 
         # Aggregate all function summaries for the LLM to generate a file summary
-        context = "Here are summaries of all functions in this file:\n\n"
-        for summary in summaries:
-            context += f"Function {summary.name}:\n{summary.summary}\n\n"
-        return context
+        parts = [f"Function {summary.name}:\n{summary.summary}\n\n" for summary in summaries]
+        return self.fit_context("Here are summaries of all functions in this file:\n\n",
+                                "Here are summaries of the groups of functions in this file:\n\n", parts, "file")
 
     def extract_context_from_directory_summaries(self, summaries: List[SummaryResult]) -> str:
         # Aggregate all child summaries for the LLM to generate a directory summary
-        context = "Here are summaries of all items in this directory:\n\n"
+        parts = []
         for summary in summaries:
             if summary.type == "DIRECTORY":
-                context += f"Directory {summary.name}:\n{summary.summary}\n\n"
+                parts.append(f"Directory {summary.name}:\n{summary.summary}\n\n")
             else:
-                context += f"File {summary.name}:\n{summary.summary}\n\n"
-        return context
+                parts.append(f"File {summary.name}:\n{summary.summary}\n\n")
+        return self.fit_context("Here are summaries of all items in this directory:\n\n",
+                                "Here are summaries of the groups of items in this directory:\n\n", parts, "directory")
+
+    def fit_context(self, header: str, reduced_header: str, parts: List[str], kind: str) -> str:
+        '''
+        Joins parts under header, or, when they do not fit in one prompt, reduces them to partial summaries that do
+        and joins those under reduced_header
+        '''
+        context = header + "".join(parts)
+        if self.aggregator.fits(context):
+            return context
+        self.stats.incr(f"map-reduced {kind} prompts")
+        with self.timer.stage("aggregate"):
+            partials = self.aggregator.reduce(
+                parts, lambda chunk: self.generate(self.chunk_prompt + "\n" + chunk, kind=kind) + "\n\n"
+            )
+        return reduced_header + "".join(partials)
 
     def item_type(self, item) -> ItemTypes:
         if self.using_api:
@@ -130,16 +268,59 @@ class ContextAwareFunctionSummaryGenerator:
                 return ItemTypes.PYTHON_FILE
             elif item_name.lower().startswith("readme"):
                 return ItemTypes.README_FILE
-            elif os.path.isdir(item):  # For directory check, use the full path
+            elif self.is_local_dir(item):  # For directory check, use the full path
                 return ItemTypes.DIRECTORY
             else:
                 return ItemTypes.OTHER
 
+    def api_skip_reason(self, item, item_path: str, item_type: ItemTypes) -> Optional[str]:
+        rel_path = item_path[len(self.base_url):].lstrip("/")
+        return self.ignore.skip_reason(rel_path, item_type == ItemTypes.DIRECTORY, item.get("size", 0))
+
+    def prefetch_files(self, path: str, contents) -> None:
+        '''
+        starts downloading the files of an api directory listing that the traversal is going to read, so they are
+        fetched concurrently instead of one request at a time
+        '''
+        urls = []
+        for item in contents:
+            item_path = self.child_path(path, self.item_name(item))
+            item_type = self.item_type(item)
+            if item_type not in (ItemTypes.PYTHON_FILE, ItemTypes.README_FILE):
+                continue
+            if self.api_skip_reason(item, item_path, item_type) is not None:
+                continue
+            if item_type == ItemTypes.PYTHON_FILE and self.reuse is not None and self.reuse.reusable_node(item_path):
+                continue
+            urls.append(self.content_base_url + item_path)
+        self.get_fetcher().prefetch(urls)
+
+    def get_fetcher(self) -> GitHubFetcher:
+        if self.fetcher is None:
+            self.fetcher = GitHubFetcher()
+        return self.fetcher
+
+    def skip(self, path: str, reason: str) -> None:
+        print(f"Skipping {path}: {reason}")
+        self.skipped.append((path, reason))
+        self.stats.incr(f"skipped {reason}")
+
+    def is_local_dir(self, path: str) -> bool:
+        if self.manifest is not None:
+            return self.manifest.is_dir(path)
+        return os.path.isdir(path)
+
     def item_name(self, item) -> str:
         if self.using_api:
             return item["name"]
         else:
             return item
+
+    def child_path(self, path: str, name: str) -> str:
+        if self.using_api:
+            # api paths are appended to self.content_base_url, so they always need a separator
+            return f"{path}/{name}"
+        return os.path.join(path, name)
         
     
 
@@ -148,45 +329,71 @@ class ContextAwareFunctionSummaryGenerator:
         file_content should be a string of valid python code
         Returns a list of dictionaries containing function name and code
         '''
-        import ast
-
-        funcs = []
-        try:
-            tree = ast.parse(file_content)
-            lines = file_content.splitlines()
-
-            for node in ast.walk(tree):
-                if isinstance(node, ast.FunctionDef):
-                    funcs.append({
-                        "name": node.name,  # Get the function name
-                        "code": "\n".join(lines[node.lineno - 1 : node.end_lineno])
-                    })
-            return funcs
-        except Exception as e:
-            print(f"Error parsing file: {e}")
+        parsed = self.extractor.extract(file_content)
+        if parsed.error is not None:
+            print(f"Error parsing file: {parsed.error}")
             return []
+        return [
+            {
+                "name": func.name,
+                "code": func.code,
+                "qualname": func.qualname,
+                "lineno": func.lineno,
+                "end_lineno": func.end_lineno,
+                "features": func.features,
+                "plain_fingerprint": func.fingerprint,
+                "renamed_fingerprint": func.renamed_fingerprint,
+            }
+            for func in parsed.functions
+        ]
 
 
 
-  
-    def summarize_function(self, target_code: str, name: str) -> SummaryResult:
+    def generate(self, prompt: str, kind: str = "default", tier: Optional[str] = None,
+                 session: Optional[FileSession] = None) -> str:
+        '''
+        Generates a response for prompt, answering from self.cache when the same model was asked the same prompt before.
+        Function prompts of the small tier go to self.small_backend; the time model calls take is recorded per tier.
+        With a session the prompt is answered in the context of its file.
+        '''
+        backend = self.small_backend if tier == SMALL and self.small_backend is not None else self.backend
+        key = None
+        if self.cache is not None:
+            key = SummaryCache.make_key(backend.model, prompt if session is None else session.preamble + prompt)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        start = time.perf_counter()
+        with self.timer.stage("llm"):
+            if session is not None:
+                summary = session.generate(backend, prompt, kind).strip()
+            else:
+                summary = backend.generate(prompt, kind=kind).strip()
+        if tier is not None and kind == "function":  # batches would skew the time of a call per function
+            self.stats.incr(f"{tier} tier model calls")
+            self.stats.incr(f"{tier} tier model seconds", time.perf_counter() - start)
+        if self.cache is not None:
+            self.cache.put(key, summary)
+        return summary
+
+    def summarize_function(self, target_code: str, name: str, session: Optional[FileSession] = None,
+                           features: Optional[FunctionFeatures] = None) -> SummaryResult:
         try:
             print(f"Generating summary for function: {name}")
             
-            response = ollama.generate(
-                model="llama3.2:latest",
-                prompt= self.function_prompt + "\n" + target_code,
-                stream = False,
-                options={'num_predict': -1, 'keep_alive': 0},
-            )
-            
-            summary = response['response'].strip()
+            tier, summary = self.tiers.select(features)
+            self.stats.incr(f"{tier} tier functions")
+            if summary is None and self.aggregator.fits(self.function_prompt + "\n" + target_code):
+                summary = self.generate(self.function_prompt + "\n" + target_code, kind="function", tier=tier,
+                                        session=session)
+            elif summary is None:
+                summary = self.summarize_long_function(target_code, name, session)
             
             return SummaryResult(
                 name=name,
                 summary=summary,
                 code=target_code,
-                metadata={}
+                metadata={"tier": tier}
             )
         except Exception as e:
             print(f"Error generating summary: {e}")
@@ -196,15 +403,98 @@ class ContextAwareFunctionSummaryGenerator:
                 code=target_code,
                 metadata={"error": str(e)}
             )
+    def summarize_long_function(self, target_code: str, name: str, session: Optional[FileSession] = None) -> str:
+        '''
+        Summarizes a function that does not fit in one prompt from summaries of its consecutive segments
+        '''
+        self.stats.incr("segmented functions")
+        segments = split_text(target_code, self.aggregator.budget - estimate_tokens(self.segment_prompt))
+        partials = self.aggregator.map(
+            lambda segment: self.generate(f"{self.segment_prompt} {name}\n{segment}", kind="function"), segments
+        )
+        parts = [f"Part {i + 1}:\n{partial}\n\n" for i, partial in enumerate(partials)]
+        context = self.fit_context(f"The function {name} is too long to show, here are summaries of its consecutive parts:\n\n",
+                                   f"The function {name} is too long to show, here are summaries of its parts:\n\n",
+                                   parts, "function")
+        return self.generate(self.function_prompt + "\n" + context, kind="function", session=session)
+
+    def function_batches(self, functions: List[Dict[str, str]]) -> List[List[Dict[str, str]]]:
+        '''
+        Groups consecutive functions into batches that fit self.batch_token_budget. Without a budget every function
+        is its own batch.
+        '''
+        if not self.batch_token_budget:
+            return [[func] for func in functions]
+        return pack(functions, self.batch_token_budget, lambda func: estimate_tokens(func["code"]), self.max_batch_size)
+
+    def summarize_function_batch(self, batch: List[Dict[str, str]],
+                                 session: Optional[FileSession] = None) -> List[SummaryResult]:
+        '''
+        Summarizes several functions with one generation that answers with a JSON object keyed by function name.
+        Functions missing from the answer, or all of them if it can not be parsed, fall back to summarize_function.
+        Functions that need no model (see TierSelector) are left out of the prompt.
+        '''
+        cheap = {}
+        batch_tier = SMALL
+        for i, func in enumerate(batch):
+            tier, summary = self.tiers.select(func.get("features"))
+            if tier == MAIN:
+                batch_tier = MAIN  # the small model only answers batches made of small functions
+            if summary is not None:
+                self.stats.incr(f"{tier} tier functions")
+                cheap[i] = SummaryResult(name=func["name"], summary=summary, code=func["code"], metadata={"tier": tier})
+        if cheap:
+            rest = self.summarize_function_batch([func for i, func in enumerate(batch) if i not in cheap], session)
+            return [cheap[i] if i in cheap else rest.pop(0) for i in range(len(batch))]
+
+        if not batch:
+            return []
+        if len(batch) == 1:
+            return [self.summarize_function(batch[0]["code"], batch[0]["name"], session, batch[0].get("features"))]
+
+        # functions can share a name (e.g. __init__ of two classes), so label duplicates to keep the keys unique
+        labels = []
+        for func in batch:
+            label = func["name"]
+            while label in labels:
+                label = f"{func['name']}#{len(labels)}"
+            labels.append(label)
+
+        print(f"Generating summaries for a batch of {len(batch)} functions: {labels}")
+        prompt = self.batch_function_prompt + "\n\n" + "\n\n".join(
+            f"### {label}\n{func['code']}" for label, func in zip(labels, batch)
+        )
+        try:
+            parsed = parse_json_object(self.generate(prompt, kind="batch", tier=batch_tier, session=session))
+        except Exception as e:
+            print(f"Error generating batch summary: {e}")
+            parsed = {}
+
+        self.stats.incr("batched_prompts")
+        results = []
+        fallbacks = 0
+        for label, func in zip(labels, batch):
+            summary = parsed.get(label)
+            if isinstance(summary, str) and summary.strip():
+                self.stats.incr("batched_functions")
+                self.stats.incr(f"{batch_tier} tier functions")
+                results.append(SummaryResult(
+                    name=func["name"],
+                    summary=summary.strip(),
+                    code=func["code"],
+                    metadata={"batch_size": len(batch), "tier": batch_tier}
+                ))
+            else:
+                fallbacks += 1
+                results.append(self.summarize_function(func["code"], func["name"], session, func.get("features")))
+        # one call answered the batch instead of one call per function; every fallback costs an extra call
+        self.stats.incr("batch_fallbacks", fallbacks)
+        self.stats.incr("model_calls_saved", len(batch) - 1 - fallbacks)
+        return results
+
     def summarize_file(self, target_summaries: str, name: str) -> SummaryResult:
         try:
-            response = ollama.generate(
-                model="llama3.2:latest",
-                prompt= self.file_prompt + target_summaries,
-                stream = False,
-                options={'num_predict': -1, 'keep_alive': 0},
-            )
-            summary = response['response'].strip()
+            summary = self.generate(self.file_prompt + target_summaries, kind="file")
             return SummaryResult(
                 name=name,
                 summary=summary,
@@ -221,13 +511,7 @@ class ContextAwareFunctionSummaryGenerator:
             )
     def summarize_directory(self, target_summaries: str, name: str) -> SummaryResult:
         try:
-            response = ollama.generate(
-                model="llama3.2:latest",
-                prompt= self.directory_prompt + target_summaries,
-                stream = False,
-                options={'num_predict': -1, 'keep_alive': 0},
-            )
-            summary = response['response'].strip()
+            summary = self.generate(self.directory_prompt + target_summaries, kind="directory")
             return SummaryResult(
                 name=name,
                 summary=summary,
@@ -244,30 +528,25 @@ class ContextAwareFunctionSummaryGenerator:
             )
     def make_context(self, context: str, summary: str) -> str:
         try:
-            response = ollama.generate(
-                model="llama3.2:latest",
-                prompt= self.context_prompt + context + summary,
-                stream = False,
-                options={'num_predict': -1, 'keep_alive': 0},
-            )
-            return response['response'].strip()
+            return self.generate(self.context_prompt + context + summary, kind="context")
         except Exception as e:
             print(f"Error generating context: {e}")
             return ""
         
     def get_directory_content(self, path):
         if self.using_api:
-            full_path = self.content_base_url + path
-            resp = requests.get(full_path)
-            if resp.status_code == requests.codes.ok:
-                return resp.json()
-            else:
-                print("Content was not found.")
+            try:
+                return self.get_fetcher().get_json(self.content_base_url + path)
+            except Exception as e:
+                print(f"Error listing directory {path}: {e}")
                 return {}
         else: 
             try:
                 print(f"Listing directory: {path}")
-                items = os.listdir(path)
+                if self.manifest is not None:
+                    items = [entry.name for entry in self.manifest.children(path)]
+                else:
+                    items = os.listdir(path)
                 print(f"Found items: {items}")
                 return items
             except Exception as e:
@@ -283,16 +562,30 @@ class ContextAwareFunctionSummaryGenerator:
         functions = self.parse(content)
         print("Functions parsed:", len(functions))
         results = []
-        for func in functions:
-            summary_result = self.summarize_function(func["code"], func["name"])
-            results.append(summary_result)
-            print(f"summarized function {func['name']}: {summary_result.summary}")
-            print("-" * 20)
+        for batch in self.function_batches(functions):
+            for summary_result in self.summarize_function_batch(batch):
+                results.append(summary_result)
+                print(f"summarized function {summary_result.name}: {summary_result.summary}")
+                print("-" * 20)
         return results
 
     def process_dir(self, node: Node, path: str):
         '''
-        Processes a directory and adds its contents to the tree
+        Processes a directory and adds its contents to the tree. The summaries are generated concurrently by a
+        SummaryScheduler with self.max_workers workers; this call returns once the summary of node is done.
+        '''
+        # in priority mode nothing runs until the whole tree is queued, so the queue is ordered as a whole
+        with SummaryScheduler(self.max_workers, paused=self.priority_mode, stats=self.stats) as scheduler:
+            future = self.schedule_dir(scheduler, node, path)
+            scheduler.resume()
+            future.result()
+        return node
+
+    def schedule_dir(self, scheduler: SummaryScheduler, node: Node, path: str) -> Future:
+        '''
+        Walks a directory, adds its contents to the tree and schedules the summary jobs for it. Function summaries
+        have no dependencies, a file summary waits on the summaries of its functions and the directory summary
+        waits on all of its children. Returns the future of the directory summary job.
         '''
         print(f"\nProcessing directory: {path}")
         contents = self.get_directory_content(path)
@@ -300,15 +593,36 @@ class ContextAwareFunctionSummaryGenerator:
         
         if not contents:
             print(f"No contents found in directory: {path}")
-            return
+            self.node_finished(node)
+            return scheduler.completed(node)
+
+        if self.using_api:
+            self.prefetch_files(path, contents)
 
+        child_futures = []
         for item in contents: 
             print(f"\nProcessing item: {item}")
-            item_path = os.path.join(path, item)
-            item_type = self.item_type(item_path)  # Pass the full path instead of just the item name
-            print(f"Item type: {item_type}")
             item_name = self.item_name(item)
+            item_path = self.child_path(path, item_name)
+            # the api describes items itself, locally the full path is needed to check for directories
+            item_type = self.item_type(item if self.using_api else item_path)
+            print(f"Item type: {item_type}")
+            if self.using_api:
+                # local checkouts are filtered when they are scanned, api listings are filtered here
+                reason = self.api_skip_reason(item, item_path, item_type)
+                if reason is not None:
+                    self.skip(item_path, reason)
+                    continue
             
+            previous = self.reuse.reusable_node(item_path) if self.reuse is not None else None
+            if previous is not None and previous.type == item_type and item_type != ItemTypes.README_FILE:
+                print(f"Reusing unchanged summary for: {item_path}")
+                node.add_child(previous)
+                self.annotate_reused_calls(previous)
+                self.subtree_finished(previous)
+                child_futures.append(scheduler.completed(previous))
+                continue
+
             child_node = Node(
                 name=item_name,
                 node_type=item_type,
@@ -324,15 +638,15 @@ class ContextAwareFunctionSummaryGenerator:
                 file_content = self.get_file_content(item_path)
                 if file_content is not None:
                     print("File content loaded successfully")
-                    summaries = self.process_python_file(file_content)
-                    child_node.summaries = summaries
-                    # Get function summaries for file summary
-                    final_summary_target = self.extract_context_from_function_summaries(summaries)
-                    final_summary = self.summarize_file(final_summary_target, item_name)
-                    final_summary.code = file_content  # Store raw file content
-                    final_summary.type = "PYTHON_FILE"  # Set type
-                    child_node.final_summary = final_summary
-                    node.children.append(child_node)
+                    print("Parsing functions...")
+                    functions = self.parse(file_content)
+                    print("Functions parsed:", len(functions))
+                    if self.ignore.too_many_functions(len(functions)):
+                        # almost always generated code, which is not worth one model call per function
+                        self.skip(item_path, "too many functions")
+                        continue
+                    node.add_child(child_node)
+                    child_futures.append(self.schedule_python_file(scheduler, child_node, file_content, functions))
                 else:
                     print(f"Failed to load file content for: {item_path}")
             elif item_type == ItemTypes.README_FILE:
@@ -340,16 +654,260 @@ class ContextAwareFunctionSummaryGenerator:
                 file_content = self.get_file_content(item_path)
                 if file_content is not None:
                     print("File content loaded successfully")
-                    final_summary = self.summarize_file(file_content, item_name)
-                    final_summary.code = file_content  # Store raw file content
-                    final_summary.type = "README_FILE"  # Set type
-                    child_node.final_summary = final_summary
-                    child_node.summaries = [child_node.final_summary]
+                    child_futures.append(scheduler.schedule(self.finish_readme_file, child_node, file_content,
+                                                            priority=self.priority(path)))
             elif item_type == ItemTypes.DIRECTORY:
                 print(f"Processing directory: {item_path}")
-                self.process_dir(child_node, item_path)
-                node.children.append(child_node)
+                node.add_child(child_node)
+                child_futures.append(self.schedule_dir(scheduler, child_node, item_path))
+
+        return scheduler.schedule(self.finish_directory, node, deps=child_futures, priority=self.priority(path))
+
+    def schedule_python_file(self, scheduler: SummaryScheduler, node: Node, content: str,
+                             functions: List[Dict[str, str]]) -> Future:
+        '''
+        Schedules one job per batch of functions in the file and a file summary job that runs once they are all done.
+        Every function job resolves to a list of summaries, in the order the functions appear in the file.
+        In session mode a job that starts the FileSession of the file runs first and the batches wait on it.
+        '''
+        steps = []
+        for func in functions:
+            previous = None
+            if self.reuse is not None:
+                previous = self.reuse.reusable_function(node.path, func["name"], func["code"])
+            original = self.register_fingerprint(node, func) if previous is None else None
+            steps.append((func, previous, original))
+        priority = self.priority(node.path)
+        session = None
+        if self.session_mode and any(previous is None and original is None for _, previous, original in steps):
+            session = scheduler.schedule(self.start_session, node, content, priority=priority)
+
+        function_futures = []
+        pending = []
+        for func, previous, original in steps:
+            if previous is None and original is None:
+                pending.append(func)
+                continue
+            function_futures.extend(self.schedule_function_batches(scheduler, node, pending, session))
+            pending = []
+            if previous is not None:
+                self.annotate_calls(node.path, func["qualname"], previous)
+                function_futures.append(scheduler.completed([previous]))
+            else:
+                function_futures.append(scheduler.schedule(self.copy_duplicate, node, func, original,
+                                                           deps=[original], priority=priority))
+        function_futures.extend(self.schedule_function_batches(scheduler, node, pending, session))
+        deps = function_futures + ([session] if session is not None else [])
+        return scheduler.schedule(self.finish_python_file, node, content, function_futures, session, deps=deps,
+                                  priority=priority)
+
+    def schedule_function_batches(self, scheduler: SummaryScheduler, node: Node, functions: List[Dict[str, str]],
+                                  session: Optional[Future] = None) -> List[Future]:
+        return [
+            scheduler.schedule(self.summarize_functions_of_file, node, batch, session,
+                               deps=[session] if session is not None else None, priority=self.priority(node.path))
+            for batch in self.function_batches(functions)
+        ]
+
+    def priority(self, path: str) -> float:
+        return self.priorities.get(os.path.normpath(path), 0.0)
+
+    def rank_files(self) -> None:
+        '''
+        scores every python file and directory of the manifest for priority mode
+        '''
+        self.priorities = PriorityRanker().rank(self.manifest, self.extractor, git_activity(self.base_url))
+        files = sorted((entry.path for entry in self.manifest.python_files()), key=self.priority, reverse=True)
+        print(f"Summarizing the most central files first: {files[:5]}")
+
+    def build_call_graph(self) -> None:
+        '''
+        resolves the calls between the functions of every python file of the manifest, see call_graph
+        '''
+        builder = CallGraphBuilder(ModuleIndex.from_manifest(self.manifest), self.extractor.parsed_manifest(self.manifest))
+        self.call_graph = builder.build()
+        self.stats.incr("resolved calls", builder.resolved)
+        self.stats.incr("unresolved calls", builder.unresolved)
+        print(f"Call graph: {len(self.call_graph)} functions, {self.call_graph.edge_count()} call edges")
+
+    def annotate_calls(self, path: str, qualname: str, result: SummaryResult) -> None:
+        '''
+        records the id of a function and the ids of the local functions it calls and that call it in its metadata
+        '''
+        if self.call_graph is None:
+            return
+        function = function_id(path, qualname)
+        result.metadata["function"] = function
+        result.metadata["calls"] = self.call_graph.uses(function)
+        result.metadata["called_by"] = self.call_graph.used_by(function)
+
+    def annotate_reused_calls(self, node: Node) -> None:
+        '''
+        refreshes the callers and callees of the functions of a subtree reused from a previous run, which may have
+        changed with the files that did change
+        '''
+        if self.call_graph is None:
+            return
+        for child in node.children:
+            self.annotate_reused_calls(child)
+        for summary in node.summaries:
+            function = summary.metadata.get("function")
+            if function is not None:
+                path, qualname = function.split("::", 1)
+                self.annotate_calls(path, qualname, summary)
+
+    def start_session(self, node: Node, content: str) -> FileSession:
+        '''
+        encodes the preamble of a python file once for all of its function prompts
+        '''
+        session = FileSession(self.backend, file_preamble(node.path, self.extractor.extract(content))).start()
+        self.stats.incr("file sessions")
+        if session.context is not None:
+            self.stats.incr("file session preamble tokens", session.preamble_eval_count)
+        return session
+
+    def summarize_functions_of_file(self, node: Node, batch: List[Dict[str, str]],
+                                    session: Optional[Future] = None) -> List[SummaryResult]:
+        start = time.perf_counter()
+        try:
+            results = self.summarize_function_batch(batch, session.result() if session is not None else None)
+        except BaseException as e:
+            # duplicates waiting on these functions fail with them instead of waiting forever
+            for func in batch:
+                if "fingerprint" in func:
+                    with self._fingerprint_lock:
+                        _, future = self._summarizing.pop(func["fingerprint"])
+                    future.set_exception(e)
+            raise
+        for func, summary_result in zip(batch, results):
+            self.annotate_calls(node.path, func["qualname"], summary_result)
+            if "fingerprint" in func:
+                summary_result.metadata["fingerprint"] = self.fingerprint_key(func)
+                original = (f"{node.path}::{func['name']}", summary_result.summary)
+                with self._fingerprint_lock:
+                    self.fingerprints[func["fingerprint"]] = original
+                    _, future = self._summarizing.pop(func["fingerprint"])
+                future.set_result(original)
+        self.timer.record_node(node.path, time.perf_counter() - start)
+        with self.timer.stage("write"):
+            for summary_result in results:
+                for listener in self.function_listeners:
+                    listener(node.path, summary_result)
+        return results
+
+    def fingerprint_key(self, func: Dict[str, str]) -> Optional[str]:
+        return func.get("renamed_fingerprint" if self.rename_identifiers else "plain_fingerprint")
+
+    def dedup_key(self, func: Dict[str, str]) -> Optional[str]:
+        '''
+        The key copies of a function share a summary under: its fingerprint and the tier that summarizes it. None
+        for functions that are not deduplicated, those without a fingerprint and those a template or their docstring
+        summarizes without a model call, since the fingerprint leaves out the docstring (and, with
+        rename_identifiers, the argument names the templates use).
+        '''
+        fingerprint = self.fingerprint_key(func)
+        if fingerprint is None:
+            return None
+        tier, summary = self.tiers.select(func.get("features"))
+        return None if summary is not None else f"{fingerprint}:{tier}"
 
+    def register_fingerprint(self, node: Node, func: Dict[str, str]) -> Optional[Future]:
+        '''
+        Records the fingerprint of a function that is about to be summarized. If a function with the same fingerprint
+        was seen before, returns a future of ("path::name" of that function, its summary) instead; the function is
+        then a duplicate.
+        '''
+        if not self.deduplicate:
+            return None
+        key = self.dedup_key(func)
+        if key is None:
+            return None
+        with self._fingerprint_lock:
+            if key in self.fingerprints:
+                first = self.fingerprints[key][0]
+                original = Future()
+                original.set_result(self.fingerprints[key])
+            elif key in self._summarizing:
+                first, original = self._summarizing[key]
+            else:
+                self._summarizing[key] = (f"{node.path}::{func['name']}", Future())
+                func["fingerprint"] = key
+                return None
+            self.duplicate_clusters.setdefault(key, [first]).append(f"{node.path}::{func['name']}")
+        return original
+
+    def copy_duplicate(self, node: Node, func: Dict[str, str], original: Future) -> List[SummaryResult]:
+        '''
+        gives a duplicate function the summary of the first function with its fingerprint
+        '''
+        duplicate_of, summary = original.result()
+        metadata = {"fingerprint": self.fingerprint_key(func), "duplicate_of": duplicate_of}
+        result = SummaryResult(name=func["name"], summary=summary, code=func["code"], metadata=metadata)
+        self.annotate_calls(node.path, func["qualname"], result)
+        self.stats.incr("deduplicated functions")
+        with self.timer.stage("write"):
+            for listener in self.function_listeners:
+                listener(node.path, result)
+        return [result]
+
+    def finish_python_file(self, node: Node, content: str, function_futures: List[Future],
+                           session: Optional[Future] = None) -> Node:
+        start = time.perf_counter()
+        summaries = [summary for future in function_futures for summary in future.result()]
+        for summary_result in summaries:
+            print(f"summarized function {summary_result.name}: {summary_result.summary}")
+            print("-" * 20)
+        node.summaries = summaries
+        # Get function summaries for file summary
+        final_summary_target = self.extract_context_from_function_summaries(summaries)
+        final_summary = self.summarize_file(final_summary_target, node.name)
+        final_summary.code = content  # Store raw file content
+        self.reference_code(node, content, final_summary)
+        final_summary.type = "PYTHON_FILE"  # Set type
+        if session is not None:
+            seconds_saved = session.result().seconds_saved
+            final_summary.metadata["prompt_eval_seconds_saved"] = round(seconds_saved, 3)
+            self.stats.incr("prompt eval seconds saved by file sessions", seconds_saved)
+            print(f"Reusing the context of {node.path} saved {seconds_saved:.2f}s of prompt evaluation")
+        node.final_summary = final_summary
+        # nothing reads the parse of a finished file again
+        self.extractor.forget(content)
+        self.timer.record_node(node.path, time.perf_counter() - start)
+        self.node_finished(node)
+        return node
+
+    def finish_readme_file(self, node: Node, content: str) -> Node:
+        start = time.perf_counter()
+        final_summary = self.summarize_file(content, node.name)
+        final_summary.code = content  # Store raw file content
+        self.reference_code(node, content, final_summary)
+        final_summary.type = "README_FILE"  # Set type
+        node.final_summary = final_summary
+        node.summaries = [node.final_summary]
+        self.timer.record_node(node.path, time.perf_counter() - start)
+        return node
+
+    def reference_code(self, node: Node, content: str, final_summary: SummaryResult) -> None:
+        '''
+        Replaces the copies of code the tree keeps for a local file, the whole file in its final summary and each
+        function in its summary, by CodeRefs to the file that are read back when the tree is serialized.
+        Files read through the api have no local copy to point at and keep their code.
+        '''
+        if self.using_api or not os.path.isfile(node.path):
+            return
+        source = SourceFile(node.path, content)
+        SOURCES.remember(source, content)
+        final_summary.code = source.ref()
+        if node.type != ItemTypes.PYTHON_FILE:
+            return
+        functions = self.extractor.extract(content).functions
+        for summary, func in zip(node.summaries, functions):
+            # summaries are in the order of the functions in the file, checked to be safe
+            if summary.name == func.name and isinstance(summary.code, str) and summary.code == func.code:
+                summary.code = source.ref(func.lineno, func.end_lineno)
+
+    def finish_directory(self, node: Node) -> Node:
+        start = time.perf_counter()
         # Collect all final summaries from children
         summariesfromnode = []
         for child in node.children:
@@ -361,7 +919,46 @@ class ContextAwareFunctionSummaryGenerator:
             final_summary = self.summarize_directory(final_summary_target, node.name)
             final_summary.type = "DIRECTORY"  # Set type
             node.final_summary = final_summary
+        self.timer.record_node(node.path, time.perf_counter() - start)
+        self.node_finished(node)
         return node
+
+    def tier_seconds_saved(self) -> float:
+        '''
+        Estimates the model time the cheap tiers saved: functions summarized without a model would each have taken
+        an average main model call, and small model calls saved the difference to one.
+        '''
+        stats = self.stats.snapshot()
+        main_calls = stats.get(f"{MAIN} tier model calls", 0)
+        if not main_calls:
+            return 0.0
+        main_average = stats.get(f"{MAIN} tier model seconds", 0) / main_calls
+        saved = (stats.get(f"{TEMPLATE} tier functions", 0) + stats.get(f"{DOCSTRING} tier functions", 0)) * main_average
+        small_calls = stats.get(f"{SMALL} tier model calls", 0)
+        if small_calls:
+            saved += small_calls * (main_average - stats.get(f"{SMALL} tier model seconds", 0) / small_calls)
+        return saved
+
+    def node_finished(self, node: Node) -> None:
+        '''
+        Hands a node whose summary is complete to every listener in self.node_listeners. With
+        self.release_finished_nodes the data that no ancestor needs any more is dropped afterwards: the code and
+        function summaries of the node and the children of a directory.
+        '''
+        with self.timer.stage("write"):
+            for listener in self.node_listeners:
+                listener(node)
+        if self.release_finished_nodes:
+            node.summaries = []
+            if node.final_summary and node.final_summary.code:
+                node.final_summary = node.final_summary.model_copy(update={"code": ""})
+            node.children = []
+
+    def subtree_finished(self, node: Node) -> None:
+        # children are finished before their parent, as they would be in a traversal
+        for child in list(node.children):
+            self.subtree_finished(child)
+        self.node_finished(node)
                 
 
     def build_intial_tree(self):
@@ -379,10 +976,52 @@ class ContextAwareFunctionSummaryGenerator:
         )
         self.root = root_node
     def run(self): 
+        start = time.perf_counter()
         self.build_intial_tree()
+        if not self.using_api and self.manifest is None:
+            # one walk of the checkout answers every directory listing and type check of the traversal
+            with self.timer.stage("scan"):
+                self.manifest = RepoScanner(self.base_url, ignore=self.ignore).scan()
+        if self.manifest is not None:
+            for path, reason in self.manifest.skipped:
+                self.skipped.append((path, reason))
+                self.stats.incr(f"skipped {reason}")
+            # parse every python file up front on a process pool; the traversal then reuses these parses. When
+            # finished nodes are released the files are parsed as they are reached instead, so the parses of the
+            # whole repository are never held at once
+            if not self.release_finished_nodes:
+                with self.timer.stage("parse"):
+                    self.extractor.extract_manifest(self.manifest)
+            if self.priority_mode:
+                with self.timer.stage("rank"):
+                    self.rank_files()
+            if self.call_graph_mode:
+                with self.timer.stage("calls"):
+                    self.build_call_graph()
         # Start processing from the current directory
-        self.process_dir(self.root, self.base_url)
+        with self.timer.stage("summarize"):
+            self.process_dir(self.root, self.base_url)
+        self.aggregator.close()
+        self.wall_seconds += time.perf_counter() - start
+        if self.cache is not None:
+            print(f"Summary cache: {self.cache.stats()}")
+        print(summarize_skipped(self.skipped))
+        self.stats.incr("files parsed", self.extractor.parsed)
+        self.stats.incr("duplicate clusters", len(self.duplicate_clusters))
+        self.stats.incr("estimated model seconds saved by tiers", round(self.tier_seconds_saved(), 2))
+        print(f"Run statistics: {self.stats}")
+        print(f"Model backend: {self.backend.stats}")
         return self.root
+
+    def report(self) -> dict:
+        '''
+        the run report of everything recorded so far, see instrumentation.run_report
+        '''
+        backends = {"main": self.backend.stats}
+        if self.small_backend is not None:
+            backends["small"] = self.small_backend.stats
+        return run_report("tree_generate_summary", self.wall_seconds, self.timer, self.stats, backends,
+                          self.cache.stats() if self.cache is not None else None)
     def dumps(self) -> str:
         """
         Traverses the tree and converts the entire structure to a JSON string
@@ -409,18 +1048,217 @@ class ContextAwareFunctionSummaryGenerator:
         # Convert to JSON string with pretty printing
         return json.dumps(tree_dict, indent=2)
 
+def parse_json_object(text: str) -> dict:
+    """
+    Parses the first JSON object in a model response, ignoring any prose or code fences around it
+    """
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("No JSON object found in response")
+    parsed = json.loads(text[start:end + 1])
+    if not isinstance(parsed, dict):
+        raise ValueError("Response is not a JSON object")
+    return parsed
+
+def node_from_dict(data: dict, parent: Optional[Node] = None) -> Node:
+    """
+    Rebuilds a node and its children from the dictionary shape written by dumps()
+    """
+    node = Node(
+        name=data["name"],
+        node_type=ItemTypes[data["type"]],
+        path=data["path"],
+        summaries=[SummaryResult(**summary) for summary in data["summaries"]],
+        final_summary=SummaryResult(**data["final_summary"]) if data["final_summary"] else None,
+        children=[],
+        parent=parent
+    )
+    for child in data["children"]:
+        node.add_child(node_from_dict(child, node))
+    return node
+
+def load_tree(input_file: str) -> Node:
+    """
+    Loads a tree previously saved from dumps(), or streamed to an NDJSON file with --ndjson
+    """
+    if input_file.endswith(".ndjson"):
+        return node_from_dict(rebuild_tree(input_file))
+    with open(input_file, "r") as f:
+        return node_from_dict(json.load(f))
+
 def main():
+    # run from the repository root: python -m summary.tree_generate_summary --root <path>
+    parser = argparse.ArgumentParser(description="Generate a context aware summary tree of a repository")
+    parser.add_argument("--root", default=base_url, help="directory (or api path) to summarize")
+    parser.add_argument("--api", action="store_true", help="read the repository through the github contents api")
+    parser.add_argument("--content-url", default=content_base_url, help="contents api url the api paths are appended to")
+    parser.add_argument("--workers", type=int, default=4, help="number of summaries generated concurrently")
+    parser.add_argument("--cache", default="summary_cache.sqlite", help="path of the persistent summary cache")
+    parser.add_argument("--no-cache", action="store_true", help="always call the model instead of using the cache")
+    parser.add_argument("--previous", help="summary_output.json of an earlier run; only changed nodes are regenerated")
+    parser.add_argument("--since", help="git revision the previous run was made from, used to find changed files")
+    parser.add_argument("--manifest", default="summary_manifest.json",
+                        help="file hash manifest used to find changed files when --since is not given")
+    parser.add_argument("--batch-tokens", type=int, default=None,
+                        help="summarize small functions of a file together in prompts of up to this many tokens")
+    parser.add_argument("--prompt-tokens", type=int, default=1500,
+                        help="longer functions and larger sets of child summaries are summarized in parts first")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="summarize every copy of a function instead of summarizing identical functions once")
+    parser.add_argument("--dedup-renamed", action="store_true",
+                        help="also treat functions that only differ in the names of their locals as duplicates")
+    parser.add_argument("--priority", action="store_true",
+                        help="summarize the most imported, largest and most recently changed files first")
+    parser.add_argument("--publish", help="append vector store documents to this NDJSON file as soon as they are "
+                                          "summarized, for the RAG api to pick up while the run is in progress")
+    parser.add_argument("--session", action="store_true",
+                        help="give function prompts the path, docstring and imports of their file, encoded once per "
+                             "file and reused from the model's context")
+    parser.add_argument("--call-graph", help="resolve the calls between local functions, record each function's callers "
+                                              "and callees in its metadata and save the call graph to this file")
+    parser.add_argument("--ndjson", help="stream every finished node to this NDJSON file instead of writing "
+                                          "summary_output.json at the end; nodes are released from memory once written")
+    parser.add_argument("--checkpoint", default="summary_checkpoint.ndjson",
+                        help="finished functions and nodes are recorded here while the run is in progress")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue a crashed run, skipping everything recorded in --checkpoint")
+    parser.add_argument("--ignore", action="append", default=[],
+                        help="gitignore style pattern to skip, in addition to the defaults (repeatable)")
+    parser.add_argument("--no-gitignore", action="store_true", help="do not apply the repository's .gitignore files")
+    parser.add_argument("--max-file-size", type=int, default=1024 * 1024, help="skip files larger than this many bytes")
+    parser.add_argument("--max-functions", type=int, default=500, help="skip python files with more functions")
+    parser.add_argument("--archive", metavar="OWNER/REPO[@REF]",
+                        help="download the repository as one tarball and summarize it locally, instead of --root")
+    parser.add_argument("--github-api", default=GITHUB_API, help="api the --archive tarball is downloaded from")
+    parser.add_argument("--github-cache", default=".github_cache",
+                        help="downloads are kept here and only fetched again when github reports a change")
+    parser.add_argument("--model", default="llama3.2:latest", help="ollama model that writes the summaries")
+    parser.add_argument("--small-model", default=None,
+                        help="smaller ollama model for short functions, e.g. llama3.2:1b; by default the main model")
+    parser.add_argument("--ollama-host", default=None, help="ollama server url, defaults to OLLAMA_HOST or localhost")
+    parser.add_argument("--endpoint", action="append", default=[],
+                        help="ollama server to spread the main model's prompts over (repeatable), instead of "
+                             "--ollama-host; --workers should allow enough concurrent prompts to keep them all busy")
+    parser.add_argument("--endpoint-concurrency", type=int, default=2,
+                        help="prompts sent to each --endpoint at the same time")
+    parser.add_argument("--report", help="write a JSON run report with stage timings, token throughput, cache hit "
+                                         "rates and the slowest nodes to this file")
+    parser.add_argument("--metrics", help="write the run report in the Prometheus text format to this file")
+    parser.add_argument("--keep-alive", default="30m",
+                        help="how long ollama keeps the model loaded between prompts, e.g. 30m or -1 for forever")
+    args = parser.parse_args()
+    if args.resume and args.previous:
+        parser.error("--resume and --previous can not be combined")
+    if args.archive and args.api:
+        parser.error("--archive and --api can not be combined")
+    if args.call_graph and args.api:
+        parser.error("--call-graph needs a local checkout to parse")
+    cache = None if args.no_cache else SummaryCache(args.cache)
+    # only runs that talk to github get a fetcher, and with it the --github-cache directory
+    fetcher = GitHubFetcher(args.github_cache) if args.archive or args.api else None
+    if args.archive:
+        repo, _, ref = args.archive.partition("@")
+        args.root = fetcher.download_archive(GitHubFetcher.archive_url(repo, ref or None, args.github_api))
+        print(f"Summarizing {args.archive} from {args.root} ({fetcher.stats})")
+
+    ignore = IgnoreRules(use_gitignore=not args.no_gitignore, max_file_size=args.max_file_size,
+                         max_functions=args.max_functions)
+    ignore.add_patterns(args.ignore)
+    # there is no local checkout to scan in api mode
+    scan_start = time.perf_counter()
+    repo_manifest = RepoScanner(args.root, ignore=ignore).scan() if not args.api else None
+    scan_seconds = time.perf_counter() - scan_start
+    manifest = repo_manifest.hashes() if repo_manifest is not None else None
+    reuse = None
+    if args.resume:
+        reuse = CheckpointIndex(args.checkpoint, node_from_dict, SummaryResult)
+    if args.previous:
+        if args.api:
+            parser.error("--previous needs a local checkout to find changed files")
+        if args.since:
+            changed = git_changed_paths(args.root, args.since)
+        elif not os.path.exists(args.manifest):
+            parser.error(f"manifest {args.manifest} not found, pass --since to find changed files with git")
+        else:
+            changed = diff_manifests(load_manifest(args.manifest), manifest)
+        print(f"{len(changed)} changed files since the previous run")
+        reuse = IncrementalIndex(load_tree(args.previous), changed)
+
+    # ollama reads a bare number as seconds and a string as a duration
+    keep_alive = int(args.keep_alive) if args.keep_alive.lstrip("-").isdigit() else args.keep_alive
+    small_backend = None
+    if args.small_model:
+        small_backend = OllamaBackend(args.small_model, host=args.ollama_host, keep_alive=keep_alive)
+    if args.endpoint:
+        # endpoints fail fast, the pool requeues their prompts on the others
+        backend = EndpointPool([OllamaBackend(args.model, host=host, keep_alive=keep_alive, retries=1)
+                                for host in args.endpoint], max_concurrency=args.endpoint_concurrency)
+    else:
+        backend = OllamaBackend(args.model, host=args.ollama_host, keep_alive=keep_alive)
     print("Starting summary generation...")
-    generator = ContextAwareFunctionSummaryGenerator(base_url, content_base_url)
+    generator = ContextAwareFunctionSummaryGenerator(args.root, args.content_url, max_workers=args.workers,
+                                                     cache=cache, reuse=reuse, batch_token_budget=args.batch_tokens,
+                                                     manifest=repo_manifest, ignore=ignore,
+                                                     backend=backend,
+                                                     fetcher=fetcher, prompt_token_budget=args.prompt_tokens,
+                                                     small_backend=small_backend, deduplicate=not args.no_dedup,
+                                                     rename_identifiers=args.dedup_renamed, session_mode=args.session,
+                                                     priority_mode=args.priority,
+                                                     call_graph_mode=args.call_graph is not None)
+    generator.using_api = args.api
+    if repo_manifest is not None:
+        generator.timer.add("scan", scan_seconds)
+        generator.wall_seconds += scan_seconds
+    checkpoint = Checkpoint(args.checkpoint, resume=args.resume)
+    generator.function_listeners.append(checkpoint.record_function)
+    generator.node_listeners.append(checkpoint.record_node)
+    writer = None
+    if args.ndjson:
+        writer = NDJSONTreeWriter(args.ndjson)
+        generator.node_listeners.append(writer.write_node)
+        generator.release_finished_nodes = True
+    publisher = None
+    if args.publish:
+        publisher = DocumentPublisher(args.publish)
+        generator.function_listeners.append(publisher.publish_function)
+        generator.node_listeners.append(publisher.publish_node)
     print("Processing repository...")
     generator.run()
-    print("Generating JSON output...")
-    
-    # Save the output to a JSON file
-    json_output = generator.dumps()
-    with open("summary_output.json", "w") as f:
-        f.write(json_output)
-    print("Done! Output saved to summary_output.json")
+
+    if isinstance(backend, EndpointPool):
+        print(f"Endpoint throughput:\n{backend.report()}")
+    if publisher is not None:
+        publisher.close()
+    if writer is not None:
+        writer.close()
+        output_file = args.ndjson
+    else:
+        print("Generating JSON output...")
+        # Save the output to a JSON file
+        with generator.timer.stage("write"):
+            json_output = generator.dumps()
+            output_file = "summary_output.json"
+            with open(output_file, "w") as f:
+                f.write(json_output)
+    # the run is complete, so there is nothing left to resume
+    checkpoint.close(remove=True)
+    if manifest is not None:
+        save_manifest(manifest, args.manifest)
+    if generator.call_graph is not None:
+        generator.call_graph.save(args.call_graph)
+    if args.report or args.metrics:
+        report = generator.report()
+        if args.report:
+            write_report(report, args.report)
+        if args.metrics:
+            with open(args.metrics, "w") as f:
+                f.write(prometheus_metrics(report))
+    if cache is not None:
+        cache.close()
+    if fetcher is not None:
+        fetcher.close()
+    print(f"Done! Output saved to {output_file}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,244 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+
+from pydantic import BaseModel
+
+# Add parent directory to path to import the summary modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from summary.ndjson_writer import document_id, iter_documents
+
+EMBEDDING_MODEL = "ibm-granite/granite-embedding-125m-english"
+
+# the embeddings of the worker process, created once by _init_worker
+_EMBEDDINGS = None
+
+
+class IngestStats(BaseModel):
+    documents: int = 0
+    batches: int = 0
+    upserts: int = 0
+    seconds: float = 0.0
+    peak_rss_mb: float = 0.0  # of this process
+    peak_worker_rss_mb: float = 0.0  # of the largest embedding worker
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.documents / self.seconds if self.seconds else 0.0
+
+    def report(self) -> str:
+        return (f"Ingested {self.documents} documents in {self.seconds:.1f}s ({self.docs_per_second:.1f} docs/s, "
+                f"{self.batches} batches, {self.upserts} upserts), peak rss {self.peak_rss_mb:.0f} MB, "
+                f"workers {self.peak_worker_rss_mb:.0f} MB")
+
+
+def _rss_mb(who: int) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def load_documents(input_file: str) -> Iterator[dict]:
+    '''
+    Vector store documents ({"page_content", "metadata"}) from a JSON list such as data/langchain_docs.json, or
+    streamed from an NDJSON summary file (tree_generate_summary.py --ndjson) without loading it whole
+    '''
+    if input_file.endswith(".json"):
+        with open(input_file, "r") as json_file:
+            yield from json.load(json_file)
+    else:
+        yield from iter_documents(input_file)
+
+
+def batched(documents: Iterable[dict], batch_size: int) -> Iterator[List[dict]]:
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def chroma_metadata(metadata: dict) -> dict:
+    '''
+    metadata Chroma accepts: values are strings, numbers or booleans, so None is dropped and lists and dicts are
+    stored as JSON
+    '''
+    cleaned = {}
+    for key, value in metadata.items():
+        if value is None:
+            continue
+        cleaned[key] = value if isinstance(value, (str, int, float, bool)) else json.dumps(value)
+    return cleaned
+
+
+def load_embeddings(model_name: str):
+    # langchain and the model are only loaded where documents are embedded, not by everything importing this module
+    from langchain.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+def _init_worker(model_name: str, threads: int) -> None:
+    global _EMBEDDINGS
+    # every worker gets its share of the cores instead of each torch starting a thread per core
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _EMBEDDINGS = load_embeddings(model_name)
+
+
+def _embed_batch(texts: List[str]) -> Tuple[List[List[float]], float]:
+    '''
+    embeds a batch in a worker process, returns the embeddings and the peak rss of the worker
+    '''
+    return _EMBEDDINGS.embed_documents(texts), _rss_mb(resource.RUSAGE_SELF)
+
+
+def _completed(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class Ingestor:
+    '''
+    Embeds documents and writes them to a Chroma collection without holding them all in memory. Documents are read
+    in batches of batch_size and encoded on a pool of worker processes, each with its own copy of the embedding
+    model and an equal share of the CPU threads; at most two batches per worker are in flight, so memory stays
+    bounded however many documents there are. Embedded batches are written with bulk upserts of upsert_size
+    documents (capped at the largest batch the Chroma client accepts) keyed by the stable document ids of the
+    summary publisher, so ingesting a repository again replaces its documents instead of duplicating them.
+    With one worker the documents are embedded in process, with embeddings (any object with embed_documents, e.g.
+    the HuggingFaceEmbeddings the caller already holds) or else a model loaded once for this Ingestor.
+    '''
+    def __init__(self, collection, model_name: str = EMBEDDING_MODEL, batch_size: int = 64,
+                 workers: Optional[int] = None, upsert_size: int = 1024, max_batch_size: Optional[int] = None,
+                 embeddings=None, progress: bool = True):
+        self.collection = collection
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.workers = workers or max(1, (os.cpu_count() or 1) // 2)
+        self.max_in_flight = 2 * self.workers  # batches submitted to the workers and not added yet
+        self.upsert_size = min(upsert_size, max_batch_size) if max_batch_size else upsert_size
+        self.embeddings = embeddings
+        self.progress = progress
+        self.stats = IngestStats()
+        self._pending: Dict[str, Tuple[str, dict, List[float]]] = {}  # id -> (document, metadata, embedding)
+        self._start = time.time()
+
+    def ingest(self, documents: Iterable[dict]) -> IngestStats:
+        self._start = time.time()
+        batches = batched(documents, self.batch_size)
+        if self.workers == 1:
+            if self.embeddings is None:
+                self.embeddings = load_embeddings(self.model_name)
+            self._run(batches, lambda texts: _completed((self.embeddings.embed_documents(texts),
+                                                         _rss_mb(resource.RUSAGE_SELF))))
+        else:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            # spawned, forking a parent that already runs torch threads (e.g. rag_base) can deadlock the workers
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_worker, initargs=(self.model_name, threads)) as pool:
+                self._run(batches, lambda texts: pool.submit(_embed_batch, texts))
+        self._upsert()
+        self.stats.seconds = time.time() - self._start
+        self.stats.peak_rss_mb = _rss_mb(resource.RUSAGE_SELF)
+        return self.stats
+
+    def _run(self, batches: Iterable[List[dict]], submit: Callable[[List[str]], Future]) -> None:
+        '''
+        submits the batches for embedding in order, adding the oldest one as soon as max_in_flight are waiting
+        '''
+        in_flight: Deque[Tuple[List[dict], Future]] = deque()
+        for batch in batches:
+            in_flight.append((batch, submit([document["page_content"] for document in batch])))
+            if len(in_flight) >= self.max_in_flight:
+                done, future = in_flight.popleft()
+                self._add(done, future.result())
+        while in_flight:
+            done, future = in_flight.popleft()
+            self._add(done, future.result())
+
+    def _add(self, batch: List[dict], embedded: Tuple[List[List[float]], float]) -> None:
+        embeddings, worker_rss_mb = embedded
+        for document, embedding in zip(batch, embeddings):
+            # a document that appears twice keeps its last copy, Chroma rejects an upsert with repeated ids
+            self._pending[document.get("id") or document_id(document)] = (
+                document["page_content"], chroma_metadata(document["metadata"]), embedding)
+        self.stats.batches += 1
+        self.stats.peak_worker_rss_mb = max(self.stats.peak_worker_rss_mb, worker_rss_mb)
+        if len(self._pending) >= self.upsert_size:
+            self._upsert(final=False)
+
+    def _upsert(self, final: bool = True) -> None:
+        '''
+        writes the pending documents in chunks of upsert_size, keeping a last partial chunk for later unless final
+        '''
+        items = list(self._pending.items())
+        keep = 0 if final else len(items) % self.upsert_size
+        self._pending = dict(items[len(items) - keep:])
+        for i in range(0, len(items) - keep, self.upsert_size):
+            chunk = items[i:i + self.upsert_size]
+            self.collection.upsert(
+                ids=[id for id, _ in chunk],
+                documents=[document for _, (document, _, _) in chunk],
+                metadatas=[metadata for _, (_, metadata, _) in chunk],
+                embeddings=[embedding for _, (_, _, embedding) in chunk],
+            )
+            self.stats.upserts += 1
+            self.stats.documents += len(chunk)
+        if len(items) > keep and self.progress:
+            rate = self.stats.documents / max(time.time() - self._start, 1e-9)
+            print(f"Ingested {self.stats.documents} documents ({rate:.1f} docs/s)")
+
+
+def max_batch_size(client) -> Optional[int]:
+    '''
+    the largest batch the Chroma client accepts in one call, None if it does not say
+    '''
+    get_max_batch_size = getattr(client, "get_max_batch_size", None)
+    return get_max_batch_size() if get_max_batch_size is not None else None
+
+
+def ingest(documents: Iterable[dict], client, collection_name: str, **options) -> IngestStats:
+    '''
+    embeds documents into the collection collection_name of a Chroma client, creating it if needed; options are
+    those of Ingestor
+    '''
+    collection = client.get_or_create_collection(collection_name)
+    options.setdefault("max_batch_size", max_batch_size(client))
+    stats = Ingestor(collection, **options).ingest(documents)
+    print(stats.report())
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed summary documents into a Chroma collection")
+    parser.add_argument("input_file", help="JSON list of documents (data/langchain_docs.json) or an NDJSON summary")
+    parser.add_argument("--persist-dir", default="./chroma_db:demo")
+    parser.add_argument("--collection", default="test")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--batch-size", type=int, default=64, help="documents embedded per worker task")
+    parser.add_argument("--workers", type=int, default=None, help="embedding processes, half the cores by default")
+    parser.add_argument("--upsert-size", type=int, default=1024, help="documents written per Chroma upsert")
+    args = parser.parse_args()
+    import chromadb  # only needed to open the store, the Ingestor works with any collection
+    client = chromadb.PersistentClient(path=args.persist_dir)
+    ingest(load_documents(args.input_file), client, args.collection, model_name=args.model,
+           batch_size=args.batch_size, workers=args.workers, upsert_size=args.upsert_size)
+
+
+if __name__ == "__main__":
+    main()
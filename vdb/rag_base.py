@@ -1,10 +1,15 @@
 import json
+import os
+import sys
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import Chroma
 import chromadb
 from langchain.prompts import PromptTemplate
 from langchain.schema import Document
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from vdb.ingest import EMBEDDING_MODEL, ingest, load_documents
+
 
 # data = None
 # with open("vdb/data/vdb_formatted_summaries3.json", 'r') as json_file:
@@ -23,12 +28,16 @@ data = [
 
 EMBEDDINGS = HuggingFaceEmbeddings(
     # model_name="HIT-TMG/KaLM-embedding-multilingual-mini-v1"
-    model_name = "ibm-granite/granite-embedding-125m-english"
+    model_name = EMBEDDING_MODEL
 )
 # PERSIST_DIR = "./vdb/chroma_db:v2"
 PERSIST_DIR = "./chroma_db:demo"
 
 COLLECTION_NAME = "test"
+DOCS_FILE = "data/langchain_docs.json"
+# documents embedded per worker task, and embedding processes (half the cores when None)
+INGEST_BATCH_SIZE = 64
+INGEST_WORKERS = None
 
 TEMPLATE = """### Task
 You are to answer questions about the Cornell Data Science project team.
@@ -66,16 +75,18 @@ def get_vdb(with_documents = True):
         print("Retrieved.")
     else:
         print(f"Collection '{collection_name}' does not exist.")
+        # In the case that the data has already been converted to LangChain Documents
+        if with_documents:
+            # streamed in batches and embedded on a worker pool instead of one add_documents call
+            ingest(load_documents(DOCS_FILE), chroma_client, collection_name, model_name=EMBEDDING_MODEL,
+                   batch_size=INGEST_BATCH_SIZE, workers=INGEST_WORKERS, embeddings=EMBEDDINGS)
         vectordb = Chroma(
+            client=chroma_client,
             collection_name=collection_name,
             embedding_function=EMBEDDINGS,
             persist_directory=PERSIST_DIR
         )
-        
-        # In the case that the data has already been converted to LangChain Documents
-        if with_documents:
-            vectordb.add_documents(data)
-        else:
+        if not with_documents:
             vectordb.add_texts(texts=data['summary'], metadatas=data['metadata'], ids=data['ids'])
             
         vectordb.persist()
@@ -83,9 +94,21 @@ def get_vdb(with_documents = True):
         
     return vectordb
 
+def collapse_duplicates(docs):
+    # keeps the best ranked copy of functions that share a fingerprint
+    seen = set()
+    collapsed = []
+    for doc in docs:
+        fingerprint = doc.metadata.get("fingerprint")
+        if fingerprint is not None and fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        collapsed.append(doc)
+    return collapsed
+
 def query(q):
     vectordb = get_vdb()
-    results = vectordb.similarity_search(q)
+    results = collapse_duplicates(vectordb.similarity_search(q))
     return results
 
 def document_to_xml(doc):
@@ -25,15 +25,21 @@ def extract_documents(node):
     if node.get("type") == "PYTHON_FILE":
         curr_path = node['path']
         for func in node.get("summaries", []):
+            metadata = {
+                "type": "FUNCTION",
+                "name": func["name"],
+                "path": curr_path,
+                "code": func['code'],
+                "summary": func['summary'],
+            }
+            # copies of the same function share a fingerprint, so queries can collapse them; the call graph id
+            # looks up the callers and callees of a function
+            for key in ("fingerprint", "duplicate_of", "function"):
+                if func.get("metadata", {}).get(key):
+                    metadata[key] = func["metadata"][key]
             documents.append(Document(
                 page_content=f"{func['summary']}\n\n{func['code']}",
-                metadata={
-                    "type": "FUNCTION",
-                    "name": func["name"],
-                    "path": curr_path,
-                    "code": func['code'],
-                    "summary": func['summary'],
-                }
+                metadata=metadata
             ))
 
     for child in node.get("children", []):
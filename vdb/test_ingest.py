@@ -0,0 +1,110 @@
+import os
+import sys
+import unittest
+from concurrent.futures import Future
+
+# Add parent directory to path to import the module
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from vdb.ingest import Ingestor, batched, chroma_metadata
+
+
+class FakeCollection:
+    """Records the upserts a Chroma collection would receive, rejecting repeated ids like Chroma does"""
+    def __init__(self):
+        self.upserts = []
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        assert len(ids) == len(set(ids)), "repeated ids in one upsert"
+        assert len(ids) == len(documents) == len(metadatas) == len(embeddings)
+        self.upserts.append(dict(zip(ids, zip(documents, metadatas, embeddings))))
+
+
+class FakeEmbeddings:
+    """Embeds a text as its length, and records the size of every batch"""
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        return [[float(len(text))] for text in texts]
+
+
+def make_documents(count):
+    return [{"page_content": f"summary of file {i}", "metadata": {"type": "PYTHON_FILE", "path": f"pkg/f{i}.py"}}
+            for i in range(count)]
+
+
+class TestIngestor(unittest.TestCase):
+    def ingestor(self, collection, **kwargs):
+        kwargs.setdefault("workers", 1)
+        return Ingestor(collection, embeddings=FakeEmbeddings(), progress=False, **kwargs)
+
+    def test_documents_are_embedded_in_batches_and_upserted_in_chunks(self):
+        collection = FakeCollection()
+        ingestor = self.ingestor(collection, batch_size=3, upsert_size=4)
+        stats = ingestor.ingest(make_documents(10))
+        self.assertEqual(ingestor.embeddings.batches, [3, 3, 3, 1])
+        self.assertEqual([len(upsert) for upsert in collection.upserts], [4, 4, 2])
+        self.assertEqual((stats.documents, stats.batches, stats.upserts), (10, 4, 3))
+        self.assertGreater(stats.docs_per_second, 0)
+        self.assertGreater(stats.peak_rss_mb, 0)
+        document, metadata, embedding = collection.upserts[0]["PYTHON_FILE:pkg/f0.py"]
+        self.assertEqual((document, metadata, embedding), ("summary of file 0", make_documents(1)[0]["metadata"],
+                                                            [17.0]))
+
+    def test_upserts_are_capped_at_the_client_batch_size(self):
+        collection = FakeCollection()
+        self.ingestor(collection, batch_size=5, upsert_size=100, max_batch_size=3).ingest(make_documents(10))
+        self.assertEqual([len(upsert) for upsert in collection.upserts], [3, 3, 3, 1])
+
+    def test_repeated_documents_are_upserted_once(self):
+        collection = FakeCollection()
+        documents = make_documents(3)
+        republished = dict(documents[1], page_content="newer summary")
+        stats = self.ingestor(collection, batch_size=2).ingest(documents + [republished])
+        self.assertEqual(len(collection.upserts), 1)
+        self.assertEqual(collection.upserts[0]["PYTHON_FILE:pkg/f1.py"][0], "newer summary")
+        self.assertEqual(stats.documents, 3)
+
+    def test_documents_are_streamed(self):
+        pulled = []
+
+        def documents():
+            for document in make_documents(20):
+                pulled.append(document)
+                yield document
+
+        embeddings = FakeEmbeddings()
+        embed_documents = embeddings.embed_documents
+
+        def embed_and_check(texts):
+            # nothing is read ahead of the batch being embedded
+            self.assertEqual(len(pulled), sum(embeddings.batches) + len(texts))
+            return embed_documents(texts)
+
+        embeddings.embed_documents = embed_and_check
+        Ingestor(FakeCollection(), embeddings=embeddings, batch_size=4, workers=1, progress=False).ingest(documents())
+        self.assertEqual(embeddings.batches, [4] * 5)
+
+    def test_batches_in_flight_are_bounded(self):
+        ingestor = self.ingestor(FakeCollection(), batch_size=2, workers=3)
+        waiting = []
+
+        def submit(texts):
+            waiting.append(ingestor.stats.batches)
+            future = Future()
+            future.set_result(([[0.0]] * len(texts), 0.0))
+            return future
+
+        ingestor._run(batched(make_documents(20), 2), submit)
+        # when batch i is submitted, at most max_in_flight - 1 earlier batches are still waiting to be added
+        self.assertEqual(max(i - added for i, added in enumerate(waiting)), ingestor.max_in_flight - 1)
+        self.assertEqual(ingestor.stats.batches, 10)
+
+    def test_metadata_chroma_accepts(self):
+        self.assertEqual(chroma_metadata({"name": "f", "line": 3, "duplicate_of": None, "calls": ["a", "b"]}),
+                         {"name": "f", "line": 3, "calls": '["a", "b"]'})
+
+
+if __name__ == '__main__':
+    unittest.main()